@@ -0,0 +1,480 @@
+'''
+Asyncio client library for the Auctioneer server.
+
+Sellers and buyers are driven from code instead of input() and print(), so
+one process can run hundreds of automated bidding agents on a single event
+loop. Every AuctionClient takes part in one auction, over its own
+connection or as part of an AuctionSession that shares one connection
+between many auctions:
+
+    async def agent(host, port):
+        buyer = AuctionClient(host, port)
+        await buyer.join('sword')
+        await buyer.bid(120)
+        result = await buyer.result()
+        return result.outcome == 'won'
+
+Every message of the server can also be observed with on_message, which is
+how client_rdt.py prints them.
+'''
+import asyncio
+from collections import namedtuple
+
+import auction_protocol as protocol
+
+AuctionResult = namedtuple('AuctionResult', ['outcome', 'price', 'item_name', 'peer_ip'])
+AuctionResult.__doc__ = """
+Result of an auction. outcome is 'won' or 'lost' for buyers, 'sold' or
+'not_sold' for sellers, and 'closed' for buyers dropped because bidding
+closed before they bid. price, item_name and peer_ip (the IP address of the
+other party) are only set for 'won' and 'sold'.
+"""
+
+OUTCOMES = {
+    protocol.WON: 'won',
+    protocol.LOST: 'lost',
+    protocol.SOLD: 'sold',
+    protocol.NOT_SOLD: 'not_sold',
+    protocol.BIDDING_CLOSED: 'closed',
+}
+
+
+class AuctionError(Exception):
+    """
+    Raised when the server turns a request down or the connection is lost.
+    """
+    def __init__(self, message, reason=None):
+        super().__init__(message)
+        self.reason = reason    # INVALID_BID reason, if the error is a rejected bid
+
+
+class Rejected(AuctionError):
+    """
+    Raised by AuctionClient.connect() when the server turns the client away,
+    e.g. because the room does not exist or the admission queue is full.
+    """
+
+
+class InvalidRequest(AuctionError):
+    """
+    Raised by AuctionClient.result() when the server refused the auction
+    request. The seller may send a corrected one with request_auction().
+    """
+
+
+async def stop_reader(task):
+    '''
+    Cancels the task reading a connection and waits for it to end, raising
+    any error it ended with.
+    '''
+    if task is None:
+        return
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+def settle(future, result=None, error=None):
+    '''
+    Resolves a future unless it is done already.
+    '''
+    if future is None or future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+        future.exception()  # Retrieved here, so that a failure nobody waits for is not reported
+    else:
+        future.set_result(result)
+
+
+async def read_frames(reader, decoder, receive):
+    '''
+    Hands every message received on a connection to receive until the
+    server closes it. Returns the error that ended the connection, if any.
+    '''
+    try:
+        while True:
+            data = await reader.read(65536)
+            if not data:
+                return None
+            for opcode, values in decoder.feed(data):
+                receive(opcode, values)
+    except (OSError, protocol.ProtocolError) as e:
+        return e
+
+
+async def list_rooms(host, port):
+    '''
+    Returns the descriptions of the rooms with open bidder slots.
+    '''
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(protocol.MAGIC + protocol.encode_message(protocol.HELLO, protocol.ROLE_LIST, ''))
+        decoder = protocol.FrameDecoder()
+        while not decoder.pending:
+            data = await reader.read(65536)
+            if not data:
+                raise AuctionError("Connection closed by server")
+            decoder.pending.extend(decoder.feed(data))
+        opcode, values = decoder.pending.popleft()
+        return list(values)
+    finally:
+        writer.close()
+
+
+class AuctionClient:
+    """
+    Takes part in one auction as its seller or as one of its buyers.
+    """
+    def __init__(self, host=None, port=None, on_message=None, session=None):
+        """
+        Parameters:
+        - host (str): The IP address of the server
+        - port (int): The port number of the server
+        - on_message (callable): Called with (opcode, values) for every message
+          the server sends about this auction
+        - session (AuctionSession): Session to take part through, instead of a
+          connection of its own
+        """
+        self.host = host
+        self.port = port
+        self.on_message = on_message
+        self.session = session
+        self.writer = None  # Own connection, if not part of a session
+        self.reader_task = None     # Task reading the own connection
+        self.role = None    # Role assigned by the server
+        self.room_id = None     # Room assigned by the server
+        self.requested_room = ''    # Room asked for, '' for any
+        self.queue_updates = 0  # Position updates received while parked in the admission queue
+        self.queue_position = None
+        self.price = None   # Standing price of an English auction
+        self.leading = False    # Whether this buyer holds the standing price
+        self.assigned = None    # Future of the role assignment
+        self.outcome = None     # Future of the AuctionResult
+        self.pending_bid = None     # Future of the bid waiting for its acknowledgement
+        self.bidding = None     # Set once buyers may bid
+        self.price_changed = None   # Set when a new price update arrived
+        self.bid_lock = None    # One bid at a time, so that replies cannot be mixed up
+
+    async def connect(self, role=protocol.ROLE_ANY, room_id=None):
+        """
+        Asks the server for a role and waits until it is assigned, however
+        long the client is parked in the admission queue.
+
+        Parameters:
+        - role (int): ROLE_SELLER, ROLE_BUYER or ROLE_ANY to let the server pick
+        - room_id (str): Room to host or join, or None
+
+        Returns:
+        - The assigned role (ROLE_SELLER, ROLE_SELLER_RECOVERED or ROLE_BUYER)
+
+        Raises:
+        - Rejected if the server turns the client away
+        """
+        loop = asyncio.get_running_loop()
+        self.assigned = loop.create_future()
+        self.outcome = loop.create_future()
+        self.bidding = asyncio.Event()
+        self.price_changed = asyncio.Event()
+        self.bid_lock = asyncio.Lock()
+        self.requested_room = room_id or ''
+        if self.session is not None:
+            self.session.join(self, role, self.requested_room)
+        else:
+            reader, self.writer = await asyncio.open_connection(self.host, self.port)
+            self.writer.write(protocol.MAGIC + protocol.encode_message(protocol.HELLO, role, self.requested_room))
+            self.reader_task = asyncio.create_task(self.read_connection(reader))
+        return await self.assigned
+
+    async def create_auction(self, auc_type, min_price, max_bids, item_name, room_id=None):
+        """
+        Hosts a new auction room, unless the client is connected already,
+        and submits the auction request. A seller reattached to a recovered
+        auction skips the request.
+
+        Returns:
+        - The id of the room
+        """
+        role = self.role if self.assigned is not None else await self.connect(protocol.ROLE_SELLER, room_id)
+        if role == protocol.ROLE_SELLER:
+            self.request_auction(auc_type, min_price, max_bids, item_name)
+        return self.room_id
+
+    def request_auction(self, auc_type, min_price, max_bids, item_name):
+        """
+        Sends the auction request of a seller, or a corrected one after
+        result() raised InvalidRequest.
+
+        Parameters:
+        - auc_type (int): AUCTION_FIRST_PRICE, AUCTION_SECOND_PRICE or AUCTION_ENGLISH
+        - min_price (int): Minimum price
+        - max_bids (int): Number of buyers the auction waits for
+        - item_name (str): Name of the item
+        """
+        if self.outcome.done() and isinstance(self.outcome.exception(), InvalidRequest):
+            self.outcome = asyncio.get_running_loop().create_future()
+        self.send(protocol.AUCTION_REQUEST, auc_type, min_price, max_bids, item_name)
+
+    async def join(self, room_id=None):
+        """
+        Joins the given room, or any room with open bidder slots, as a buyer.
+
+        Returns:
+        - The id of the room
+        """
+        await self.connect(protocol.ROLE_BUYER, room_id)
+        return self.room_id
+
+    async def wait_bidding(self):
+        """
+        Waits until the server asks for bids.
+
+        Raises:
+        - AuctionError if the auction ended first
+        """
+        waiter = asyncio.ensure_future(self.bidding.wait())
+        await asyncio.wait([waiter, self.outcome], return_when=asyncio.FIRST_COMPLETED)
+        if not waiter.done():
+            waiter.cancel()
+            raise AuctionError("The auction is over")
+
+    async def bid(self, amount):
+        """
+        Submits a bid once bidding has started and waits until the server
+        accepts it.
+
+        Raises:
+        - AuctionError if the bid is refused (its reason is the INVALID_BID
+          reason) or the auction is over
+        """
+        await self.wait_bidding()
+        async with self.bid_lock:
+            if self.outcome.done():
+                raise AuctionError("The auction is over")
+            self.pending_bid = asyncio.get_running_loop().create_future()
+            self.send(protocol.BID, amount)
+            await self.pending_bid
+
+    async def next_price(self):
+        """
+        Waits for the next price update of an English auction. Updates that
+        arrived since the last call are coalesced into the latest one.
+
+        Returns:
+        - (price, leading), or None once the auction is over
+        """
+        waiter = asyncio.ensure_future(self.price_changed.wait())
+        await asyncio.wait([waiter, self.outcome], return_when=asyncio.FIRST_COMPLETED)
+        if not waiter.done():
+            waiter.cancel()
+            return None
+        self.price_changed.clear()
+        return self.price, self.leading
+
+    async def result(self):
+        """
+        Waits for the end of the auction.
+
+        Returns:
+        - AuctionResult
+
+        Raises:
+        - InvalidRequest if the server refused the auction request
+        - AuctionError if the connection was lost first
+        """
+        return await self.outcome
+
+    def send(self, opcode, *values):
+        data = protocol.encode_message(opcode, *values)
+        if self.session is not None:
+            self.session.send(self, data)
+        else:
+            self.writer.write(data)
+
+    async def close(self):
+        """
+        Closes the client's own connection. Auctions of a session end with
+        the session.
+        """
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        await stop_reader(self.reader_task)
+
+    async def read_connection(self, reader):
+        error = await read_frames(reader, protocol.FrameDecoder(), self.receive)
+        self.connection_lost(error)
+
+    def receive(self, opcode, values):
+        """
+        Updates the state of the auction with one message from the server.
+        """
+        if self.on_message is not None:
+            self.on_message(opcode, values)
+        if opcode == protocol.ROLE:
+            self.role, self.room_id = values
+            settle(self.assigned, self.role)
+        elif opcode == protocol.QUEUED:
+            self.queue_updates += 1
+            self.queue_position = values[0]
+        elif opcode == protocol.REJECTED:
+            error = Rejected(values[0])
+            settle(self.assigned, error=error)
+            settle(self.outcome, error=error)
+        elif opcode in (protocol.BIDDING_STARTED, protocol.BID_REQUEST):
+            self.bidding.set()
+        elif opcode == protocol.BID_ACCEPTED:
+            settle(self.pending_bid, True)
+        elif opcode == protocol.INVALID_BID:
+            settle(self.pending_bid, error=AuctionError(protocol.render_text(opcode, *values).strip(), values[0]))
+        elif opcode == protocol.INVALID_REQUEST:
+            settle(self.outcome, error=InvalidRequest("Invalid auction request"))
+        elif opcode == protocol.PRICE_UPDATE:
+            self.price, self.leading = values[0], bool(values[1])
+            self.price_changed.set()
+        elif opcode in OUTCOMES:
+            settle(self.pending_bid, error=AuctionError("The auction is over"))
+            settle(self.outcome, AuctionResult(OUTCOMES[opcode], *values) if values else AuctionResult(OUTCOMES[opcode], None, None, None))
+
+    def connection_lost(self, error=None):
+        """
+        Fails whatever is still waiting once the connection is gone.
+        """
+        lost = AuctionError(f"Connection lost: {error}" if error else "Connection closed by server")
+        for future in (self.assigned, self.pending_bid, self.outcome):
+            settle(future, error=lost)
+
+
+class AuctionSession:
+    """
+    One session connection that takes part in many auctions, one after the
+    other or at the same time, under a stable participant id.
+    """
+    def __init__(self, host, port, participant_id=None, on_message=None):
+        """
+        Parameters:
+        - host (str): The IP address of the server
+        - port (int): The port number of the server
+        - participant_id (str): Id to ask for, or None to have one assigned
+        - on_message (callable): Default on_message of the session's auctions
+        """
+        self.host = host
+        self.port = port
+        self.participant_id = participant_id
+        self.on_message = on_message
+        self.writer = None
+        self.reader_task = None     # Task reading the session's connection
+        self.clients = {}   # Auctions with an assigned room, by room id
+        self.joining = []   # Auctions waiting for their role assignment, in request order
+        self.tag = None     # Room named by the last IN_ROOM frame
+        self.opened = None  # Future of the SESSION reply
+        self.listings = []  # Futures of ROOM_LIST replies, in request order
+
+    async def open(self):
+        """
+        Opens the session.
+
+        Returns:
+        - The participant id
+
+        Raises:
+        - AuctionError if the server refuses the session
+        """
+        self.opened = asyncio.get_running_loop().create_future()
+        reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        self.writer.write(protocol.MAGIC + protocol.encode_message(protocol.HELLO, protocol.ROLE_SESSION, self.participant_id or ''))
+        self.reader_task = asyncio.create_task(self.read_connection(reader))
+        self.participant_id = await self.opened
+        return self.participant_id
+
+    def auction(self, on_message=None):
+        """
+        Returns a new AuctionClient taking part through this session.
+        """
+        return AuctionClient(on_message=on_message or self.on_message, session=self)
+
+    async def list_rooms(self):
+        """
+        Returns the descriptions of the rooms with open bidder slots.
+        """
+        listing = asyncio.get_running_loop().create_future()
+        self.listings.append(listing)
+        self.writer.write(protocol.encode_message(protocol.JOIN, protocol.ROLE_LIST, ''))
+        return await listing
+
+    def join(self, client, role, room_id):
+        self.joining.append(client)
+        self.writer.write(protocol.encode_message(protocol.JOIN, role, room_id))
+
+    def send(self, client, data):
+        self.writer.write(protocol.encode_message(protocol.SELECT_ROOM, client.room_id) + data)
+
+    async def close(self):
+        """
+        Closes the session and leaves all of its auctions.
+        """
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except OSError:
+                pass
+        await stop_reader(self.reader_task)
+
+    async def read_connection(self, reader):
+        error = await read_frames(reader, protocol.FrameDecoder(), self.receive)
+        lost = AuctionError(f"Connection lost: {error}" if error else "Connection closed by server")
+        settle(self.opened, error=lost)
+        for client in list(self.clients.values()) + self.joining:
+            client.connection_lost(error)
+
+    def receive(self, opcode, values):
+        """
+        Routes one message to the auction named by the IN_ROOM frame before it.
+        """
+        if opcode == protocol.IN_ROOM:
+            self.tag = values[0]
+            return
+        tag, self.tag = self.tag, None
+        if tag is None:     # Messages about the session itself
+            if opcode == protocol.SESSION:
+                settle(self.opened, values[0])
+            elif opcode == protocol.REJECTED:
+                settle(self.opened, error=Rejected(values[0]))
+            elif opcode == protocol.ROOM_LIST and self.listings:
+                settle(self.listings.pop(0), list(values))
+            if self.on_message is not None:
+                self.on_message(opcode, values)
+            return
+        if opcode in (protocol.ROLE, protocol.QUEUED, protocol.REJECTED):  # Only sent before a role is assigned
+            client = self.claim(tag, opcode, values)
+        else:
+            client = self.clients.get(tag)
+        if client is None:
+            return
+        client.receive(opcode, values)
+        if opcode in OUTCOMES:
+            self.clients.pop(tag, None)     # The room id may be used again by a later auction
+
+    def claim(self, tag, opcode, values):
+        '''
+        Finds the joining auction a message about an unknown room belongs
+        to: the one that asked for that room, or else the oldest one that
+        asked for any room.
+        '''
+        room_id = values[1] if opcode == protocol.ROLE else tag
+        client = next((client for client in self.joining if client.requested_room == room_id), None)
+        if client is None:
+            client = next((client for client in self.joining if not client.requested_room), None)
+        if client is None:
+            return None
+        if opcode != protocol.QUEUED:   # Still waiting for its role otherwise
+            self.joining.remove(client)
+            if opcode == protocol.ROLE:
+                self.clients[room_id] = client
+        return client
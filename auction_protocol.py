@@ -0,0 +1,231 @@
+'''
+Length-prefixed binary framing for the seller/buyer/server TCP protocol.
+
+Every frame is a 5 byte header (payload length as uint32, opcode as uint8)
+followed by the payload. A payload is a fixed struct part with the integer
+fields of the message, followed by the string fields, each prefixed with
+its length as uint16. A framed client starts the connection with MAGIC
+followed by a HELLO frame; clients that do not are served with the legacy
+text protocol, whose messages are rendered by render_text.
+'''
+import struct
+from collections import deque
+
+MAGIC = b"BMF1"     # Sent by framed clients right after connecting
+HEADER = struct.Struct('!IB')   # Payload length, opcode
+STRING_LENGTH = struct.Struct('!H')
+MAX_PAYLOAD = 64 * 1024     # Larger frames are treated as protocol errors
+
+# Roles carried by HELLO and ROLE
+ROLE_ANY = 0
+ROLE_SELLER = 1
+ROLE_BUYER = 2
+ROLE_LIST = 3
+ROLE_SELLER_RECOVERED = 4   # Seller reattached to an auction recovered from the event log
+ROLE_SESSION = 5    # HELLO only: open a session, the room_id field carries the requested participant id
+
+# Auction types carried by AUCTION_REQUEST
+AUCTION_FIRST_PRICE = 1     # Sealed bids, the highest bid wins and pays its bid
+AUCTION_SECOND_PRICE = 2    # Sealed bids, the highest bid wins and pays the second-highest bid
+AUCTION_ENGLISH = 3     # Open ascending bids, the highest bid when bidding closes wins and pays its bid
+
+# Reasons carried by INVALID_BID
+BID_NOT_A_NUMBER = 1
+BID_NEGATIVE = 2
+BID_TOO_LOW = 3     # English auctions: the bid does not beat the standing price
+
+# Client -> server
+HELLO = 0x01            # role, room_id
+AUCTION_REQUEST = 0x02  # auc_type, auc_min_price, max_bids, item_name
+BID = 0x03              # bid_amount
+JOIN = 0x04             # role, room_id: session only, take part in another auction
+SELECT_ROOM = 0x05      # room_id: session only, the next frame is about this room
+
+# Server -> client
+ROLE = 0x10             # role, room_id
+WAITING = 0x11
+BIDDING_STARTED = 0x12
+BID_REQUEST = 0x13
+BID_ACCEPTED = 0x14
+INVALID_REQUEST = 0x15
+INVALID_BID = 0x16      # reason
+WON = 0x17              # price, item_name, seller_ip
+SOLD = 0x18             # price, item_name, buyer_ip
+LOST = 0x19
+NOT_SOLD = 0x1A
+REJECTED = 0x1B         # reason
+ROOM_LIST = 0x1C        # one string per open room
+BIDDING_CLOSED = 0x1D   # sent to buyers dropped for not bidding in time
+QUEUED = 0x1E           # position, sent to clients parked in the admission queue
+SESSION = 0x1F          # participant_id, reply to a session HELLO
+IN_ROOM = 0x20          # room_id: session only, the next frame is about this room
+PRICE_UPDATE = 0x21     # price, leading: standing price of an English auction, leading is 1 for the highest bidder
+
+TEXT = 0x00     # Pseudo opcode for data received over the legacy text protocol
+
+# Opcode -> (struct format of the integer fields, number of string fields or None for "all remaining")
+MESSAGE_FORMATS = {
+    HELLO: ('B', 1),
+    AUCTION_REQUEST: ('BqI', 1),
+    BID: ('q', 0),
+    JOIN: ('B', 1),
+    SELECT_ROOM: ('', 1),
+    ROLE: ('B', 1),
+    WAITING: ('', 0),
+    BIDDING_STARTED: ('', 0),
+    BID_REQUEST: ('', 0),
+    BID_ACCEPTED: ('', 0),
+    INVALID_REQUEST: ('', 0),
+    INVALID_BID: ('B', 0),
+    WON: ('q', 2),
+    SOLD: ('q', 2),
+    LOST: ('', 0),
+    NOT_SOLD: ('', 0),
+    REJECTED: ('', 1),
+    ROOM_LIST: ('', None),
+    BIDDING_CLOSED: ('', 0),
+    QUEUED: ('I', 0),
+    SESSION: ('', 1),
+    IN_ROOM: ('', 1),
+    PRICE_UPDATE: ('qB', 0),
+}
+FIELD_STRUCTS = {opcode: struct.Struct('!' + fields) for opcode, (fields, _) in MESSAGE_FORMATS.items()}
+
+
+class ProtocolError(Exception):
+    """
+    Raised when a peer sends a malformed frame.
+    """
+
+
+def encode_message(opcode, *values):
+    '''
+    Encodes a message into a frame. The integer fields come first, in the
+    order of the opcode's struct, followed by the string fields.
+    '''
+    fields, _ = MESSAGE_FORMATS[opcode]
+    parts = [FIELD_STRUCTS[opcode].pack(*values[:len(fields)])]
+    for value in values[len(fields):]:
+        encoded = value.encode()
+        parts.append(STRING_LENGTH.pack(len(encoded)))
+        parts.append(encoded)
+    payload = b"".join(parts)
+    return HEADER.pack(len(payload), opcode) + payload
+
+
+def decode_payload(opcode, payload):
+    '''
+    Decodes the payload of one frame into a tuple of field values.
+    '''
+    if opcode not in MESSAGE_FORMATS:
+        raise ProtocolError(f"Unknown opcode {opcode}")
+    _, strings = MESSAGE_FORMATS[opcode]
+    fixed = FIELD_STRUCTS[opcode]
+    try:
+        values = list(fixed.unpack_from(payload, 0))
+        offset = fixed.size
+        while (offset < len(payload)) if strings is None else (strings > 0):
+            (length,) = STRING_LENGTH.unpack_from(payload, offset)
+            offset += STRING_LENGTH.size
+            if offset + length > len(payload):
+                raise ProtocolError("Truncated string field")
+            values.append(payload[offset:offset + length].decode())
+            offset += length
+            if strings is not None:
+                strings -= 1
+    except (struct.error, UnicodeDecodeError) as e:
+        raise ProtocolError(f"Malformed payload for opcode {opcode}: {e}")
+    return tuple(values)
+
+
+class FrameDecoder:
+    """
+    Incrementally splits a byte stream into frames, no matter how TCP
+    coalesced or split them.
+    """
+    def __init__(self):
+        self.buffer = bytearray()   # Bytes of incomplete frames
+        self.pending = deque()      # Decoded messages not yet handed out by read()
+
+    def feed(self, data):
+        '''
+        Adds received bytes and returns the list of (opcode, values) for
+        every frame completed by them.
+        '''
+        self.buffer += data
+        messages = []
+        offset = 0
+        while len(self.buffer) - offset >= HEADER.size:
+            length, opcode = HEADER.unpack_from(self.buffer, offset)
+            if length > MAX_PAYLOAD:
+                raise ProtocolError(f"Frame of {length} bytes is too large")
+            end = offset + HEADER.size + length
+            if end > len(self.buffer):
+                break
+            messages.append((opcode, decode_payload(opcode, bytes(self.buffer[offset + HEADER.size:end]))))
+            offset = end
+        del self.buffer[:offset]
+        return messages
+
+    def read(self, sock):
+        '''
+        Blocks until the next message arrives on the socket and returns it.
+        Raises ConnectionError if the peer closes the connection.
+        '''
+        while not self.pending:
+            data = sock.recv(4096)
+            if not data:
+                raise ConnectionError("Connection closed by peer")
+            self.pending.extend(self.feed(data))
+        return self.pending.popleft()
+
+
+def render_text(opcode, *values):
+    '''
+    Renders a server message the way the legacy text protocol sends it.
+    '''
+    if opcode == ROLE:
+        role, room_id = values
+        if role == ROLE_SELLER:
+            return f"Server: Your role is: [Seller]\nAuction room: {room_id}\nPlease submit auction request:\n"
+        if role == ROLE_SELLER_RECOVERED:
+            return f"Server: Your role is: [Seller]\nAuction room: {room_id}\nYour auction was recovered, waiting for the result...\n"
+        return f"Server: Your role is: [Buyer]\nAuction room: {room_id}\n"
+    if opcode == INVALID_BID:
+        if values[0] == BID_NEGATIVE:
+            return "Server: Invalid bid. Please submit a positive integer\n"
+        if values[0] == BID_TOO_LOW:
+            return "Server: Your bid must beat the current price.\n"
+        return "Server: Invalid bid. Try again.\n"
+    if opcode == WON:
+        price, item_name, seller_ip = values
+        return f"Auction Finished!\nYou won this item {item_name}. Your payment due is ${price}. Seller's IP: {seller_ip}\n"
+    if opcode == SOLD:
+        price, item_name, buyer_ip = values
+        return f"Auction Finished!\nSuccess! Your item {item_name} has been sold for ${price}. Winning Buyer's IP: {buyer_ip}\n"
+    if opcode == REJECTED:
+        return f"Server: {values[0]}\n"
+    if opcode == QUEUED:
+        return f"Server: All auction rooms are busy. You are number {values[0]} in the queue.\n"
+    if opcode == SESSION:
+        return f"Server: Session opened. Your participant id is {values[0]}\n"
+    if opcode == IN_ROOM:
+        return ""
+    if opcode == PRICE_UPDATE:
+        price, leading = values
+        return f"Server: Current price is ${price}." + (" You are the highest bidder.\n" if leading else "\n")
+    if opcode == ROOM_LIST:
+        return "Server: Open auction rooms:\n" + "".join(f"{room}\n" for room in values)
+    return TEXT_MESSAGES[opcode]
+
+
+TEXT_MESSAGES = {
+    WAITING: "Server: The Auctioneer is still waiting for other Buyer to connect...\n",
+    BIDDING_STARTED: "Server: Requested number of bidders arrived. Let's start bidding!\n",
+    BID_REQUEST: "Server: Please submit your bid:",
+    BID_ACCEPTED: "Server: Bid received. Please wait...\n",
+    INVALID_REQUEST: "Server: Invalid auction request!\n",
+    LOST: "Server: Unfortunately, you did not win in the last round.\n",
+    NOT_SOLD: "Server: The item was not sold.\n",
+    BIDDING_CLOSED: "Server: The bidding window closed before your bid arrived.\n",
+}
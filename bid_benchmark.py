@@ -0,0 +1,146 @@
+'''
+Microbenchmark of bid ingestion in the Auctioneer server.
+
+Feeds BID frames straight into the server's state machine (on_data) from
+many threads at once, without sockets, and measures how many bids per
+second are accepted and acknowledged as the number of concurrent bidders
+grows. Every bidder thread bids for its own share of buyers; the buyers are
+spread over --rooms auction rooms (one room per bidder thread by default),
+so both independent rooms and bidders contending for the same room can be
+measured.
+
+Connections can be made to stall (their data is never taken by the
+"kernel") to check that a slow buyer does not hold up bid intake for the
+others.
+'''
+import argparse
+import csv
+import threading
+import time
+
+import auction_protocol as protocol
+from server_rdt import BidMasterServer, ClientConnection
+
+
+class MemoryConnection:
+    """
+    In-memory stand-in for a client socket. Takes every write at once, or
+    nothing at all when stalled.
+    """
+    def __init__(self, stalled=False):
+        self.stalled = stalled
+        self.written = 0    # Bytes taken so far
+
+    def send_nowait(self, data):
+        if self.stalled:
+            return 0
+        self.written += len(data)
+        return len(data)
+
+    def wait_writable(self, callback):
+        pass    # A stalled connection never becomes writable
+
+    def getpeername(self):
+        return ('127.0.0.1', 0)
+
+    def fileno(self):
+        return -1
+
+    def close(self):
+        pass
+
+
+def connect(server, role, room_id, index, stalled=False):
+    '''
+    Admits one in-memory client to the server and returns its connection.
+    '''
+    addr = ('127.0.0.1', 10000 + index)
+    conn = ClientConnection(MemoryConnection(stalled), addr, 'framed')
+    server.on_connect(conn, addr, (role, room_id))
+    return conn
+
+
+def run_level(bidders, bids, rooms, stalled, event_log=None):
+    '''
+    Opens the rooms, lets bidders threads submit bids each at the same time
+    and waits until every bid is acknowledged.
+
+    Parameters:
+    - bidders (int): Number of concurrent bidder threads
+    - bids (int): Bids submitted by every bidder thread
+    - rooms (int): Number of auction rooms the buyers are spread over
+    - stalled (int): Number of buyers whose connection never drains
+    - event_log (str): Path of an event log to make every bid durable, or None
+
+    Returns:
+    - (elapsed seconds, server) of the run
+    '''
+    server = BidMasterServer('127.0.0.1', 0, bid_window=None, event_log=event_log, queue_cap=0)
+    total = bidders * bids
+    per_room = [total // rooms + (1 if room < total % rooms else 0) for room in range(rooms)]
+    for room, size in enumerate(per_room):
+        seller = connect(server, 'SELL', f"bench{room}", 0)
+        server.on_data(seller, protocol.encode_message(protocol.AUCTION_REQUEST, 1, 0, size, f"Item{room}"))
+    buyers = [[] for _ in range(bidders)]
+    for index in range(total):
+        room = index % rooms
+        buyers[index % bidders].append(connect(server, 'BUY', f"bench{room}", index + 1, stalled=index < stalled))
+
+    frame = protocol.encode_message(protocol.BID, 100)
+    barrier = threading.Barrier(bidders + 1)
+
+    def bidder(conns):
+        barrier.wait()
+        for conn in conns:
+            server.on_data(conn, frame)
+
+    threads = [threading.Thread(target=bidder, args=(conns,)) for conns in buyers]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    acknowledged = server.metrics.histograms.get(('bid_ingestion_seconds', None))
+    while acknowledged is None or acknowledged.count < total:   # Durable acknowledgements arrive from the committer
+        time.sleep(0.0005)
+        acknowledged = server.metrics.histograms.get(('bid_ingestion_seconds', None))
+    return time.perf_counter() - start, server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure bid ingestion throughput of the Auctioneer server")
+    parser.add_argument('--bidders', type=str, default='1,2,4,8,16,32', help="Comma separated numbers of concurrent bidder threads")
+    parser.add_argument('--bids', type=int, default=2000, help="Bids per bidder thread")
+    parser.add_argument('--rooms', type=int, default=0, help="Auction rooms the buyers are spread over (default: one per bidder)")
+    parser.add_argument('--stalled', type=int, default=0, help="Buyers whose connection never drains")
+    parser.add_argument('--event-log', type=str, default=None, help="Make every bid durable in this event log before it is acknowledged")
+    parser.add_argument('--output', type=str, default='bids.csv', help="CSV file the results are written to")
+    args = parser.parse_args()
+
+    rows = []
+    for bidders in [int(level) for level in args.bidders.split(',')]:
+        rooms = args.rooms or bidders
+        elapsed, server = run_level(bidders, args.bids, rooms, args.stalled, args.event_log)
+        latency = server.metrics.histograms[('bid_ingestion_seconds', None)]
+        row = {
+            'bidders': bidders,
+            'rooms': rooms,
+            'bids': bidders * args.bids,
+            'stalled': args.stalled,
+            'elapsed_s': round(elapsed, 6),
+            'bids_per_s': round(bidders * args.bids / elapsed, 1),
+            'ack_p50_ms': round(latency.quantile(0.5) * 1000, 3),
+            'ack_p99_ms': round(latency.quantile(0.99) * 1000, 3),
+        }
+        rows.append(row)
+        print(f"{bidders} bidder(s) in {rooms} room(s): {row['bids_per_s']} bids/s, ack p50/p99 {row['ack_p50_ms']}/{row['ack_p99_ms']} ms")
+    with open(args.output, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,20 @@
 '''
 import socket
 import argparse
-import json
-import numpy as np
-import base64
+import asyncio
 import hashlib
 import time
-import os
+import auction_protocol as protocol
+import fec
+import merkle_tree
+import net_emulator
+import rdt_checkpoint
+import rdt_file
+import rdt_packet
+import selective_repeat
+from congestion import CongestionController
+from rtt_estimator import RttEstimator
+from auction_client import AuctionClient, AuctionError, AuctionSession, InvalidRequest, Rejected
 
 def validate_auction_request(auction_details):
     '''
@@ -21,8 +29,8 @@ def validate_auction_request(auction_details):
         return False
 
     # Validating auction type input
-    if int(auc_type) not in [1,2]:
-        print("Error: Action type can be either 1 or 2")
+    if int(auc_type) not in [1,2,3]:
+        print("Error: Action type can be either 1, 2 or 3 (English)")
         return False
     
     # Validating item name length
@@ -32,15 +40,15 @@ def validate_auction_request(auction_details):
     return True
 
 
-def send_auction_request(sock):
-    '''Collects auction details from the seller and send them to server.
+def read_auction_request():
+    '''Collects auction details from the seller.
     This function handles the seller's interaction to input
-    auction details and validates the input formart before sending it to the server'''
+    auction details and validates the input formart before they are sent to the server'''
      
     # Input auction details from the seller in a single line
 
     while True:
-        auction_input = input("Enter auction type, minimum price, maximum number of bids, and item name (separated by spaces): ")
+        auction_input = input("Enter auction type (1 first-price, 2 second-price, 3 English), minimum price, maximum number of bids, and item name (separated by spaces): ")
         auction_details = auction_input.split()
 
         if len(auction_details) != 4:
@@ -49,17 +57,9 @@ def send_auction_request(sock):
         
             # validating the input before sending to server
         if validate_auction_request(auction_details): 
-            try:
-                #Unpacking the details
-                auc_type, auc_min_price, max_bids, item_name = auction_details
-                # Creating the auction request string
-                auction_request = f"{auc_type} {auc_min_price} {max_bids} {item_name}"
-                #send the auction details to the server
-                sock.sendall(auction_request.encode())
-                print("Auction request sent to server.")
-                break
-            except Exception as e:
-                print(f"Error: {e}. Invalid input format, please try again.")
+            #Unpacking the details
+            auc_type, auc_min_price, max_bids, item_name = auction_details
+            return int(auc_type), int(auc_min_price), int(max_bids), item_name
         else:
             print("Invalid Request, Please try again!")
 
@@ -70,198 +70,280 @@ def cal_check_sum(file_path):
             hash_obj.update(x)
     return hash_obj.hexdigest()
 
-def seller_client(sock, rdtport, packet_loss_rate):
+async def seller_client(client):
     '''This handles seller side logic. The seller sends
-    auction details and waits for the further messages from
-    the server'''
+    auction details and waits for the result of the auction.
+    A seller reattached to a recovered auction only waits
+    for the result.'''
 
-    send_auction_request(sock)
-    buyer_ip = None
+    if client.role == protocol.ROLE_SELLER:
+        client.request_auction(*await asyncio.to_thread(read_auction_request))
+        print("Auction request sent to server.")
     while True:
         try:
-            # Receive messages from the server
-            message = sock.recv(1024).decode()
-            if message:
-                print(f"{message}")
-            # If the server requests a bid, the buyer submits one    
-            if "Server: Invalid auction request!" in message:
-                send_auction_request(sock)
-                continue
-            if "Buyer's IP:" in message:
-                buyer_ip = message.split("Buyer's IP: ")[1].strip()
-                break
-                # print(buyer_ip) 
-        except Exception as e:
-            print(f"Error receiving message from server: {e}")
-            break
-    handle_file_send(buyer_ip, rdtport, packet_loss_rate)
+            return await client.result()
+        except InvalidRequest:  # The server asks for a corrected request
+            client.request_auction(*await asyncio.to_thread(read_auction_request))
+            print("Auction request sent to server.")
 
-    # Starting a thread to handle incoming messages from the server
-    #threading.Thread(target=handle_server_messages, args=(sock,), daemon=True).start()
+def read_bid(optional=False):
+    '''
+    Prompts the buyer for a bid until an integer is entered. An optional
+    bid (a raise in an English auction) can be skipped with an empty line,
+    in which case None is returned.
+    '''
+    while True:
+        bid_amount = input("Enter a higher bid, or press enter to pass:" if optional else "Enter bid:")
+        if optional and not bid_amount.strip():
+            return None
+        try:
+            return int(bid_amount)
+        except ValueError:
+            print("Invalid bid. Please enter an integer.")
 
-    # Keeping the main thread alive to continue listening for server messages
-    
-def buyer_client(sock, rdtport, packet_loss_rate):
+async def buyer_client(client):
     '''Handles buyer side logic.
-    The buyer receives info from server and 
-    submits bids when prompted.'''
+    The buyer waits for bidding to start and submits
+    a bid when prompted. In English auctions the buyer
+    may raise whenever someone else holds the standing price.'''
     
-    seller_ip = None
-
-    while True:
+    await client.wait_bidding()
+    last_bid = None
+    while last_bid is None:
+        amount = await asyncio.to_thread(read_bid)
         try:
-            # Receive messages from the server
-            message = sock.recv(1024).decode()
-            if message:
-                print(f"{message}")
-
-            # If the server requests a bid, the buyer submits one    
-            if "Please submit your bid" in message:
-                bid_amount = input("Enter bid:")
-                sock.sendall(bid_amount.encode())
-            if "Seller's IP:" in message:
-                seller_ip = message.split("Seller's IP: ")[1].strip()
+            await client.bid(amount)
+            last_bid = amount
+        except AuctionError as e:
+            if e.reason is None:    # The auction is over
                 break
-                # print(seller_ip)
-            if "Unfortunately" in message:
-                return
-        except Exception as e:
-            print(f"Error receiving message from server: {e}")
+
+    # Outbid in an English auction: offer a raise. Sealed auctions get no price updates
+    while last_bid is not None:
+        update = await client.next_price()
+        if update is None:
             break
-    handle_file_receive(seller_ip, rdtport, packet_loss_rate)
+        price, leading = update
+        if leading or price < last_bid:
+            continue
+        amount = await asyncio.to_thread(read_bid, True)
+        if amount is None:
+            continue
+        try:
+            await client.bid(amount)
+            last_bid = amount
+        except AuctionError:
+            pass
+    return await client.result()
     
     
 
-def open_udp_socket(rdtport):
+def open_udp_socket(rdtport, local_ip='0.0.0.0'):
     '''
     Opens and binds a UDP socket to the specified rdtport
     '''
     udp_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    udp_socket.bind(('0.0.0.0', rdtport))
+    udp_socket.bind((local_ip, rdtport))
     # print("UDP socket opened for RDT")
     return udp_socket
 
 
-def handle_file_send(buyer_ip, rdtport, packet_loss_rate=0.0):
+FIN_ATTEMPTS = 8    # Expired timeouts in a row before the seller stops waiting for the fin/ack
+START_ATTEMPTS = 20     # Expired timeouts in a row before the seller gives up on the start message
+
+
+def handle_file_send(buyer_ip, rdtport, impairments=None, window=None, chunk_size=rdt_packet.CHUNK_SIZE, local_ip='0.0.0.0', fec_block=None):
     '''
     Implements RDT mechanism for file send. Both the seller and buyer use the same ports on each end
     for RDT.
     This function sends a a file in chunks to specified buyer's IP address and ensures that each chunk
     is acknowledged before proceeding to the next.
-    Also simulates packet loss based on a specified packet loss rate.
+    With a window, up to that many chunks are in flight at once using Selective Repeat (see selective_repeat.py)
+    instead of Stop-and-Wait.
+    Impairments (see net_emulator.py) are applied to the ACKs the seller receives, to test the transfer.
+    The socket is bound to local_ip, so that a seller and a buyer can share the rdtport on one host.
 
     Notes:
-        - This function uses a 2 second timeout for retransmisions and 5 second timeout for the fin message reply (fin/ack)
-          to close the connection with the receiver.
+        - Retransmissions follow the round trip time measured on the ACKs (see rtt_estimator.py). The fin message is
+          retransmitted the same way, and the sender gives up on the fin/ack after FIN_ATTEMPTS expired timeouts in a row.
+          The RTT and timeout of the transfer are printed before the fin message is sent, along with the throughput of
+          the data and, with a window, the congestion window and pacing rate it ended with (see congestion.py).
         - Checksum is calculated for entire file and sent with start message to ensure data integrity
+        - The start message offers its options (sr, version, merkle, resume, ...) apart from its data, so that a buyer
+          from before them reads it as a plain start message and answers in version 1 (see rdt_packet.py). The transfer
+          is given up if the buyer does not answer it within START_ATTEMPTS expired timeouts in a row
+        - With a window, the start message offers Selective Repeat; without the buyer's consent the chunks are sent
+          with Stop-and-Wait
+        - The start message offers the binary packet format (see rdt_packet.py); every packet after it uses the
+          version the buyer picked in its ACK
+        - A chunk size other than rdt_packet.CHUNK_SIZE is announced in the start message, and the transfer is
+          given up if the buyer does not accept it
+        - With a window and fec_block, the start message offers FEC (see fec.py) starting from fec_block data packets
+          per parity packet; without the buyer's consent the transfer goes on without it
+        - The start message offers to resume an interrupted transfer (see rdt_checkpoint.py); if the buyer names the
+          chunks it misses in its ACK, only those are sent
     '''
 
-    udp_socket = open_udp_socket(rdtport) # Create UDP socket for file transfer
-    udp_socket.settimeout(2)  # Set a 2-second timeout for retransmissions
+    udp_socket = net_emulator.emulate(open_udp_socket(rdtport, local_ip), impairments) # Create UDP socket for file transfer
+    rtt = RttEstimator()    # Retransmission timeout, adapted to the measured round trip time
     seq_num = 0  # Initialize sequence number for Stop-and-Wait protocol
+    version = rdt_packet.JSON_VERSION   # Packet format, until the buyer picked one
+    congestion = CongestionController(rtt, window, chunk_size) if window else None
     file_path = 'tosend.file'  # Specify the file path
     print("Disconnecting from the Auctioneer Server. Auction is over!")
     print("UDP socket opened for RDT")
     print("Start sending file")
 
     try:
-        with open(file_path, 'rb') as file:
+        with rdt_file.ChunkReader(file_path) as file:  # Chunks are read from disk as they are sent
             # Calculate total file size
-            file_data = file.read()
-            file_size = os.path.getsize(file_path)
+            file_size = file.size
 
-            #Creating checksum for the data
-            original_checksum = cal_check_sum(file_path)
+            #Creating checksum and per-chunk hash tree for the data, in one pass over the file
+            tree, original_checksum = merkle_tree.build(file, chunk_size)
+            proofs = None   # The tree, once the buyer accepted to verify chunks with it
 
             # Send a start message with the total file size (control message with TYPE=0)
-            start_message = {
-                'TYPE': 0,               # Control message type (0 indicates a control message)
-                'SEQ/ACK': seq_num,      # Initial sequence number
-                'DATA': f'start {file_size} {original_checksum}'  # Start message data
-            }
-            udp_socket.sendto(json.dumps(start_message).encode(), (buyer_ip, rdtport))
+            offered = {}
+            if window:
+                offered['sr'] = window  # Offers Selective Repeat
+            offered['version'] = rdt_packet.VERSION   # Offers the binary packet format
+            offered['merkle'] = tree.root.hex()   # Offers per-chunk verification
+            if chunk_size != rdt_packet.CHUNK_SIZE:
+                offered['chunk'] = chunk_size
+            offered['resume'] = 1   # Offers to send only the chunks the buyer misses
+            if window and fec_block:
+                offered['fec'] = fec_block   # Offers parity packets
+            start_message = rdt_packet.start_message(file_size, original_checksum, offered)
+            udp_socket.sendto(start_message, (buyer_ip, rdtport))
             print(f"Sending control seq 0: start {file_size}")
+            sent_at = time.monotonic()
+            resent = False
+            expired = 0     # Timeouts in a row without the start ACK
 
             # Wait for acknowledgment for the start message
             while True:
                 try:
-                    # simulating the packet loss
-                    if np.random.binomial(1, packet_loss_rate) == 1:
-                        print(f"Ack dropped: {seq_num}")
-                        continue 
-                    message, addr = udp_socket.recvfrom(1024)
-                    message = json.loads(message.decode())
-                    if message['SEQ/ACK'] == seq_num and message['TYPE'] == 0 and addr[0] == buyer_ip:
+                    udp_socket.settimeout(rtt.timeout())
+                    datagram, addr = udp_socket.recvfrom(1024)
+                    message = rdt_packet.decode(datagram)
+                    if message is not None and rdt_packet.is_start_ack(datagram, message) and addr[0] == buyer_ip:
                         print(f"Ack received: {seq_num}")
+                        rtt.acknowledged()  # Without a sample the data starts from the initial timeout (RFC 6298 5.7)
+                        if not resent:  # Karn's rule: no samples from retransmitted packets
+                            rtt.sample(time.monotonic() - sent_at)
+                        accepted = rdt_packet.accepted_options(message)
+                        version = int(accepted.get('version', rdt_packet.JSON_VERSION))
+                        if 'merkle' in accepted:
+                            proofs = tree
                         seq_num = 1
                         break
                     else:
                         print("Unexpected ACK or from unknown IP. Discarding.")
                         continue
                 except socket.timeout:
+                    expired += 1
+                    if expired == START_ATTEMPTS:
+                        print("The buyer does not acknowledge the start message. Transfer aborted.")
+                        return
+                    rtt.back_off()
+                    resent = True
                     print(f"Msg re-sent: {seq_num}")
-                    udp_socket.sendto(json.dumps(start_message).encode(), (buyer_ip, rdtport))
+                    udp_socket.sendto(start_message, (buyer_ip, rdtport))
                     print(f"Sending control seq {seq_num}: start {file_size}")
                     continue
 
-            # Send file data in chunks
-            for i in range(0, file_size, 2000):
-                chunk_data = base64.b64encode(file_data[i:i + 2000]).decode('utf-8')
-                actual_chunk_size = len(file_data[i:i + 2000]) 
-
-                # Prepare the data packet (TYPE=1 indicates a data packet)
-                message = {
-                    'TYPE': 1,                 # Data packet type
-                    'SEQ/ACK': seq_num,        # Sequence number for Stop-and-Wait protocol
-                    'DATA': chunk_data  # Convert binary data to string for JSON serialization
-                }
-                print(f"Sending data seq {seq_num}: {i+actual_chunk_size} / {file_size}")
-                sent = False
-                while not sent:
-                    # Send the message as JSON
-                    udp_socket.sendto(json.dumps(message).encode(), (buyer_ip, rdtport))
-                    # print(f"Sent packet with sequence number {seq_num}")
-
-                    try:
-                        # Wait for an acknowledgment
-                        if np.random.binomial(1, packet_loss_rate) == 1:
-                            print(f"Ack dropped: {seq_num}")
-                            continue  ## skipping the further processing
-                        response, addr = udp_socket.recvfrom(1024)
-                        response_message = json.loads(response.decode())
-                        if addr[0] == buyer_ip and response_message['SEQ/ACK'] == seq_num and response_message['TYPE'] == 0:
-                            print(f"ACK received: {seq_num}")
-                            # Toggle sequence number for Stop-and-Wait (0 -> 1 or 1 -> 0)
-                            seq_num = 1 - seq_num
-                            sent = True
-                        else:
-                            print(f"Msg re-sent: {seq_num}")    # For mismatched ack
-                    except socket.timeout:
-                         print(f"Msg re-sent: {seq_num}")
+            if window and 'sr' not in accepted:
+                print("The buyer does not accept Selective Repeat. Falling back to Stop-and-Wait.")
+                window = None
+                congestion = None
+
+            if chunk_size != rdt_packet.CHUNK_SIZE and accepted.get('chunk') != str(chunk_size):
+                print(f"The buyer does not accept a chunk size of {chunk_size} bytes")
+                return
+
+            chunk_count = merkle_tree.leaf_count(file_size, chunk_size)
+            chunks = rdt_checkpoint.ChunkRanges.parse(accepted['resume'], chunk_count) if 'resume' in accepted else None
+            if chunks is None:
+                chunks = rdt_checkpoint.ChunkRanges.all(chunk_count)
+            else:
+                print(f"Resuming transfer: {chunks.count} of {chunk_count} chunks left")
+
+            start_time = time.monotonic()
+            if window:
+                fec_block = int(accepted['fec']) if 'fec' in accepted else None
+                seq_num = selective_repeat.send_window(udp_socket, buyer_ip, rdtport, file, window, version, rtt, proofs, chunk_size, fec_block,
+                                                       congestion, chunks)
+            else:
+                # Send file data in chunks (Stop-and-Wait)
+                for data_seq in range(1, chunks.count + 1):
+                    i = chunks.chunk(data_seq) * chunk_size
+                    chunk_data = file.read(i, chunk_size)
+                    actual_chunk_size = len(chunk_data)
+
+                    # Prepare the data packet (TYPE=1 indicates a data packet), with the proof of the chunk in front
+                    proof = proofs.proof(i // chunk_size) if proofs else b''
+                    message = rdt_packet.encode(version, rdt_packet.TYPE_DATA, seq_num, proof + chunk_data)
+                    print(f"Sending data seq {seq_num}: {i+actual_chunk_size} / {file_size}")
+                    sent = False
+                    transmissions = 0
+                    while not sent:
+                        udp_socket.sendto(message, (buyer_ip, rdtport))
+                        # print(f"Sent packet with sequence number {seq_num}")
+                        transmissions += 1
+                        if transmissions == 1:
+                            sent_at = time.monotonic()
+
+                        try:
+                            # Wait for an acknowledgment
+                            udp_socket.settimeout(rtt.timeout())
+                            response, addr = udp_socket.recvfrom(1024)
+                            response_message = rdt_packet.decode(response)
+                            if (response_message is not None and addr[0] == buyer_ip and response_message.seq == seq_num and response_message.type == rdt_packet.TYPE_CONTROL
+                                    and not (version != rdt_packet.JSON_VERSION and rdt_packet.is_start_ack(response, response_message))):
+                                print(f"ACK received: {seq_num}")
+                                rtt.acknowledged()
+                                if transmissions == 1:  # Karn's rule: no samples from retransmitted packets
+                                    rtt.sample(time.monotonic() - sent_at)
+                                # Toggle sequence number for Stop-and-Wait (0 -> 1 or 1 -> 0)
+                                seq_num = 1 - seq_num
+                                sent = True
+                            else:
+                                print(f"Msg re-sent: {seq_num}")    # For mismatched ack, or a NACK of a chunk that failed verification
+                        except socket.timeout:
+                             rtt.back_off()
+                             print(f"Msg re-sent: {seq_num}")
+
+        transfer_time = time.monotonic() - start_time
+        sent_size = chunks.size(file_size, chunk_size)
+        print(f"Data sent: {sent_size} bytes / {round(transfer_time, 6)} seconds = {get_average_throughput(sent_size, transfer_time)} bps")
+        if congestion is not None:
+            print(congestion.report())
+        print(rtt.report())     # RTT and timeout of the data transfer, before fin backs off
 
         # Send end-of-transmission control message (TYPE=0)
-        end_message = {
-            'TYPE': 0,
-            'SEQ/ACK': seq_num,
-            'DATA': 'fin'
-        }
+        end_message = rdt_packet.encode(version, rdt_packet.TYPE_CONTROL, seq_num, 'fin')
 
-        udp_socket.settimeout(5)
+        expired = 0     # Timeouts in a row without any reply
         try:
-            while True:
-                udp_socket.sendto(json.dumps(end_message).encode(), (buyer_ip, rdtport))
+            while expired < FIN_ATTEMPTS:
+                udp_socket.sendto(end_message, (buyer_ip, rdtport))
                 print(f"Sending control seq: {seq_num} : fin")
-                response, addr = udp_socket.recvfrom(1024)
-                if np.random.binomial(1, packet_loss_rate) == 1:
-                    print(f"Ack dropped: {seq_num}")
-                    continue  ## skipping the further processing
-                response_message = json.loads(response.decode())
+                udp_socket.settimeout(rtt.timeout())
+                try:
+                    response, addr = udp_socket.recvfrom(1024)
+                except socket.timeout:
+                    rtt.back_off()
+                    expired += 1
+                    continue
+                expired = 0
+                response_message = rdt_packet.decode(response)
                 # print(message)
-                if addr[0] == buyer_ip and response_message['SEQ/ACK'] == seq_num and response_message['TYPE'] == 0 and 'fin/ack' in response_message['DATA']:
+                if response_message is not None and addr[0] == buyer_ip and response_message.seq == seq_num and response_message.type == rdt_packet.TYPE_CONTROL and 'fin/ack' in (response_message.data or ''):
                     print(f"Ack Received: {seq_num}")
                     break
-        except socket.timeout:
-            print("Timeout occured.")
+            else:
+                print("Timeout occured.")
         except Exception as e:
             print(f"Error: {e}")
 
@@ -273,33 +355,62 @@ def handle_file_send(buyer_ip, rdtport, packet_loss_rate=0.0):
     except Exception as e:
         print(f"Unexpected error during file transfer: {e}")
     finally:
+        if isinstance(udp_socket, net_emulator.EmulatedSocket):
+            print(udp_socket.report())
         udp_socket.close()
         print("UDP socket closed.")
 
     
-def handle_file_receive(seller_ip, rdtport, packet_loss_rate=0.0):
+def handle_file_receive(seller_ip, rdtport, impairments=None, local_ip='0.0.0.0'):
     '''
     Implements RDT mechanism for file send. Both the seller and buyer use the same ports on each end
     for RDT.
     This function receives a file in chunks from the specified serller's IP and ensures that each chunk is 
     acknowledged before the next one is received.
-    The function also simulates packet loss based on a specified packet loss rate.
+    If the seller announces a window in the start message, the chunks are received with Selective Repeat instead.
+    Impairments (see net_emulator.py) are applied to the packets the buyer receives, to test the transfer.
+    The socket is bound to local_ip, so that a seller and a buyer can share the rdtport on one host.
     Prints total average throughput after file reception and verification
 
     Notes:
         - The function uses a 2-second timeout for retransmissions
         - A checksum is received with the start message with the checksum of the file and the checksum is recalculated
           to verify file integrity of the received file.  
+        - If the seller offers the binary packet format (see rdt_packet.py), the ACK of the start message accepts it
+          and every packet after that uses it. Damaged packets are dropped like lost ones.
+        - Every chunk is written to its offset in 'received.file' as it arrives (see rdt_file.py), so memory use
+          does not grow with the file size.
+        - If the seller announces the root of its hash tree (see merkle_tree.py), every chunk is verified as it
+          arrives and re-requested with a NACK if it does not match, so the file is not read again at the end.
+        - The chunk size is the one the seller announces, rdt_packet.CHUNK_SIZE if it does not.
+        - If the seller offers FEC along with Selective Repeat (see fec.py), it is accepted, and lost chunks are
+          rebuilt from parity packets where possible.
+        - If the seller offers to resume, every written chunk is recorded on disk under the file's checksum (see
+          rdt_checkpoint.py), and a transfer of the same file that was interrupted before only asks for the chunks
+          that are still missing. The file is renamed to 'received.file' once it is complete and intact.
+
+    Returns:
+    - (bytes received in this transfer, transfer completion time in seconds) if the file arrived intact, None otherwise
     '''
-    udp_socket = open_udp_socket(rdtport)
+    udp_socket = net_emulator.emulate(open_udp_socket(rdtport, local_ip), impairments)
     expected_seq_num = 0
-    file_data = b''
-    ack_message = {}
+    file = None     # received.file, allocated once the size is known
+    checkpoint = None   # On-disk record of the chunks written, if the seller offers to resume
+    chunks = None   # Chunks the seller sends, all of them unless the transfer is resumed
+    chunks_received = 0     # Data packets written so far (Stop-and-Wait)
+    ack_message = b''
+    version = rdt_packet.JSON_VERSION   # Packet format picked from the seller's offer
+    buffer_size = rdt_packet.MAX_PACKET_SIZE
     start_time = None
     end_time = None
     udp_socket.settimeout(2)
     total_file_size=0
     current_size =0
+    window = None   # Selective Repeat window announced by the seller
+    chunk_size = rdt_packet.CHUNK_SIZE  # Bytes of file data per data packet, announced by the seller
+    verifier = None     # Checks every chunk against the seller's hash tree, if it announced one
+    addr = None
+    digest = hashlib.sha256()   # Checksum of the chunks received so far, in order
     print("Disconnecting from the Auctioneer Server. Auction is over!")
     print("UDP socket opened for RDT")
     print("Start receiving file")
@@ -308,110 +419,157 @@ def handle_file_receive(seller_ip, rdtport, packet_loss_rate=0.0):
     try:
         while True:
             try:
-                if np.random.binomial(1, packet_loss_rate) == 1:
-                    print("Pkt dropped: 0")
-                    continue  # Simulate packet loss by discarding the message
+                response, addr = udp_socket.recvfrom(buffer_size)
 
-                response, addr = udp_socket.recvfrom(4096)
-
-                response_message = json.loads(response.decode())
+                response_message = rdt_packet.decode(response)
 
                 if addr[0] != seller_ip:
                     continue
+                if response_message is None:
+                    print("Damaged packet dropped")
+                    continue
 
-                if response_message['TYPE'] == 0:
-                    if 'start' in response_message['DATA']:
-                        seq_num = response_message.get('SEQ/ACK', None)  # Assuming 'SEQ_NUM' is the key holding the sequence number
-                        if seq_num is None:
-                            print("Error: sequence number is missing")
+                if response_message.type == rdt_packet.TYPE_CONTROL:
+                    if 'start' in (response_message.data or ''):
+                        seq_num = response_message.seq
+                        print(f"Msg received: {seq_num}")
+                        split_data = response_message.data.split()
+                        # start <size> <checksum>, with the options apart: sr <window>, version <n>, merkle <root>, chunk <size>, fec <block>, resume 1
+                        options = rdt_packet.offered_options(response)
+                        chunk_size = int(options.get('chunk', rdt_packet.CHUNK_SIZE))
+                        if len(split_data) == 3 and rdt_packet.MIN_CHUNK_SIZE <= chunk_size <= rdt_packet.MAX_CHUNK_SIZE:
+                            total_file_size = int(split_data[1])
+                            original_checksum = split_data[2]
+                            version = min(int(options.get('version', rdt_packet.JSON_VERSION)), rdt_packet.VERSION)
+                            accepted = {'version': version} if version != rdt_packet.JSON_VERSION else {}
+                            if 'sr' in options:
+                                window = int(options['sr'])
+                                accepted['sr'] = window
+                            if 'merkle' in options:
+                                verifier = merkle_tree.ChunkVerifier(bytes.fromhex(options['merkle']), total_file_size, chunk_size)
+                                accepted['merkle'] = 1
+                            if 'chunk' in options:
+                                accepted['chunk'] = chunk_size
+                            if 'fec' in options and window:
+                                accepted['fec'] = min(max(int(options['fec']), fec.MIN_BLOCK), fec.MAX_BLOCK)
+                            buffer_size = rdt_packet.datagram_size(version, chunk_size + (verifier.max_proof_size if verifier else 0))
+                            if file is None:
+                                chunk_count = merkle_tree.leaf_count(total_file_size, chunk_size)
+                                chunks = rdt_checkpoint.ChunkRanges.all(chunk_count)
+                                if 'resume' in options:
+                                    checkpoint = rdt_checkpoint.Checkpoint(original_checksum, total_file_size, chunk_size)
+                                    file = rdt_file.ChunkWriter(checkpoint.part_path, total_file_size, keep=checkpoint.resumed)
+                                    if checkpoint.resumed:
+                                        chunks = checkpoint.missing()
+                                        print(f"Resuming transfer: {chunks.count} of {chunk_count} chunks left")
+                                else:
+                                    file = rdt_file.ChunkWriter('received.file', total_file_size)
+                            if checkpoint is not None and checkpoint.resumed:
+                                accepted['resume'] = chunks.text()
                         else:
-                            print(f"Msg received: {seq_num}")
-                            split_data = response_message['DATA'].split()
-                            if len(split_data) == 3:
-                                total_file_size = int(split_data[1])
-                                original_checksum = split_data[2]
-                            
-                            else:
-                                print("Invalid start message format received.")
-                                return
+                            print("Invalid start message format received.")
+                            return
 
-                        ack_message = {
-                            'TYPE': 0,
-                            'SEQ/ACK': expected_seq_num,
-                            'DATA': None
-                        }
-                        udp_socket.sendto(json.dumps(ack_message).encode(), addr)
+                        # The ACK of the start message is always JSON, and names the accepted options
+                        ack_message = rdt_packet.start_ack(seq_num, accepted)
+                        udp_socket.sendto(ack_message, addr)
 
                         print(f"Ack sent: 0")
                         expected_seq_num = 1
                         start_time = time.time()
+                        if window:
+                            current_size, end_time = selective_repeat.receive_window(udp_socket, seller_ip, window, file, version, ack_message, verifier, chunk_size, 'fec' in accepted,
+                                                                                 chunks, checkpoint)
+                            break
                 
-                    elif 'fin' in response_message['DATA']:
-                        ack_message = {
-                            'TYPE': 0,
-                            'SEQ/ACK': expected_seq_num,
-                            'DATA': "fin/ack"
-                        }
-                        udp_socket.sendto(json.dumps(ack_message).encode(), addr)
+                    elif 'fin' in (response_message.data or ''):
+                        ack_message = rdt_packet.encode(version, rdt_packet.TYPE_CONTROL, expected_seq_num, "fin/ack")
+                        udp_socket.sendto(ack_message, addr)
                         # print("Received end of transmission signal. Sent fin/ack")
                         print(f"Msg received: {seq_num}")
                         print(f"Ack sent: {expected_seq_num}")
                         end_time = time.time()
                         break
 
-                if response_message['TYPE'] == 1:
+                if response_message.type == rdt_packet.TYPE_DATA:
                     
-                    seq_num = response_message['SEQ/ACK']
+                    seq_num = response_message.seq
                     if seq_num == expected_seq_num:
                         print(f"Msg received: {seq_num}")
-                        
-                        chunk_data = base64.b64decode(response_message['DATA'].encode('utf-8'))
 
-                        file_data += chunk_data
-                        current_size = len(file_data)
+                        if chunks_received == chunks.count:
+                            continue    # Not a chunk of this transfer
+                        index = chunks.chunk(chunks_received + 1)
+                        chunk = response_message.data
+                        if verifier is not None:
+                            chunk = verifier.check(index, chunk)
+                            if chunk is None:
+                                print(f"Msg {seq_num} failed verification, re-requested")
+                                udp_socket.sendto(rdt_packet.encode(version, rdt_packet.TYPE_NACK, seq_num), addr)
+                                continue
+                        file.write(index * chunk_size, chunk)
+                        if checkpoint is not None:
+                            checkpoint.mark(index)
+                        chunks_received += 1
+                        digest.update(chunk)
+                        current_size += len(chunk)
                         print(f"Ack sent: {seq_num}")
                         print(f"Received Data seq {seq_num} : {current_size}/{total_file_size}")
 
-                        ack_message = {
-                            'TYPE': 0,
-                            'SEQ/ACK': seq_num,
-                            'DATA': None
-                        }
+                        ack_message = rdt_packet.encode(version, rdt_packet.TYPE_CONTROL, seq_num)
                         
 
-                        udp_socket.sendto(json.dumps(ack_message).encode(), addr)
+                        udp_socket.sendto(ack_message, addr)
                         
 
                         expected_seq_num = 1 - expected_seq_num
                     
                     else:
                         print(f"Msg received with mismatched sequence number {seq_num}. Expecting {expected_seq_num}")
-                        udp_socket.sendto(json.dumps(ack_message).encode(), addr)
+                        udp_socket.sendto(ack_message, addr)
                         print(f"Ack re-sent: {seq_num}")
             except socket.timeout:
                 print("Timeout occured.")
-                udp_socket.sendto(json.dumps(ack_message).encode(), addr)
+                if addr is not None:    # Nothing arrived yet, the seller repeats the start message
+                    udp_socket.sendto(ack_message, addr)
                 continue
     
 
         transfer_completion_time = round(end_time - start_time, 6)
         # print(f"Test tct timer: {transfer_completion_time}")
-        with open('received.file', 'wb') as file:
-            file.write(file_data)
+        file.close()
         # print("File received and saved as 'received.file'")
-        ## creating checksum for the received data
-        received_checksum = cal_check_sum('received.file')
-
-        if received_checksum == original_checksum :
+        ## checking the received data: every chunk was verified as it arrived, or was hashed in order
+        resumed = checkpoint is not None and checkpoint.resumed
+        if verifier is not None:
+            intact = checkpoint.complete() if resumed else current_size == total_file_size
+        elif window or resumed:
+            intact = cal_check_sum(checkpoint.part_path if checkpoint else 'received.file') == original_checksum    # Chunks arrive out of order
+        else:
+            intact = digest.hexdigest() == original_checksum
+
+        if checkpoint is not None:
+            if intact:
+                checkpoint.finish()
+            else:
+                checkpoint.discard()    # Start over next time
+        if intact:
             print("All data received! Exiting.....")
             throughput = get_average_throughput(current_size, transfer_completion_time)
             print(f"Transmission finished: {current_size} bytes / {transfer_completion_time} seconds = {throughput} bps")
+            return current_size, transfer_completion_time
         else:
             print("File transfer is complete and the file is corrupted")
     
     except Exception as e:
         print(f"Unexpected error during file reception: {e}")
     finally:
+        if file is not None:
+            file.close()
+        if checkpoint is not None:
+            checkpoint.close()  # Kept on disk if the transfer did not finish
+        if isinstance(udp_socket, net_emulator.EmulatedSocket):
+            print(udp_socket.report())
         udp_socket.close()
         print("UDP socket closed.")
 
@@ -421,25 +579,103 @@ def get_average_throughput(bytes, seconds):
     '''
     return round(bytes / seconds, 6)
         
-def connect_to_server(host, port, rdtport, packet_loss_rate):
+def print_message(opcode, values):
+    '''
+    Prints a message from the server.
+    '''
+    print(protocol.render_text(opcode, *values))
+
+def transfer_item(result, rdtport, impairments=None, window=None, chunk_size=rdt_packet.CHUNK_SIZE, fec_block=None):
+    '''
+    Sends the item file to the winning buyer (seller side), or receives
+    it from the seller (winning buyer side), once the auction is over.
+    The seller sends with Selective Repeat if a window is given, and with
+    Stop-and-Wait otherwise; the buyer follows the seller.
+    '''
+    if result is None:
+        return
+    if result.outcome == 'sold':
+        handle_file_send(result.peer_ip, rdtport, impairments, window, chunk_size, fec_block=fec_block)
+    elif result.outcome == 'won':
+        handle_file_receive(result.peer_ip, rdtport, impairments)
+
+async def take_part(client, role, room_id=None):
+    '''Asks the server for a role and runs the seller or buyer
+    logic for one auction. Returns the result of the auction,
+    or None if the client did not take part.'''
+
+    try:
+        # decides the role based on the assignment from the server and invokes the logic
+        if await client.connect(role, room_id) == protocol.ROLE_BUYER:
+            return await buyer_client(client)
+        return await seller_client(client)
+    except Rejected:    # The server's reason is printed already
+        return None
+    except AuctionError as e:
+        print(f"Error receiving message from server: {e}")
+        return None
+
+async def run_client(host, port, role, room_id):
+    '''
+    Takes part in one auction over a connection of its own.
+    '''
+    client = AuctionClient(host, port, on_message=print_message)
+    try:
+        return await take_part(client, role, room_id)
+    finally:
+        await client.close()
+
+def connect_to_server(host, port, rdtport, impairments=None, role=None, room=None, window=None, chunk_size=rdt_packet.CHUNK_SIZE, fec_block=None):
     '''Establishes a connection to the auction server.
     Based on the role assigned by the server (Seller or Buyer),
-    it calls the appropriate client logic.'''
+    it calls the appropriate client logic, then transfers the
+    item if it was sold.
+    The client speaks the framed protocol through auction_client: it
+    asks the server to open a new auction room (seller), join the
+    requested room (buyer) or pick a role itself (no role given).'''
+
+    print(f"Connecting to server at {host}:{port}...")
+    hello_role = {'seller': protocol.ROLE_SELLER, 'buyer': protocol.ROLE_BUYER}.get(role, protocol.ROLE_BUYER if room else protocol.ROLE_ANY)
+    result = asyncio.run(run_client(host, port, hello_role, room))
+    transfer_item(result, rdtport, impairments, window, chunk_size, fec_block)
+
+async def run_session(host, port, rdtport, impairments=None, participant=None, window=None, chunk_size=rdt_packet.CHUNK_SIZE, fec_block=None):
+    '''
+    Lets the user sell or bid in one auction after the other over a session.
+    '''
+    session = AuctionSession(host, port, participant, on_message=print_message)
+    try:
+        await session.open()
+    except AuctionError:
+        return
+    try:
+        while True:
+            choice = (await asyncio.to_thread(input, "Enter 'seller' or 'buyer' followed by an optional room id, 'list' or 'quit': ")).split()
+            if not choice:
+                continue
+            if choice[0] == 'quit':
+                return
+            if choice[0] == 'list':
+                await session.list_rooms()
+                continue
+            if choice[0] not in ('seller', 'buyer') or len(choice) > 2:
+                print("Invalid choice, please try again!")
+                continue
+            room_id = choice[1] if len(choice) == 2 else None
+            role = protocol.ROLE_SELLER if choice[0] == 'seller' else protocol.ROLE_BUYER
+            result = await take_part(session.auction(), role, room_id)
+            await asyncio.to_thread(transfer_item, result, rdtport, impairments, window, chunk_size, fec_block)  # The session stays served meanwhile
+    finally:
+        await session.close()
+
+def session_client(host, port, rdtport, impairments=None, participant=None, window=None, chunk_size=rdt_packet.CHUNK_SIZE, fec_block=None):
+    '''Opens a session with the auction server. The connection stays
+    open and keeps the same participant id while the user sells or bids
+    in one auction after the other.'''
+
+    print(f"Connecting to server at {host}:{port}...")
+    asyncio.run(run_session(host, port, rdtport, impairments, participant, window, chunk_size, fec_block))
 
-    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
-        print(f"Connecting to server at {host}:{port}...")
-        sock.connect((host, port))
-        
-        # Receive initial role assignment from the server
-        initial_message = sock.recv(1024).decode()
-        print(f"{initial_message}")
-        
-        # decides the role based on the initial message from the server and invokes the logic
-        if "[Seller]" in initial_message:
-            seller_client(sock, rdtport, packet_loss_rate)
-        elif "[Buyer]" in initial_message:
-            buyer_client(sock, rdtport, packet_loss_rate)
-        
 
 def validate_float(value):
     '''
@@ -461,11 +697,37 @@ def main():
     parser.add_argument('port', type=int, help="The server port")
     parser.add_argument('rdtport', type=int, help="The host rdtport")
     parser.add_argument('packet_loss_rate', type=validate_float, help="Set packet loss rate, must range between 0 and 1", default=0, nargs='?')
+    parser.add_argument('--role', choices=['seller', 'buyer'], default=None, help="Host a new auction room or join one as a buyer (default: let the server decide)")
+    parser.add_argument('--room', type=str, default=None, help="Auction room id to host or join (buyers without a room join any open room)")
+    parser.add_argument('--session', action='store_true', help="Stay connected and take part in one auction after the other")
+    parser.add_argument('--participant', type=str, default=None, help="Participant id to use in session mode (default: assigned by the server)")
+    parser.add_argument('--rdt-mode', choices=['selective-repeat', 'stop-and-wait'], default='selective-repeat', help="How the seller sends the item file (the buyer follows the seller)")
+    parser.add_argument('--window', type=int, default=selective_repeat.DEFAULT_WINDOW, help="Packets in flight in selective-repeat mode")
+    parser.add_argument('--fec', type=int, default=0, help="Data packets per parity packet the seller starts from in selective-repeat mode, adapted to the measured loss (0: no FEC)")
+    parser.add_argument('--chunk-size', type=int, default=rdt_packet.CHUNK_SIZE, help="Bytes of file data per packet the seller sends")
+    parser.add_argument('--delay', type=float, default=0.0, help="Emulated delay in seconds of every packet this client receives")
+    parser.add_argument('--jitter', type=float, default=0.0, help="Emulated jitter in seconds, added to or taken from the delay")
+    parser.add_argument('--reorder', type=validate_float, default=0.0, help="Probability that a received packet is held back behind later ones")
+    parser.add_argument('--duplicate', type=validate_float, default=0.0, help="Probability that a received packet arrives twice")
+    parser.add_argument('--seed', type=int, default=None, help="Seed of the emulated impairments, for reproducible runs")
     
     args = parser.parse_args()
+    if args.window < 1:
+        parser.error("--window must be at least 1")
+    if args.fec and not fec.MIN_BLOCK <= args.fec <= fec.MAX_BLOCK:
+        parser.error(f"--fec must be 0 or between {fec.MIN_BLOCK} and {fec.MAX_BLOCK}")
+    if not rdt_packet.MIN_CHUNK_SIZE <= args.chunk_size <= rdt_packet.MAX_CHUNK_SIZE:
+        parser.error(f"--chunk-size must be between {rdt_packet.MIN_CHUNK_SIZE} and {rdt_packet.MAX_CHUNK_SIZE}")
+    if args.delay < 0 or args.jitter < 0:
+        parser.error("--delay and --jitter must not be negative")
+    window = args.window if args.rdt_mode == 'selective-repeat' else None
+    impairments = net_emulator.Impairments(args.packet_loss_rate, args.delay, args.jitter, args.reorder, args.duplicate, args.seed)
 
     
-    connect_to_server(args.host, args.port, args.rdtport, args.packet_loss_rate)
+    if args.session:
+        session_client(args.host, args.port, args.rdtport, impairments, args.participant, window, args.chunk_size, args.fec)
+    else:
+        connect_to_server(args.host, args.port, args.rdtport, impairments, args.role, args.room, window, args.chunk_size, args.fec)
 
 
 if __name__ == "__main__":
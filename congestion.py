@@ -0,0 +1,123 @@
+'''
+Congestion control and pacing of the Selective Repeat file transfer.
+
+The window announced in the start message only says how much the buyer can
+take. How much the path can take is the congestion window (cwnd), in
+packets, kept as in TCP Reno (RFC 5681):
+- slow start: cwnd starts at INITIAL_CWND and grows by a packet for every
+  acknowledged packet, doubling every round trip, up to the slow start
+  threshold (ssthresh)
+- congestion avoidance: above ssthresh, cwnd grows by about one packet per
+  round trip
+- a lost packet (fast retransmit, or rebuilt from parity, see fec.py) halves
+  cwnd, once per round trip: losses of packets sent before the last cut
+  belong to the same congestion event (fast recovery)
+- an expired retransmission timer halves ssthresh and drops cwnd to
+  MIN_CWND
+
+Packets in flight never exceed cwnd, and they are not sent back to back but
+paced out over the round trip at PACING_GAIN * cwnd / SRTT (twice that in
+slow start, so that cwnd can still double), so that a window does not hit a
+queue on the path as a single burst. Socket timeouts cannot wait for less
+than a millisecond, so the pacer lets up to PACING_QUANTUM seconds worth of
+packets go at once.
+'''
+
+INITIAL_CWND = 10   # Packets (RFC 6928)
+MIN_CWND = 1
+LOSS_BETA = 0.5     # cwnd is multiplied by this on a loss
+PACING_GAIN = 1.25
+SLOW_START_PACING_GAIN = 2.0
+PACING_QUANTUM = 0.001  # Seconds worth of packets the pacer lets go at once
+
+
+class CongestionController:
+    """
+    Congestion window and pacing of one transfer.
+    """
+    def __init__(self, rtt, max_cwnd, packet_size):
+        """
+        Parameters:
+        - rtt (RttEstimator): Round trip time estimate of the transfer, the pacing follows its SRTT
+        - max_cwnd (int): Window announced to the buyer, cwnd does not grow beyond it
+        - packet_size (int): Bytes of file data per packet, for the pacing rate in bytes per second
+        """
+        self.rtt = rtt
+        self.max_cwnd = max_cwnd
+        self.packet_size = packet_size
+        self.cwnd = float(min(INITIAL_CWND, max_cwnd))
+        self.ssthresh = float(max_cwnd)
+        self.recovery_end = -1  # Position of the last packet sent before the last cut, packets up to it are in recovery
+        self.next_send = 0.0    # Time the pacer lets the next packet go
+        self.losses = 0
+        self.timeouts = 0
+
+    def can_send(self, in_flight, now):
+        '''
+        Returns whether another packet may be sent, with in_flight packets
+        unacknowledged.
+        '''
+        return in_flight < max(int(self.cwnd), MIN_CWND) and now >= self.next_send
+
+    def pacing_rate(self):
+        '''
+        Returns the pacing rate in packets per second, None before the first
+        RTT sample.
+        '''
+        if not self.rtt.srtt:
+            return None
+        gain = SLOW_START_PACING_GAIN if self.cwnd < self.ssthresh else PACING_GAIN
+        return gain * self.cwnd / self.rtt.srtt
+
+    def sent(self, now):
+        '''
+        Takes the time a packet was sent, and schedules the next one.
+        '''
+        rate = self.pacing_rate()
+        if rate is not None:
+            self.next_send = max(self.next_send, now - PACING_QUANTUM) + 1 / rate
+
+    def acknowledged(self, count, newest):
+        '''
+        Takes the number of packets an ACK acknowledged and the position of
+        the latest sent of them.
+        '''
+        if newest <= self.recovery_end:
+            return  # Still in recovery
+        for _ in range(count):
+            if self.cwnd < self.ssthresh:
+                self.cwnd += 1
+            else:
+                self.cwnd += 1 / self.cwnd
+        self.cwnd = min(self.cwnd, self.max_cwnd)
+
+    def lost(self, position, sent):
+        '''
+        Takes the position of a lost packet and the number of packets sent so
+        far, and cuts cwnd unless the loss belongs to the current recovery.
+        '''
+        if position <= self.recovery_end:
+            return
+        self.losses += 1
+        self.ssthresh = max(self.cwnd * LOSS_BETA, 2 * MIN_CWND)
+        self.cwnd = self.ssthresh
+        self.recovery_end = sent - 1
+
+    def timed_out(self, sent):
+        '''
+        Takes the number of packets sent so far after a retransmission timer
+        expired.
+        '''
+        self.timeouts += 1
+        self.ssthresh = max(self.cwnd * LOSS_BETA, 2 * MIN_CWND)
+        self.cwnd = MIN_CWND
+        self.recovery_end = sent - 1
+
+    def report(self):
+        '''
+        Returns the congestion window and pacing rate as a line of text.
+        '''
+        rate = self.pacing_rate()
+        pacing = f"{rate * self.packet_size:.0f} bytes per second" if rate is not None else "off"
+        return (f"Congestion window: {self.cwnd:.1f} packets (ssthresh {self.ssthresh:.1f}, {self.losses} losses, "
+                f"{self.timeouts} timeouts), pacing rate: {pacing}")
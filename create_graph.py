@@ -1,3 +1,4 @@
+import sys
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
@@ -5,8 +6,70 @@ import seaborn as sns
 # Set a modern style for plots
 sns.set_theme(style="whitegrid")
 
-# Load the CSV file
-data = pd.read_csv('performance.csv')
+# Load the CSV file (performance.csv unless another file is given)
+csv_file = sys.argv[1] if len(sys.argv) > 1 else 'performance.csv'
+data = pd.read_csv(csv_file)
+
+if 'auctions_per_s' in data.columns:
+    # Results of load_generator.py: throughput and per-phase latency vs concurrency
+    concurrency = data['concurrency']
+
+    # Plot Fig. 3: concurrency vs auctions per second
+    plt.figure(figsize=(10, 6))
+    plt.plot(concurrency, data['auctions_per_s'], marker='o', linestyle='-', linewidth=2, color='green', label='Auctions/s')
+    plt.title('Fig. 3: Concurrent Auctions vs Auction Throughput', fontsize=16, fontweight='bold')
+    plt.xlabel('Auctions in Flight', fontsize=14)
+    plt.ylabel('Auctions per Second', fontsize=14)
+    plt.xticks(fontsize=12)
+    plt.yticks(fontsize=12)
+    plt.grid(visible=True, linestyle='--', alpha=0.7)
+    plt.legend(fontsize=12)
+    plt.tight_layout()
+    plt.savefig('fig3_auctions_per_s_vs_concurrency.png', dpi=300)  # Save the figure with high resolution
+    plt.show()
+
+    # Plot Fig. 4: concurrency vs p50/p99/p999 latency of every phase
+    plt.figure(figsize=(10, 6))
+    for phase, color in (('connect', 'blue'), ('bid_ack', 'darkorange'), ('result', 'purple')):
+        for percentile, style in (('p50', '-'), ('p99', '--'), ('p999', ':')):
+            plt.plot(concurrency, data[f'{phase}_{percentile}_ms'], marker='o', linestyle=style, linewidth=2, color=color, label=f'{phase} {percentile}')
+    plt.title('Fig. 4: Concurrent Auctions vs Phase Latency', fontsize=16, fontweight='bold')
+    plt.xlabel('Auctions in Flight', fontsize=14)
+    plt.ylabel('Latency (ms)', fontsize=14)
+    plt.xticks(fontsize=12)
+    plt.yticks(fontsize=12)
+    plt.grid(visible=True, linestyle='--', alpha=0.7)
+    plt.legend(fontsize=10, ncol=3)
+    plt.tight_layout()
+    plt.savefig('fig4_latency_vs_concurrency.png', dpi=300)  # Save the figure with high resolution
+    plt.show()
+    sys.exit(0)
+
+if 'TCT_ci' in data.columns:
+    # Results of rdt_benchmark.py: one line with 95% confidence intervals per mode, file size and chunk size
+    groups = data.groupby(['mode', 'file_size', 'chunk_size'])
+    for number, (metric, label, unit, name) in enumerate((('TCT', 'Total Completion Time (TCT)', 'seconds', 'fig1_tct_vs_pkt_loss_rate.png'),
+                                                            ('AT', 'Average Throughput (AT)', 'bytes per second', 'fig2_at_vs_pkt_loss_rate.png')), 1):
+        plt.figure(figsize=(10, 6))
+        for (mode, file_size, chunk_size), group in groups:
+            plt.errorbar(group['pkt_loss_rate'], group[metric], yerr=group[f'{metric}_ci'], marker='o', linestyle='-', linewidth=2, capsize=4,
+                         label=f'{mode}, {file_size} B file, {chunk_size} B chunks')
+        incomplete = data[data['failures'] > 0]   # Means of the completed runs only
+        if not incomplete.empty:
+            plt.scatter(incomplete['pkt_loss_rate'], incomplete[metric], marker='x', s=120, color='black', zorder=3, label='some runs failed')
+        plt.title(f'Fig. {number}: Packet Loss Rate vs {label}', fontsize=16, fontweight='bold')
+        plt.xlabel('Packet Loss Rate', fontsize=14)
+        plt.ylabel(f'{label}, {unit}', fontsize=14)
+        if metric == 'AT':
+            plt.yscale('log')   # Selective Repeat and Stop-and-Wait lie orders of magnitude apart
+        plt.xticks(fontsize=12)
+        plt.yticks(fontsize=12)
+        plt.grid(visible=True, linestyle='--', alpha=0.7)
+        plt.legend(fontsize=10)
+        plt.tight_layout()
+        plt.savefig(name, dpi=300)  # Save the figure with high resolution
+        plt.show()
+    sys.exit(0)
 
 # Extract the relevant data
 pkt_loss_rate = data['pkt_loss_rate']
@@ -0,0 +1,138 @@
+'''
+Append-only event log of the Auctioneer server.
+
+Every auction event (seller registration, buyer join, bidding start, accepted
+bid, winner, no sale) is appended as one JSON line. Records are made durable
+with group commit: a single committer thread writes every record appended
+since its last flush and covers the whole batch with one fsync, so bids that
+arrive together share a single fsync instead of paying for one each. Callers
+that must not acknowledge an event before it is on disk pass a callback,
+which runs once the batch holding the record has been synced.
+'''
+import json
+import os
+import threading
+import time
+
+
+class EventLog:
+    """
+    Append-only, group-committed log of auction events.
+    """
+    def __init__(self, path, on_durable=None, commit_delay=0.0):
+        """
+        Opens (or creates) the log file and starts the committer thread.
+
+        Parameters:
+        - path (str): Path of the log file
+        - on_durable (callable): Called from the committer thread with the list
+          of callbacks whose records were just synced. Runs them directly if None
+        - commit_delay (float): Seconds the committer waits for more records
+          before writing a batch, trading latency for larger batches
+        """
+        self.path = path
+        self.on_durable = on_durable
+        self.commit_delay = commit_delay
+        self.file = open(path, 'a+b')
+        self.repair()
+        self.seq = self.last_seq()  # Sequence number of the last appended record
+        self.pending = []   # Encoded records not yet written
+        self.callbacks = [] # Callbacks of the pending records
+        self.condition = threading.Condition()
+        self.batches = 0    # Number of fsyncs issued
+        self.records = 0    # Number of records made durable
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def repair(self):
+        """
+        Drops a torn record left at the end of the file by a crash, so that
+        new records start on a fresh line.
+        """
+        size = self.file.seek(0, os.SEEK_END)
+        end = size
+        while end > 0:
+            start = max(0, end - 4096)
+            self.file.seek(start)
+            block = self.file.read(end - start)
+            newline = block.rfind(b"\n")
+            if newline == len(block) - 1 and end == size:
+                return  # Last record is complete
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            end = start
+        self.file.truncate(end)
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def last_seq(self):
+        """
+        Returns the sequence number of the last record in the file, or 0.
+        """
+        seq = 0
+        for record in read_events(self.path):
+            seq = record['seq']
+        return seq
+
+    def append(self, event, room_id, callback=None, **fields):
+        """
+        Appends one event. Returns immediately; the record is written and
+        synced by the committer thread together with the other pending ones.
+
+        Parameters:
+        - event (str): Name of the event
+        - room_id (str): Room the event belongs to
+        - callback (callable): Called once the record is durable
+        - fields: Event specific fields
+        """
+        with self.condition:
+            self.seq += 1
+            record = {'seq': self.seq, 'time': time.time(), 'event': event, 'room': room_id}
+            record.update(fields)
+            self.pending.append(json.dumps(record, separators=(',', ':')).encode() + b"\n")
+            if callback is not None:
+                self.callbacks.append(callback)
+            self.condition.notify()
+
+    def run(self):
+        """
+        Committer loop: writes and syncs every pending record in one batch,
+        then hands the batch's callbacks to on_durable.
+        """
+        while True:
+            with self.condition:
+                while not self.pending:
+                    self.condition.wait()
+            if self.commit_delay:
+                time.sleep(self.commit_delay)   # Let more records join the batch
+            with self.condition:
+                batch, self.pending = self.pending, []
+                callbacks, self.callbacks = self.callbacks, []
+            self.file.write(b"".join(batch))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.batches += 1
+            self.records += len(batch)
+            if callbacks:
+                if self.on_durable is not None:
+                    self.on_durable(callbacks)
+                else:
+                    for callback in callbacks:
+                        callback()
+
+
+def read_events(path):
+    '''
+    Yields the records of a log file in order. Stops at a torn or corrupt
+    record, which can only be the tail of the file after a crash.
+    '''
+    if not os.path.exists(path):
+        return
+    with open(path, 'rb') as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                return
+            try:
+                yield json.loads(line)
+            except ValueError:
+                return
@@ -0,0 +1,177 @@
+'''
+Forward error correction (FEC) for the Selective Repeat file transfer.
+
+Without FEC every lost chunk costs at least a fast retransmit, and a full
+retransmission timeout if too few packets follow it. With FEC the seller
+sends a parity packet after every block of data packets: the XOR of their
+payloads (proof and chunk, zero padded to the longest one). The buyer can
+rebuild any single data packet of a block that got lost from the parity and
+the others, without waiting for a retransmission. Losses the parity cannot
+cover (two in one block, or a lost parity packet) are retransmitted as
+before.
+
+The seller offers the number of data packets per parity packet it starts
+from in the start message (`fec <block>`) and the buyer accepts it in its
+ACK. After that the seller picks the size of every block from the loss
+rate it measures on the ACKs (data packets that were skipped by a later ACK
+or retransmitted), aiming at TARGET_LOSSES lost packets per block: the
+higher the loss, the smaller the blocks and the more parity is sent. Every
+parity packet names the first sequence number and the number of data
+packets it covers, so the buyer needs no block size of its own.
+
+The buyer keeps the payloads of the data packets it may still need for a
+rebuild, at most the window plus MAX_BLOCK of them.
+'''
+import struct
+
+import merkle_tree
+from rdt_packet import CHUNK_SIZE
+
+DEFAULT_BLOCK = 8   # Data packets per parity packet until the loss rate is measured
+MIN_BLOCK = 2
+MAX_BLOCK = 64
+TARGET_LOSSES = 0.5     # Lost data packets per block the block size aims at; one is all a parity packet can rebuild
+LOSS_GAIN = 1 / 16  # Weight of a new observation in the loss rate estimate
+PARITY_HEADER = struct.Struct('!H')     # Data packets covered by a parity packet, in front of the parity
+
+
+def xor(payloads, size):
+    '''
+    Returns the XOR of the payloads, each zero padded to size bytes.
+    '''
+    parity = 0
+    for payload in payloads:
+        parity ^= int.from_bytes(payload.ljust(size, b'\0'), 'big')
+    return parity.to_bytes(size, 'big')
+
+
+def block_size(loss):
+    '''
+    Returns the number of data packets per parity packet for a loss rate.
+    '''
+    if loss <= 0:
+        return MAX_BLOCK
+    return max(MIN_BLOCK, min(MAX_BLOCK, round(TARGET_LOSSES / loss)))
+
+
+class ParityEncoder:
+    """
+    Sending side of FEC: builds the parity packet of every block and adapts
+    the block size to the measured loss rate.
+    """
+    def __init__(self, block=DEFAULT_BLOCK):
+        """
+        Parameters:
+        - block (int): Data packets per parity packet accepted by the buyer, kept until losses are measured
+        """
+        self.loss = TARGET_LOSSES / block   # The loss rate the block size is right for
+        self.first = None   # Sequence number of the first data packet of the current block
+        self.payloads = []  # Payloads of the current block
+        self.parity_packets = 0
+
+    @property
+    def block(self):
+        return block_size(self.loss)
+
+    def observe(self, lost):
+        '''
+        Takes whether an acknowledged data packet was lost on the way
+        (rebuilt from parity, or retransmitted) into the loss rate estimate.
+        '''
+        self.loss += LOSS_GAIN * ((1.0 if lost else 0.0) - self.loss)
+
+    def add(self, seq, payload, last=False):
+        '''
+        Takes the payload of a data packet sent for the first time, in
+        sequence order. Returns (first sequence number, payload) of the
+        parity packet once the block is complete or the last data packet was
+        added, None otherwise.
+        '''
+        if not self.payloads:
+            self.first = seq
+        self.payloads.append(payload)
+        if len(self.payloads) < self.block and not last:
+            return None
+        parity = PARITY_HEADER.pack(len(self.payloads)) + xor(self.payloads, max(map(len, self.payloads)))
+        self.payloads = []
+        self.parity_packets += 1
+        return self.first, parity
+
+    def report(self):
+        '''
+        Returns the FEC state as a line of text.
+        '''
+        return f"FEC: {self.parity_packets} parity packets, loss estimate {self.loss:.3f}, block {self.block}"
+
+
+class ParityDecoder:
+    """
+    Receiving side of FEC: rebuilds a lost data packet once the parity
+    packet and every other data packet of its block arrived.
+    """
+    def __init__(self, receiver, file_size, chunk_size=CHUNK_SIZE, verifier=None, chunks=None):
+        """
+        Parameters:
+        - receiver (selective_repeat.WindowReceiver): Tells which sequence numbers are still missing
+        - file_size (int): Size of the file, for the length of the last chunk
+        - chunk_size (int): Bytes of file data per packet, as announced in the start message
+        - verifier (merkle_tree.ChunkVerifier): The buyer's verifier if data packets carry proofs
+        - chunks (rdt_checkpoint.ChunkRanges): Chunks the data packets carry, None for the whole file
+        """
+        self.receiver = receiver
+        self.file_size = file_size
+        self.chunk_size = chunk_size
+        self.verifier = verifier
+        self.chunks = chunks
+        self.payloads = {}  # Sequence number -> payload, of data packets a block may still need
+        self.blocks = {}    # First sequence number -> (data packets, parity) of blocks still missing more than one
+        self.rebuilt = 0
+
+    def payload_size(self, seq):
+        '''
+        Returns the length of the payload of data packet seq as sent.
+        '''
+        index = self.chunks.chunk(seq) if self.chunks else seq - 1
+        size = min(self.chunk_size, self.file_size - index * self.chunk_size)
+        if self.verifier is not None:
+            size += merkle_tree.proof_size(index, self.verifier.leaf_count)
+        return size
+
+    def add(self, seq, payload):
+        '''
+        Takes the payload of a new data packet. Returns (sequence number,
+        payload) of a data packet rebuilt with it, or None.
+        '''
+        self.payloads[seq] = payload
+        low = self.receiver.expected - MAX_BLOCK    # No block with a missing packet reaches down to here
+        if len(self.payloads) > self.receiver.window + MAX_BLOCK:
+            for old in [old for old in self.payloads if old <= low]:
+                del self.payloads[old]
+        for first, (count, parity) in list(self.blocks.items()):
+            if first <= seq < first + count:
+                return self.rebuild(first, count, parity)
+        return None
+
+    def parity(self, first, payload):
+        '''
+        Takes the payload of a parity packet. Returns (sequence number,
+        payload) of a data packet rebuilt with it, or None.
+        '''
+        if len(payload) < PARITY_HEADER.size:
+            return None
+        count, = PARITY_HEADER.unpack_from(payload)
+        return self.rebuild(first, count, payload[PARITY_HEADER.size:])
+
+    def rebuild(self, first, count, parity):
+        missing = [seq for seq in range(first, first + count) if self.receiver.wants(seq)]
+        others = [self.payloads.get(seq) for seq in range(first, first + count) if seq not in missing]
+        if len(missing) != 1 or None in others:
+            if missing and first not in self.blocks:
+                self.blocks[first] = (count, parity)    # Waits for more of the block
+            elif not missing:
+                self.blocks.pop(first, None)
+            return None
+        self.blocks.pop(first, None)
+        seq = missing[0]
+        self.rebuilt += 1
+        return seq, xor([parity] + others, len(parity))[:self.payload_size(seq)]
@@ -0,0 +1,272 @@
+'''
+Headless load generator for the Auctioneer server.
+
+Simulates many scripted sellers and buyers over the framed protocol on a
+single asyncio event loop, so no input() is needed. Every auction gets its
+own room: the seller opens it, submits a first-price or second-price request,
+and the buyers join and bid random amounts. The generator checks every result
+against the bids it placed and reports auctions per second together with the
+p50/p99/p999 latency of each phase:
+- connect: TCP connect until the role assignment arrives (including any
+  time parked in the server's admission queue)
+- bid_ack: bid sent until BID_ACCEPTED arrives
+- result: last bid of the auction sent until the seller receives the result
+
+Every concurrency level of a run adds one row to the output CSV, which
+create_graph.py can plot.
+'''
+import argparse
+import asyncio
+import csv
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import time
+
+import auction_protocol as protocol
+
+PHASES = ('connect', 'bid_ack', 'result')
+PERCENTILES = (50, 99, 99.9)
+
+
+def percentile(samples, p):
+    '''
+    Returns the p-th percentile of the samples (nearest rank), or None if
+    there are none.
+    '''
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    rank = max(1, math.ceil(p / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def expected_result(auc_type, min_price, bids):
+    '''
+    Returns the price the server should sell for, or None for no sale.
+    '''
+    ordered = sorted(bids, reverse=True)
+    if not ordered or ordered[0] < min_price:
+        return None
+    if auc_type == 1:
+        return ordered[0]
+    return max(ordered[1] if len(ordered) > 1 else min_price, min_price)
+
+
+class LoadGenerator:
+    """
+    Drives scripted auctions against a running server and collects latencies.
+    """
+    def __init__(self, host, port, buyers=3, auction_type='mixed', min_price=100, seed=1):
+        """
+        Parameters:
+        - host (str): The IP address of the server
+        - port (int): The port number of the server
+        - buyers (int): Buyers per auction
+        - auction_type (str): 'first', 'second' or 'mixed'
+        - min_price (int): Minimum price of every auction
+        - seed (int): Seed of the random bids
+        """
+        self.host = host
+        self.port = port
+        self.buyers = buyers
+        self.auction_type = auction_type
+        self.min_price = min_price
+        self.random = random.Random(seed)
+        self.run_id = f"{os.getpid()}-{int(time.time() * 1000) % 1000000}"  # Keeps room ids unique across runs
+        self.reset()
+
+    def reset(self):
+        """
+        Clears the statistics before a new run.
+        """
+        self.samples = {phase: [] for phase in PHASES}  # Phase -> latencies in seconds
+        self.completed = 0  # Auctions that finished with the expected result
+        self.errors = 0     # Auctions that failed or returned a wrong result
+        self.retries = 0    # Buyers that were turned away and connected again
+        self.queued = 0     # Position updates received while parked in the admission queue
+
+    async def open(self, role, room_id):
+        '''
+        Connects with a HELLO for the given role and waits for the role
+        assignment. Returns (reader, writer, decoder, opcode, values) of the
+        first reply.
+        '''
+        start = time.perf_counter()
+        reader, writer = await asyncio.open_connection(self.host, self.port)
+        writer.write(protocol.MAGIC + protocol.encode_message(protocol.HELLO, role, room_id))
+        decoder = protocol.FrameDecoder()
+        opcode, values = await self.read(reader, decoder)
+        while opcode == protocol.QUEUED:    # Parked in the admission queue
+            self.queued += 1
+            opcode, values = await self.read(reader, decoder)
+        if opcode == protocol.ROLE:
+            self.samples['connect'].append(time.perf_counter() - start)
+        return reader, writer, decoder, opcode, values
+
+    async def read(self, reader, decoder):
+        '''
+        Returns the next (opcode, values) sent by the server.
+        '''
+        while not decoder.pending:
+            data = await reader.read(4096)
+            if not data:
+                raise ConnectionError("Connection closed by server")
+            decoder.pending.extend(decoder.feed(data))
+        return decoder.pending.popleft()
+
+    async def buyer(self, room_id, amount, bid_times):
+        '''
+        Joins a room, bids once when asked and waits for the result.
+        '''
+        for attempt in range(50):
+            reader, writer, decoder, opcode, values = await self.open(protocol.ROLE_BUYER, room_id)
+            if opcode == protocol.ROLE:
+                break
+            writer.close()  # Room not open yet, try again
+            self.retries += 1
+            await asyncio.sleep(0.01 * (attempt + 1))
+        else:
+            raise ConnectionError(f"Could not join room {room_id}")
+        try:
+            while True:
+                opcode, values = await self.read(reader, decoder)
+                if opcode == protocol.BID_REQUEST:
+                    sent = time.perf_counter()
+                    bid_times.append(sent)
+                    writer.write(protocol.encode_message(protocol.BID, amount))
+                elif opcode == protocol.BID_ACCEPTED:
+                    self.samples['bid_ack'].append(time.perf_counter() - sent)
+                elif opcode in (protocol.WON, protocol.LOST, protocol.NOT_SOLD, protocol.BIDDING_CLOSED):
+                    return
+        finally:
+            writer.close()
+
+    async def auction(self, index):
+        '''
+        Runs one complete auction: a seller and its buyers.
+        '''
+        room_id = f"lg{self.run_id}-{index}"
+        auc_type = {'first': 1, 'second': 2}.get(self.auction_type, 1 + index % 2)
+        bids = [self.random.randint(self.min_price // 2, self.min_price * 3) for _ in range(self.buyers)]
+        bid_times = []
+        try:
+            reader, writer, decoder, opcode, values = await self.open(protocol.ROLE_SELLER, room_id)
+            if opcode != protocol.ROLE:
+                raise ConnectionError(f"Seller rejected: {values}")
+            writer.write(protocol.encode_message(protocol.AUCTION_REQUEST, auc_type, self.min_price, self.buyers, f"Item{index}"))
+            buyers = asyncio.gather(*[self.buyer(room_id, amount, bid_times) for amount in bids])
+            try:
+                while True:
+                    opcode, values = await self.read(reader, decoder)
+                    if opcode in (protocol.SOLD, protocol.NOT_SOLD):
+                        break
+                finished = time.perf_counter()
+                await buyers
+            finally:
+                writer.close()
+                if not buyers.done():
+                    buyers.cancel()
+            self.samples['result'].append(finished - max(bid_times))
+            price = values[0] if opcode == protocol.SOLD else None
+            if price != expected_result(auc_type, self.min_price, bids):
+                raise ValueError(f"Room {room_id} sold for {price}, expected {expected_result(auc_type, self.min_price, bids)}")
+            self.completed += 1
+        except (OSError, ValueError, protocol.ProtocolError) as e:
+            self.errors += 1
+            print(f"Auction {room_id} failed: {e}")
+
+    async def run(self, auctions, concurrency):
+        '''
+        Runs the given number of auctions with at most concurrency of them in
+        flight. Returns the elapsed time in seconds.
+        '''
+        self.reset()
+        queue = iter(range(auctions))
+
+        async def worker():
+            for index in queue:
+                await self.auction(index)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+        return time.perf_counter() - start
+
+    def report(self, concurrency, elapsed):
+        '''
+        Returns the statistics of the last run as a CSV row (latencies in ms).
+        '''
+        row = {
+            'concurrency': concurrency,
+            'buyers': self.buyers,
+            'auctions': self.completed,
+            'errors': self.errors,
+            'retries': self.retries,
+            'queued': self.queued,
+            'elapsed_s': round(elapsed, 6),
+            'auctions_per_s': round(self.completed / elapsed, 3) if elapsed else 0,
+        }
+        for phase in PHASES:
+            for p in PERCENTILES:
+                value = percentile(self.samples[phase], p)
+                row[f"{phase}_p{p:g}_ms".replace('.', '')] = round(value * 1000, 3) if value is not None else ''
+        return row
+
+
+def wait_for_port(host, port, timeout=10.0):
+    '''
+    Waits until the server accepts connections.
+    '''
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection((host, port), timeout=0.5).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise TimeoutError(f"Server at {host}:{port} did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive scripted auctions against the Auctioneer server")
+    parser.add_argument('host', type=str, help="The server IP address")
+    parser.add_argument('port', type=int, help="The server port")
+    parser.add_argument('--auctions', type=int, default=200, help="Auctions per concurrency level")
+    parser.add_argument('--concurrency', type=str, default='1,10,50', help="Comma separated numbers of auctions in flight")
+    parser.add_argument('--buyers', type=int, default=3, help="Buyers per auction")
+    parser.add_argument('--auction-type', choices=['first', 'second', 'mixed'], default='mixed', help="First-price, second-price or alternating auctions")
+    parser.add_argument('--seed', type=int, default=1, help="Seed of the random bids")
+    parser.add_argument('--spawn', choices=['threaded', 'async'], default=None, help="Start a server in this mode for the run instead of using a running one")
+    parser.add_argument('--output', type=str, default='load.csv', help="CSV file the results are written to")
+    args = parser.parse_args()
+
+    server = None
+    if args.spawn:
+        server = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server_rdt.py'),
+                                   args.host, str(args.port), '--mode', args.spawn], stdout=subprocess.DEVNULL)
+    try:
+        wait_for_port(args.host, args.port)
+        generator = LoadGenerator(args.host, args.port, args.buyers, args.auction_type, seed=args.seed)
+        rows = []
+        for concurrency in [int(level) for level in args.concurrency.split(',')]:
+            elapsed = asyncio.run(generator.run(args.auctions, concurrency))
+            row = generator.report(concurrency, elapsed)
+            rows.append(row)
+            print(f"concurrency {concurrency}: {row['auctions']} auctions ({row['errors']} errors) at {row['auctions_per_s']} auctions/s, "
+                  + ", ".join(f"{phase} p50/p99/p999 {row[f'{phase}_p50_ms']}/{row[f'{phase}_p99_ms']}/{row[f'{phase}_p999_ms']} ms" for phase in PHASES))
+        with open(args.output, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"Results written to {args.output}")
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main()
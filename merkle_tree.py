@@ -0,0 +1,153 @@
+'''
+Per-chunk hash tree (Merkle tree) of the item file of the RDT transfer.
+
+The leaves are the hashes of the file's chunks, and every inner node is the
+hash of its two children; a node without a sibling is carried up as is. The
+seller announces the root in the start message and puts the proof of every
+chunk (the siblings on the path from its leaf to the root) in front of the
+chunk in its data packet. The buyer can then verify every chunk on its own
+as soon as it arrives, without knowing any other chunk, and ask for just
+that chunk again if it does not match.
+
+Nodes are 16 byte BLAKE2b digests, with leaves and inner nodes hashed under
+different personalizations. A proof costs 16 bytes per tree level (176
+bytes for a 2 MB file), and the seller keeps the whole tree in memory, about
+32 bytes per 2000 byte chunk: every level is one bytearray of packed
+digests, rather than a list of bytes objects, each of which would cost
+about 50 bytes of object header and list slot on top of its digest.
+'''
+import hashlib
+
+from rdt_packet import CHUNK_SIZE
+
+DIGEST_SIZE = 16
+
+
+def leaf_hash(chunk):
+    return hashlib.blake2b(chunk, digest_size=DIGEST_SIZE, person=b'rdt-leaf').digest()
+
+
+def node_hash(left, right):
+    return hashlib.blake2b(left + right, digest_size=DIGEST_SIZE, person=b'rdt-node').digest()
+
+
+def leaf_count(file_size, chunk_size=CHUNK_SIZE):
+    '''
+    Returns the number of chunks of a file.
+    '''
+    return (file_size + chunk_size - 1) // chunk_size
+
+
+def proof_size(index, count):
+    '''
+    Returns the size in bytes of the proof of chunk index out of count.
+    '''
+    size = 0
+    while count > 1:
+        if index ^ 1 < count:
+            size += DIGEST_SIZE
+        index //= 2
+        count = (count + 1) // 2
+    return size
+
+
+class MerkleTree:
+    """
+    Hash tree of a file, built by the seller.
+    """
+    def __init__(self):
+        self.levels = [bytearray()]     # Packed digests of every level, leaves first, root last
+
+    def add(self, chunk):
+        '''
+        Adds the next chunk of the file.
+        '''
+        self.levels[0] += leaf_hash(chunk)
+
+    def finish(self):
+        '''
+        Builds the inner nodes once every chunk is added.
+        '''
+        level = self.levels[0]
+        while len(level) > DIGEST_SIZE:
+            parent = bytearray()
+            for i in range(0, len(level), 2 * DIGEST_SIZE):
+                if i + DIGEST_SIZE < len(level):
+                    parent += node_hash(level[i:i + DIGEST_SIZE], level[i + DIGEST_SIZE:i + 2 * DIGEST_SIZE])
+                else:
+                    parent += level[i:i + DIGEST_SIZE]
+            level = parent
+            self.levels.append(level)
+
+    @property
+    def root(self):
+        return bytes(self.levels[-1]) if self.levels[-1] else leaf_hash(b'')
+
+    def proof(self, index):
+        '''
+        Returns the proof of chunk index: its siblings from the leaf up,
+        concatenated.
+        '''
+        siblings = bytearray()
+        for level in self.levels[:-1]:
+            sibling = (index ^ 1) * DIGEST_SIZE
+            if sibling < len(level):
+                siblings += level[sibling:sibling + DIGEST_SIZE]
+            index //= 2
+        return bytes(siblings)
+
+
+def build(file, chunk_size=CHUNK_SIZE):
+    '''
+    Reads the file once and returns its hash tree together with the SHA-256
+    digest of the whole file (hex), which older buyers check instead.
+
+    Parameters:
+    - file (rdt_file.ChunkReader): The file
+    - chunk_size (int): Bytes of file data per chunk
+    '''
+    tree = MerkleTree()
+    digest = hashlib.sha256()
+    for offset in range(0, file.size, chunk_size):
+        chunk = file.read(offset, chunk_size)
+        tree.add(chunk)
+        digest.update(chunk)
+    tree.finish()
+    return tree, digest.hexdigest()
+
+
+class ChunkVerifier:
+    """
+    Checks the chunks a buyer receives against the root the seller announced.
+    """
+    def __init__(self, root, file_size, chunk_size=CHUNK_SIZE):
+        """
+        Parameters:
+        - root (bytes): Root of the seller's tree
+        - file_size (int): Size of the file
+        - chunk_size (int): Bytes of file data per chunk
+        """
+        self.root = root
+        self.leaf_count = leaf_count(file_size, chunk_size)
+        self.max_proof_size = proof_size(0, self.leaf_count)    # The first chunk has a sibling on every level
+
+    def check(self, index, payload):
+        '''
+        Splits the payload of a data packet into proof and chunk and returns
+        the chunk if it belongs to the file at index, or None if it does not.
+        '''
+        count = self.leaf_count
+        if index >= count:
+            return None
+        split = proof_size(index, count)
+        proof, chunk = payload[:split], payload[split:]
+        digest = leaf_hash(chunk)
+        position = 0
+        while count > 1:
+            if index ^ 1 < count:
+                sibling = proof[position:position + DIGEST_SIZE]
+                position += DIGEST_SIZE
+                digest = node_hash(sibling, digest) if index & 1 else node_hash(digest, sibling)
+            index //= 2
+            count = (count + 1) // 2
+        return chunk if digest == self.root else None
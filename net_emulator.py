@@ -0,0 +1,128 @@
+'''
+In-process network emulator for testing the RDT file transfer.
+
+EmulatedSocket wraps the UDP socket of one end of a transfer and impairs
+the datagrams that arrive on it: it drops, delays (a fixed delay plus
+uniform jitter), reorders (holds a datagram back so that later ones pass
+it) and duplicates them before recvfrom returns them. Every datagram is
+read from the real socket, so a dropped datagram is really gone, and the
+protocol sees exactly the configured impairments. Each end impairs the
+direction towards it, so the data and the ACK direction are configured
+separately, by the buyer and the seller.
+
+All decisions come from a random.Random of the socket's own, so a fixed
+seed gives the same drops, delays, duplicates and reorderings for the same
+sequence of datagrams on every run.
+'''
+import heapq
+import random
+import socket
+import time
+from collections import namedtuple
+
+MAX_DATAGRAM_SIZE = 65535
+REORDER_DELAY = 0.01     # Seconds a reordered datagram is held back beyond its delay
+
+Impairments = namedtuple('Impairments', ['loss', 'delay', 'jitter', 'reorder', 'duplicate', 'seed'], defaults=[0.0, 0.0, 0.0, 0.0, 0.0, None])
+Impairments.__doc__ = """
+Impairments of the datagrams arriving at one end. loss, reorder and
+duplicate are probabilities per datagram, delay and jitter are in seconds.
+seed makes the impairments reproducible; None seeds from the system.
+"""
+
+
+def emulate(udp_socket, impairments):
+    '''
+    Returns the socket with the impairments applied to the datagrams it
+    receives, or the socket itself if there are none.
+
+    Parameters:
+    - udp_socket (socket): Bound UDP socket
+    - impairments (Impairments): Impairments of the incoming direction, or None
+    '''
+    if impairments is None or not any(impairments[:-1]):
+        return udp_socket
+    return EmulatedSocket(udp_socket, impairments)
+
+
+class EmulatedSocket:
+    """
+    UDP socket whose incoming datagrams are impaired. Sending and every
+    other socket method go to the real socket unchanged.
+    """
+    def __init__(self, udp_socket, impairments):
+        """
+        Parameters:
+        - udp_socket (socket): Bound UDP socket
+        - impairments (Impairments): Impairments of the incoming direction
+        """
+        self.socket = udp_socket
+        self.impairments = impairments
+        self.random = random.Random(impairments.seed)
+        self.timeout = udp_socket.gettimeout()
+        self.held = []  # Heap of (release time, arrival number, datagram, address)
+        self.arrivals = 0
+        self.dropped = 0
+        self.duplicated = 0
+        self.reordered = 0
+
+    def __getattr__(self, name):
+        return getattr(self.socket, name)
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+    def gettimeout(self):
+        return self.timeout
+
+    def recvfrom(self, bufsize):
+        '''
+        Returns the next datagram whose delay is over, like socket.recvfrom,
+        and raises socket.timeout if none is due within the timeout.
+        '''
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            now = time.monotonic()
+            if self.held and self.held[0][0] <= now:
+                _, _, datagram, addr = heapq.heappop(self.held)
+                return datagram[:bufsize], addr
+            if deadline is not None and now >= deadline:
+                raise socket.timeout("timed out")
+            wait = [moment - now for moment in (deadline, self.held[0][0] if self.held else None) if moment is not None]
+            self.socket.settimeout(max(min(wait), 0.0001) if wait else None)
+            try:
+                datagram, addr = self.socket.recvfrom(MAX_DATAGRAM_SIZE)
+            except socket.timeout:
+                continue
+            self.arrive(datagram, addr, time.monotonic())
+
+    def arrive(self, datagram, addr, now):
+        '''
+        Drops a datagram read from the real socket, or holds it (and maybe a
+        duplicate of it) until its delay is over.
+        '''
+        impairments = self.impairments
+        self.arrivals += 1
+        if self.random.random() < impairments.loss:
+            self.dropped += 1
+            return
+        copies = 1
+        if self.random.random() < impairments.duplicate:
+            copies = 2
+            self.duplicated += 1
+        for _ in range(copies):
+            delay = max(impairments.delay + self.random.uniform(-impairments.jitter, impairments.jitter), 0)
+            if self.random.random() < impairments.reorder:
+                delay += REORDER_DELAY
+                self.reordered += 1
+            heapq.heappush(self.held, (now + delay, self.arrivals, datagram, addr))
+
+    def report(self):
+        '''
+        Returns what was done to the datagrams so far as a line of text.
+        '''
+        return (f"Network emulator: {self.arrivals} datagrams arrived, {self.dropped} dropped, "
+                f"{self.duplicated} duplicated, {self.reordered} reordered")
+
+    def close(self):
+        self.socket.close()
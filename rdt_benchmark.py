@@ -0,0 +1,199 @@
+'''
+Parameter sweep of the RDT file transfer.
+
+Runs handle_file_send and handle_file_receive against each other on
+loopback, the seller on 127.0.0.1 and the buyer on 127.0.0.2 (Linux routes
+all of 127.0.0.0/8 to the loopback interface), for every combination of
+transport mode, file size, chunk size and packet loss rate, several times
+each. As in the manual runs the original performance.csv came from, the
+loss rate applies to the packets both ends receive (see net_emulator.py).
+Every run has its own seeds, so the same sweep sees the same impairments.
+Every run also has a process of its own, which is killed if the transfer
+does not finish within the timeout, so that a stuck transfer cannot keep
+sending into the runs after it.
+
+Every point adds one row to the output CSV: the mean transfer completion
+time (TCT, seconds) and average throughput (AT, bytes per second) of its
+completed runs, each with the half width of its 95% confidence interval,
+and the number of runs that failed or timed out. A failed run has no TCT,
+so a point with failures is flagged as not complete: its mean only covers
+the runs that made it and understates the TCT. The CSV is then plotted with
+create_graph.py, which marks these points.
+'''
+import argparse
+import contextlib
+import csv
+import glob
+import multiprocessing
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import client_rdt
+import fec
+import net_emulator
+import rdt_packet
+import selective_repeat
+
+SELLER_IP = '127.0.0.1'
+BUYER_IP = '127.0.0.2'
+MODES = {'selective-repeat': (selective_repeat.DEFAULT_WINDOW, None), 'selective-repeat-fec': (selective_repeat.DEFAULT_WINDOW, fec.DEFAULT_BLOCK),
+         'stop-and-wait': (None, None)}     # Mode -> window, data packets per parity packet
+T_95 = {1: 12.706, 2: 4.303, 3: 3.182, 4: 2.776, 5: 2.571, 6: 2.447, 7: 2.365, 8: 2.306, 9: 2.262,
+        10: 2.228, 15: 2.131, 20: 2.086, 30: 2.042}     # Two-sided 95% quantile of Student's t by degrees of freedom
+
+
+def confidence_interval(samples):
+    '''
+    Returns the mean of the samples and the half width of its 95%
+    confidence interval (0 for a single sample).
+    '''
+    mean = statistics.mean(samples)
+    if len(samples) < 2:
+        return mean, 0.0
+    freedom = len(samples) - 1
+    t = T_95[max(df for df in T_95 if df <= freedom)] if freedom <= 30 else 1.96
+    return mean, t * statistics.stdev(samples) / len(samples) ** 0.5
+
+
+def run_transfer(connection, window, fec_block, chunk_size, loss_rate, rdtport, seed):
+    '''
+    Runs both ends of one transfer in the process of the run, and sends
+    (bytes received, TCT) or None over the connection once both are done.
+    '''
+    result = []
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        buyer = threading.Thread(target=lambda: result.append(client_rdt.handle_file_receive(
+            SELLER_IP, rdtport, net_emulator.Impairments(loss_rate, seed=2 * seed), BUYER_IP)))
+        buyer.start()
+        time.sleep(0.05)    # The buyer's socket is bound before the start message is sent
+        client_rdt.handle_file_send(BUYER_IP, rdtport, net_emulator.Impairments(loss_rate, seed=2 * seed + 1), window, chunk_size,
+                                    SELLER_IP, fec_block)
+        buyer.join()
+    connection.send(result[0] if result else None)
+
+
+def transfer(window, fec_block, chunk_size, loss_rate, rdtport, seed, timeout):
+    '''
+    Sends tosend.file in the working directory to received.file once.
+    Returns (bytes received, TCT) or None if the transfer failed or did not
+    finish within the timeout, in which case it is killed.
+
+    Parameters:
+    - window (int): Selective Repeat window, or None for Stop-and-Wait
+    - fec_block (int): Data packets per parity packet to start from, or None without FEC
+    - chunk_size (int): Bytes of file data per packet
+    - loss_rate (float): Probability that a packet either end receives is dropped
+    - rdtport (int): RDT port of both ends
+    - seed (int): Seed of the impairments of the run
+    - timeout (float): Seconds to wait for the transfer
+    '''
+    for path in glob.glob('received.file.*'):
+        os.remove(path)     # Progress of a failed run, which would be resumed (see rdt_checkpoint.py)
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=run_transfer, args=(sender, window, fec_block, chunk_size, loss_rate, rdtport, seed))
+    process.start()
+    sender.close()
+    process.join(timeout)
+    if process.is_alive():
+        process.kill()  # Stops both ends, so that they do not send into the next runs
+        process.join()
+        return None
+    return receiver.recv() if receiver.poll() else None    # Nothing if the process died
+
+
+def run_point(mode, file_size, chunk_size, loss_rate, runs, rdtport, seed, timeout):
+    '''
+    Runs the transfer of one point of the sweep several times and returns
+    its CSV row.
+    '''
+    tct = []
+    at = []
+    failures = 0
+    for run in range(runs):
+        result = transfer(*MODES[mode], chunk_size, loss_rate, rdtport + run, seed + run, timeout)
+        if result is None:
+            failures += 1
+            continue
+        received, seconds = result
+        tct.append(seconds)
+        at.append(client_rdt.get_average_throughput(received, seconds))
+    row = {
+        'mode': mode,
+        'file_size': file_size,
+        'chunk_size': chunk_size,
+        'pkt_loss_rate': loss_rate,
+        'runs': len(tct),
+        'failures': failures,
+        'complete': failures == 0,  # Otherwise the means only cover the completed runs
+    }
+    for name, samples in (('TCT', tct), ('AT', at)):
+        if samples:
+            mean, half_width = confidence_interval(samples)
+            row[name], row[f'{name}_ci'] = round(mean, 6), round(half_width, 6)
+        else:
+            row[name], row[f'{name}_ci'] = '', ''     # Every run failed
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep the RDT file transfer over loopback and plot the results")
+    parser.add_argument('--modes', type=str, default='selective-repeat,stop-and-wait', help="Comma separated transport modes: " + ", ".join(MODES))
+    parser.add_argument('--loss', type=str, default='0.1,0.2,0.3,0.4,0.5', help="Comma separated packet loss rates")
+    parser.add_argument('--chunk-sizes', type=str, default=str(rdt_packet.CHUNK_SIZE), help="Comma separated bytes of file data per packet")
+    parser.add_argument('--file-sizes', type=str, default='1000000', help="Comma separated file sizes in bytes")
+    parser.add_argument('--runs', type=int, default=5, help="Transfers per point")
+    parser.add_argument('--rdtport', type=int, default=6000, help="First RDT port; every transfer uses a port of its own")
+    parser.add_argument('--seed', type=int, default=1, help="Seed of the file contents and the impairments")
+    parser.add_argument('--timeout', type=float, default=300.0, help="Seconds a single transfer may take before it counts as failed")
+    parser.add_argument('--output', type=str, default='performance.csv', help="CSV file the results are written to")
+    parser.add_argument('--no-graph', action='store_true', help="Do not run create_graph.py on the results")
+    args = parser.parse_args()
+
+    modes = args.modes.split(',')
+    for mode in modes:
+        if mode not in MODES:
+            parser.error(f"Unknown mode {mode}")
+    chunk_sizes = [int(size) for size in args.chunk_sizes.split(',')]
+    if not all(rdt_packet.MIN_CHUNK_SIZE <= size <= rdt_packet.MAX_CHUNK_SIZE for size in chunk_sizes):
+        parser.error(f"Chunk sizes must be between {rdt_packet.MIN_CHUNK_SIZE} and {rdt_packet.MAX_CHUNK_SIZE}")
+    output = os.path.abspath(args.output)
+
+    rows = []
+    rdtport = args.rdtport
+    with tempfile.TemporaryDirectory() as workdir:
+        cwd = os.getcwd()
+        os.chdir(workdir)   # tosend.file and received.file
+        try:
+            for file_size in [int(size) for size in args.file_sizes.split(',')]:
+                with open('tosend.file', 'wb') as f:
+                    f.write(random.Random(args.seed).randbytes(file_size))
+                for mode in modes:
+                    for chunk_size in chunk_sizes:
+                        for loss_rate in [float(rate) for rate in args.loss.split(',')]:
+                            row = run_point(mode, file_size, chunk_size, loss_rate, args.runs, rdtport, args.seed, args.timeout)
+                            rdtport += args.runs
+                            rows.append(row)
+                            print(f"{mode}, {file_size} bytes in {chunk_size} byte chunks at {loss_rate} loss: "
+                                  f"TCT {row['TCT']} +- {row['TCT_ci']} s, AT {row['AT']} +- {row['AT_ci']} B/s "
+                                  f"({row['runs']} runs, {row['failures']} failed{'' if row['complete'] else ', means of the completed runs only'})")
+        finally:
+            os.chdir(cwd)
+
+    with open(output, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    print(f"Results written to {args.output}")
+    if not args.no_graph:
+        subprocess.run([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'create_graph.py'), output],
+                       env={**os.environ, 'MPLBACKEND': os.environ.get('MPLBACKEND', 'Agg')}, check=False)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+'''
+Resumable RDT file transfers.
+
+The buyer writes the file to `received.file.<checksum>.part` and keeps an
+on-disk record of the chunks it has, `received.file.<checksum>.progress`
+(a header and one bit per chunk), keyed by the SHA-256 checksum the seller
+sends in the start message. Every chunk is written to the part file before
+its bit is set, so a buyer process that dies loses no chunk it recorded.
+Only a crash of the whole machine can lose recorded chunks, and the final
+check of the file catches that. Once the file is complete and intact, the
+part file becomes `received.file` and the record is removed.
+
+The seller offers to resume in the start message (`resume 1`). A buyer that
+finds a record for the same checksum, size and chunk size answers with the
+chunks it still misses, as ranges of chunk indices (`resume 0-99,150-199`),
+and the seller sends only those. At most MAX_RANGES ranges are named, so
+that the ACK stays small; the closest ranges are merged to get there, which
+only means a few chunks the buyer has are sent again. The data packets are
+numbered over the chunks that are sent, so data packet seq n carries the
+n-th chunk of the ranges, and Stop-and-Wait and Selective Repeat work on
+them as on a whole file.
+'''
+import bisect
+import os
+import struct
+
+from rdt_packet import CHUNK_SIZE
+
+HEADER = struct.Struct('!4sQI')     # Magic, file size, chunk size
+MAGIC = b'RDTP'
+MAX_RANGES = 32     # Ranges of missing chunks named in the ACK of the start message
+
+
+class ChunkRanges:
+    """
+    The chunks of a transfer, as sorted [first, last] ranges of chunk
+    indices. Data packet seq n (from 1) carries the n-th of them.
+    """
+    def __init__(self, ranges):
+        """
+        Parameters:
+        - ranges (list): Sorted, disjoint [first, last] ranges of chunk indices
+        """
+        self.ranges = ranges
+        self.starts = []    # Sequence number of the first chunk of every range
+        self.count = 0
+        for first, last in ranges:
+            self.starts.append(self.count + 1)
+            self.count += last - first + 1
+
+    @classmethod
+    def all(cls, chunk_count):
+        '''
+        Returns every chunk of a file of chunk_count chunks.
+        '''
+        return cls([[0, chunk_count - 1]] if chunk_count else [])
+
+    @classmethod
+    def parse(cls, text, chunk_count):
+        '''
+        Returns the ranges named in the text of a resume option, or None if it
+        is not valid for a file of chunk_count chunks.
+        '''
+        ranges = []
+        try:
+            if text == 'none':
+                return cls([])   # The buyer has every chunk already
+            for field in text.split(','):
+                first, last = (int(index) for index in field.split('-'))
+                if not (ranges[-1][1] if ranges else -1) < first <= last < chunk_count:
+                    return None
+                ranges.append([first, last])
+        except ValueError:
+            return None
+        return cls(ranges)
+
+    def text(self):
+        '''
+        Returns the ranges as the text of a resume option.
+        '''
+        return ','.join(f'{first}-{last}' for first, last in self.ranges) or 'none'
+
+    def size(self, file_size, chunk_size=CHUNK_SIZE):
+        '''
+        Returns the number of bytes of file data in the chunks.
+        '''
+        size = self.count * chunk_size
+        if self.ranges and (self.ranges[-1][1] + 1) * chunk_size > file_size:
+            size -= (self.ranges[-1][1] + 1) * chunk_size - file_size     # The last chunk of the file is short
+        return size
+
+    def chunk(self, seq):
+        '''
+        Returns the chunk index data packet seq carries.
+        '''
+        i = bisect.bisect_right(self.starts, seq) - 1
+        return self.ranges[i][0] + seq - self.starts[i]
+
+
+class Checkpoint:
+    """
+    On-disk record of the chunks the buyer has of one file, together with
+    the part file they are written to.
+    """
+    def __init__(self, checksum, size, chunk_size=CHUNK_SIZE, path='received.file'):
+        """
+        Opens the record of a file, or starts a new one if there is none for
+        the same size and chunk size.
+
+        Parameters:
+        - checksum (str): SHA-256 checksum of the file from the start message
+        - size (int): Size of the file
+        - chunk_size (int): Bytes of file data per chunk
+        - path (str): Path the file gets once it is complete
+        """
+        self.path = path
+        self.part_path = f'{path}.{checksum}.part'
+        self.progress_path = f'{path}.{checksum}.progress'
+        self.size = size
+        self.chunk_size = chunk_size
+        self.chunk_count = (size + chunk_size - 1) // chunk_size
+        self.bits = bytearray((self.chunk_count + 7) // 8)
+        self.resumed = False    # Whether an earlier transfer left chunks behind
+        header = HEADER.pack(MAGIC, size, chunk_size)
+        try:
+            with open(self.progress_path, 'rb') as f:
+                stored = f.read()
+            if stored[:HEADER.size] == header and len(stored) == HEADER.size + len(self.bits) and os.path.getsize(self.part_path) == size:
+                self.bits[:] = stored[HEADER.size:]
+                self.resumed = any(self.bits)
+        except OSError:
+            pass    # No record, or no part file
+        self.file = open(self.progress_path, 'r+b' if self.resumed else 'w+b')
+        if not self.resumed:
+            self.file.write(header + self.bits)
+            self.file.flush()
+
+    def has(self, index):
+        return bool(self.bits[index // 8] & (0x80 >> index % 8))
+
+    def mark(self, index):
+        '''
+        Records chunk index as written.
+        '''
+        self.bits[index // 8] |= 0x80 >> index % 8
+        os.pwrite(self.file.fileno(), self.bits[index // 8:index // 8 + 1], HEADER.size + index // 8)
+
+    def complete(self):
+        '''
+        Returns whether every chunk is recorded.
+        '''
+        return all(self.has(index) for index in range(self.chunk_count))
+
+    def missing(self, max_ranges=MAX_RANGES):
+        '''
+        Returns the chunks not recorded yet, in at most max_ranges ranges.
+        '''
+        ranges = []
+        index = 0
+        while index < self.chunk_count:
+            if index % 8 == 0 and self.bits[index // 8] == 0xFF:
+                index += 8  # Eight chunks at once
+                continue
+            if not self.has(index):
+                if ranges and ranges[-1][1] == index - 1:
+                    ranges[-1][1] = index
+                else:
+                    ranges.append([index, index])
+            index += 1
+        if len(ranges) > max_ranges:
+            gaps = sorted(range(1, len(ranges)), key=lambda i: ranges[i][0] - ranges[i - 1][1])
+            closed = set(gaps[:len(ranges) - max_ranges])   # The smallest gaps are sent again
+            merged = [ranges[0]]
+            for i in range(1, len(ranges)):
+                if i in closed:
+                    merged[-1] = [merged[-1][0], ranges[i][1]]
+                else:
+                    merged.append(ranges[i])
+            ranges = merged
+        return ChunkRanges(ranges)
+
+    def finish(self):
+        '''
+        Moves the complete file to its path and removes the record.
+        '''
+        self.file.close()
+        os.replace(self.part_path, self.path)
+        os.remove(self.progress_path)
+
+    def discard(self):
+        '''
+        Removes the record and the part file, e.g. after the file turned out
+        corrupted.
+        '''
+        self.file.close()
+        for path in (self.part_path, self.progress_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def close(self):
+        self.file.close()
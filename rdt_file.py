@@ -0,0 +1,71 @@
+'''
+Bounded-memory access to the item file of the RDT transfer.
+
+The seller reads every chunk from disk when it sends it, and the buyer
+writes every chunk to its offset in a preallocated file as soon as it
+arrives, both with positional reads and writes (os.pread, os.pwrite). So
+neither side keeps more than a chunk in memory, however large the file is,
+and chunks that arrive out of order need no buffering.
+'''
+import os
+
+from rdt_packet import CHUNK_SIZE
+
+
+class ChunkReader:
+    """
+    Read-only file the seller sends chunks from.
+    """
+    def __init__(self, path):
+        """
+        Parameters:
+        - path (str): Path of the file
+        """
+        self.file = open(path, 'rb')
+        self.size = os.fstat(self.file.fileno()).st_size
+
+    def read(self, offset, length=CHUNK_SIZE):
+        '''
+        Returns up to length bytes starting at offset.
+        '''
+        return os.pread(self.file.fileno(), length, offset)
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ChunkWriter:
+    """
+    File the buyer writes received chunks into, at their offsets.
+    """
+    def __init__(self, path, size, keep=False):
+        """
+        Parameters:
+        - path (str): Path of the file, truncated if it exists
+        - size (int): Size of the complete file, allocated right away
+        - keep (bool): Keep the contents of the file instead, to resume a transfer into it
+        """
+        self.size = size
+        if keep:
+            self.file = open(path, 'r+b')
+            return
+        self.file = open(path, 'wb')
+        if size and hasattr(os, 'posix_fallocate'):
+            os.posix_fallocate(self.file.fileno(), 0, size)
+        else:
+            self.file.truncate(size)
+
+    def write(self, offset, data):
+        '''
+        Writes data at offset.
+        '''
+        os.pwrite(self.file.fileno(), data, offset)
+
+    def close(self):
+        self.file.close()
@@ -0,0 +1,174 @@
+'''
+Packet formats of the RDT file transfer.
+
+Version 1 is the original format: a JSON object with TYPE, SEQ/ACK and DATA,
+where the chunk of a data packet is base64 encoded. Version 2 is a fixed
+11 byte binary header (type, sequence number, payload length, CRC-32 of the
+payload) followed by the raw payload, so the data path does no encoding at
+all and every packet fits into HEADER.size + CHUNK_SIZE bytes.
+
+The start message is always sent in version 1, so that any buyer can read
+it. Its DATA stays `start <size> <checksum>`; the seller offers its highest
+version ("version 2") along with other options in an extra OPTIONS key,
+which a buyer from before the options ignores. The buyer answers with the
+options it accepted in the DATA of its ACK (None means version 1 and
+nothing else), and every packet after that uses the picked version.
+decode() tells the formats apart by their first byte, since a JSON packet
+always starts with '{', which is not a packet type.
+'''
+import base64
+import json
+import struct
+import zlib
+from collections import namedtuple
+
+JSON_VERSION = 1
+BINARY_VERSION = 2
+VERSION = BINARY_VERSION    # Highest version this side speaks
+
+HEADER = struct.Struct('!BIHI')     # Type, sequence number, payload length, CRC-32 of the payload
+SACK_BLOCK = struct.Struct('!II')   # First and last sequence number of a selective ACK range
+CHUNK_SIZE = 2000   # Bytes of file data per data packet, unless the seller announces another chunk size
+MIN_CHUNK_SIZE = 256
+MAX_CHUNK_SIZE = 32768  # A version 1 data packet with the chunk base64 encoded still fits into a datagram
+MAX_PACKET_SIZE = 4096  # Large enough for a version 1 data packet of CHUNK_SIZE
+
+# Packet types, the TYPE of version 1
+TYPE_CONTROL = 0    # ACKs and control messages (start, fin, fin/ack)
+TYPE_DATA = 1       # A chunk of the file
+TYPE_SACK = 2       # Version 2 only: ACK whose payload is a list of SACK_BLOCKs
+TYPE_NACK = 3       # Asks for the data packet seq again, e.g. because its chunk failed verification
+TYPE_PARITY = 4     # XOR of the payloads of a block of data packets starting at seq (see fec.py)
+
+Packet = namedtuple('Packet', ['type', 'seq', 'data', 'sack'])
+Packet.__doc__ = """
+A decoded packet. data is the chunk (bytes) of a data packet, the parity
+(bytes) of a parity packet and the text (str, or None for a plain ACK) of a
+control packet. sack is the list of [first, last] selective ACK ranges of
+an ACK.
+"""
+
+
+def encode(version, ptype, seq, data=None, sack=()):
+    '''
+    Returns the datagram of one packet.
+
+    Parameters:
+    - version (int): JSON_VERSION or BINARY_VERSION
+    - ptype (int): TYPE_CONTROL, TYPE_DATA, TYPE_NACK or TYPE_PARITY
+    - seq (int): Sequence or ACK number
+    - data (bytes or str): Chunk of a data packet, parity of a parity packet, or text of a control packet
+    - sack (list): [first, last] selective ACK ranges of an ACK
+    '''
+    if version == JSON_VERSION:
+        message = {
+            'TYPE': ptype,
+            'SEQ/ACK': seq,
+            'DATA': base64.b64encode(data).decode('utf-8') if ptype in (TYPE_DATA, TYPE_PARITY) else data
+        }
+        if sack:
+            message['SACK'] = [list(block) for block in sack]
+        return json.dumps(message).encode()
+    if sack:
+        ptype = TYPE_SACK
+        payload = b''.join(SACK_BLOCK.pack(first, last) for first, last in sack)
+    elif ptype in (TYPE_CONTROL, TYPE_NACK):
+        payload = data.encode() if data else b''
+    else:
+        payload = data
+    return HEADER.pack(ptype, seq, len(payload), zlib.crc32(payload)) + payload
+
+
+def decode(datagram):
+    '''
+    Returns the Packet in a datagram of either version, or None if it is
+    damaged (checksum or length mismatch, or not a packet at all).
+    '''
+    if datagram[:1] == b'{':
+        try:
+            message = json.loads(datagram.decode())
+            data = message['DATA']
+            if message['TYPE'] in (TYPE_DATA, TYPE_PARITY):
+                data = base64.b64decode(data.encode('utf-8'))
+            return Packet(message['TYPE'], message['SEQ/ACK'], data, message.get('SACK', []))
+        except (ValueError, KeyError, TypeError):
+            return None
+    if len(datagram) < HEADER.size:
+        return None
+    ptype, seq, length, checksum = HEADER.unpack_from(datagram)
+    payload = datagram[HEADER.size:]
+    if len(payload) != length or zlib.crc32(payload) != checksum:
+        return None
+    if ptype in (TYPE_DATA, TYPE_PARITY):
+        return Packet(ptype, seq, payload, [])
+    if ptype == TYPE_SACK:
+        return Packet(TYPE_CONTROL, seq, None, [list(block) for block in SACK_BLOCK.iter_unpack(payload)])
+    if ptype in (TYPE_CONTROL, TYPE_NACK):
+        return Packet(ptype, seq, payload.decode() if payload else None, [])
+    return None
+
+
+def datagram_size(version, payload_size):
+    '''
+    Returns the size of the largest data packet with payload_size bytes of
+    payload (chunk and proof) in the given version.
+    '''
+    if version == JSON_VERSION:
+        return max(MAX_PACKET_SIZE, 4 * ((payload_size + 2) // 3) + 256)  # base64 plus the JSON around it
+    return HEADER.size + payload_size
+
+
+def start_message(file_size, checksum, options):
+    '''
+    Returns the seller's start message (always version 1), offering the
+    options, e.g. {'version': 2}, in its OPTIONS key.
+    '''
+    message = {
+        'TYPE': TYPE_CONTROL,
+        'SEQ/ACK': 0,
+        'DATA': f'start {file_size} {checksum}'
+    }
+    offered = ' '.join(f'{name} {value}' for name, value in options.items())
+    if offered:
+        message['OPTIONS'] = offered
+    return json.dumps(message).encode()
+
+
+def offered_options(datagram):
+    '''
+    Returns the options a seller offered in its start message, as a dict of
+    strings (empty for a seller from before the options).
+    '''
+    try:
+        fields = json.loads(datagram.decode()).get('OPTIONS', '').split()
+    except (ValueError, AttributeError):
+        return {}
+    return dict(zip(fields[::2], fields[1::2]))
+
+
+def start_ack(seq, options):
+    '''
+    Returns the buyer's ACK of the start message (always version 1), naming
+    the options it accepted, e.g. {'version': 2}.
+    '''
+    accepted = ' '.join(f'{name} {value}' for name, value in options.items())
+    return json.dumps({'TYPE': TYPE_CONTROL, 'SEQ/ACK': seq, 'DATA': accepted or None}).encode()
+
+
+def is_start_ack(datagram, packet):
+    '''
+    Returns whether a datagram, decoded into packet, is the buyer's ACK of
+    the start message: version 1, sequence number 0 and no SACK blocks. ACKs
+    of data packets have the picked version or SACK blocks, so they cannot
+    be taken for it and make the seller miss the accepted options.
+    '''
+    return datagram[:1] == b'{' and packet.type == TYPE_CONTROL and packet.seq == 0 and not packet.sack
+
+
+def accepted_options(ack):
+    '''
+    Returns the options a buyer accepted in its ACK of the start message, as
+    a dict of strings.
+    '''
+    fields = ack.data.split() if ack.data else []
+    return dict(zip(fields[::2], fields[1::2]))
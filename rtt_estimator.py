@@ -0,0 +1,93 @@
+'''
+Retransmission timeout of the RDT file transfer, estimated from the round
+trip times the sender measures (RFC 6298).
+
+Every ACK of a packet that was sent only once gives an RTT sample (Karn's
+rule: an ACK of a retransmitted packet cannot tell which copy it belongs
+to). The smoothed RTT and the RTT variation follow the samples, and the
+timeout is SRTT + 4 * RTTVAR. Every expired timeout doubles the timeout
+(exponential backoff) until an ACK of new data shows that the path works
+again, as in QUIC (RFC 9002), since with retransmissions everywhere a
+clean sample may take long to come by. The backoff stops at MAX_BACKOFF
+times the timeout: on a lossy path a few losses in a row are common, and
+an unbounded backoff would leave the sender idle for most of the transfer.
+
+Unlike RFC 6298 the timeout may go down to MIN_RTO, so that a lost packet
+on loopback or a LAN is retransmitted after milliseconds, not seconds.
+'''
+
+INITIAL_RTO = 1.0   # Seconds, until the first sample
+MIN_RTO = 0.01
+MAX_RTO = 60.0
+MAX_BACKOFF = 8     # Largest factor the backoff multiplies the timeout by
+ALPHA = 1 / 8   # Weight of a new sample in the smoothed RTT
+BETA = 1 / 4    # Weight of a new sample in the RTT variation
+K = 4
+GRANULARITY = 0.001     # Clock granularity added to the variation term
+
+
+class RttEstimator:
+    """
+    Smoothed RTT, RTT variation and backed off retransmission timeout of one
+    transfer.
+    """
+    def __init__(self, initial_rto=INITIAL_RTO, min_rto=MIN_RTO, max_rto=MAX_RTO, max_backoff=MAX_BACKOFF):
+        """
+        Parameters:
+        - initial_rto (float): Timeout in seconds until the first sample
+        - min_rto (float): Lower bound of the timeout in seconds
+        - max_rto (float): Upper bound of the timeout in seconds, also with backoff
+        - max_backoff (int): Largest factor the backoff multiplies the timeout by
+        """
+        self.min_rto = min_rto
+        self.max_rto = max_rto
+        self.max_backoff = max_backoff
+        self.srtt = None    # Smoothed RTT in seconds, None until the first sample
+        self.rttvar = None  # RTT variation in seconds
+        self.rto = initial_rto  # Timeout without backoff
+        self.backoff = 1    # Doubled by every expired timeout, reset by a sample
+        self.samples = 0
+
+    def sample(self, rtt):
+        '''
+        Takes the RTT in seconds of a packet that was sent only once.
+        '''
+        if self.srtt is None:
+            self.srtt = rtt
+            self.rttvar = rtt / 2
+        else:
+            self.rttvar = (1 - BETA) * self.rttvar + BETA * abs(self.srtt - rtt)
+            self.srtt = (1 - ALPHA) * self.srtt + ALPHA * rtt
+        self.rto = min(max(self.srtt + max(GRANULARITY, K * self.rttvar), self.min_rto), self.max_rto)
+        self.backoff = 1
+        self.samples += 1
+
+    def back_off(self):
+        '''
+        Doubles the timeout after it expired, up to max_backoff times the
+        timeout without backoff.
+        '''
+        if self.backoff < self.max_backoff and self.rto * self.backoff < self.max_rto:
+            self.backoff *= 2
+
+    def acknowledged(self):
+        '''
+        Drops the backoff after an ACK acknowledged new data, or the start
+        message.
+        '''
+        self.backoff = 1
+
+    def timeout(self):
+        '''
+        Returns the current retransmission timeout in seconds.
+        '''
+        return min(self.rto * self.backoff, self.max_rto)
+
+    def report(self):
+        '''
+        Returns the estimate as a line of text.
+        '''
+        if self.srtt is None:
+            return f"RTT: no samples, RTO: {self.timeout() * 1000:.3f} ms"
+        return (f"RTT: {self.srtt * 1000:.3f} ms (variation {self.rttvar * 1000:.3f} ms, {self.samples} samples), "
+                f"RTO: {self.timeout() * 1000:.3f} ms")
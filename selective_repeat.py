@@ -0,0 +1,352 @@
+'''
+Selective Repeat transport for the RDT file transfer.
+
+Stop-and-Wait keeps a single chunk in flight, so a transfer can never go
+faster than one chunk per round trip. Here the seller keeps up to `window`
+chunks in flight at once:
+- every data packet carries its full sequence number (chunk i has sequence
+  number i + 1; 0 is the start message and the last chunk + 1 is fin)
+- every packet in flight has its own retransmission timer, and only packets
+  whose timer expired are sent again. The timeout follows the round trip
+  time measured on the ACKs (see rtt_estimator.py)
+- the buyer writes chunks that arrive out of order to their place in the
+  file right away and only remembers which ones it has
+- every ACK carries the cumulative sequence number (everything up to it has
+  arrived) plus up to MAX_SACK_BLOCKS [first, last] ranges of sequence
+  numbers received beyond it (selective ACKs). A packet is retransmitted
+  right away instead of waiting for its timer (fast retransmit) once three
+  ACKs acknowledged packets that were sent after it, which also recovers
+  retransmissions that got lost again.
+- if the buyer verifies chunks against the seller's hash tree (see
+  merkle_tree.py), every data packet carries the proof of its chunk, and the
+  buyer answers a chunk that fails verification with a NACK, which the
+  seller answers with the chunk right away.
+- with FEC (see fec.py), a parity packet follows every block of data
+  packets, and the buyer rebuilds a single lost packet of a block from it.
+  Fast retransmit only counts ACKs of packets sent after the parity packet
+  of a block, so that the parity gets the chance to arrive first.
+- the seller keeps no more packets in flight than its congestion window,
+  and paces them out over the round trip (see congestion.py)
+- a resumed transfer only sends the chunks the buyer misses (see
+  rdt_checkpoint.py); sequence number n is then the n-th of them
+
+Packets use the format negotiated in the start message (see rdt_packet.py).
+The start and fin handshakes are shared with Stop-and-Wait in client_rdt.py.
+'''
+import socket
+import time
+
+import fec
+from congestion import CongestionController
+from rdt_checkpoint import ChunkRanges
+import rdt_packet
+from rdt_packet import CHUNK_SIZE
+from rtt_estimator import RttEstimator
+
+DEFAULT_WINDOW = 32     # Packets in flight
+MAX_SACK_BLOCKS = 16    # Ranges reported per ACK, keeps every version 1 ACK well below 1024 bytes
+FAST_RETRANSMIT_ACKS = 3    # ACKs of later packets before a missing packet is retransmitted
+
+
+def sack_blocks(received):
+    '''
+    Returns the sorted sequence numbers as [first, last] ranges, lowest
+    first, at most MAX_SACK_BLOCKS of them.
+    '''
+    blocks = []
+    for seq in sorted(received):
+        if blocks and blocks[-1][1] == seq - 1:
+            blocks[-1][1] = seq
+        elif len(blocks) == MAX_SACK_BLOCKS:
+            break
+        else:
+            blocks.append([seq, seq])
+    return blocks
+
+
+def send_window(udp_socket, buyer_ip, rdtport, file, window, version=rdt_packet.JSON_VERSION, rtt=None, tree=None, chunk_size=CHUNK_SIZE, fec_block=None,
+                congestion=None, chunks=None):
+    '''
+    Sends the file data as a window of chunks and returns once every chunk
+    is acknowledged. The start message must be acknowledged already.
+
+    Parameters:
+    - udp_socket (socket): Bound UDP socket of the seller
+    - buyer_ip (str): IP address of the winning buyer
+    - rdtport (int): RDT port of the buyer
+    - file (rdt_file.ChunkReader): The file, read chunk by chunk as it is sent
+    - window (int): Maximum number of unacknowledged packets in flight
+    - version (int): Packet format picked by the buyer
+    - rtt (RttEstimator): Round trip time estimate of the transfer so far, or None to start a new one
+    - tree (merkle_tree.MerkleTree): Hash tree of the file if the buyer verifies chunks, so every chunk is sent with its proof
+    - chunk_size (int): Bytes of file data per packet, as announced in the start message
+    - fec_block (int): Data packets per parity packet the buyer accepted, to start from, or None without FEC
+    - congestion (CongestionController): Congestion window and pacing of the transfer, or None to start a new one
+    - chunks (rdt_checkpoint.ChunkRanges): Chunks to send, None for the whole file
+
+    Returns:
+    - The sequence number of the fin message
+    '''
+    rtt = rtt or RttEstimator()
+    congestion = congestion or CongestionController(rtt, window, chunk_size)
+    file_size = file.size
+    chunks = chunks or ChunkRanges.all((file_size + chunk_size - 1) // chunk_size)
+    last_seq = chunks.count
+    in_flight = {}  # Sequence number -> retransmission deadline
+    sent_order = {}     # Sequence number -> position of its latest transmission
+    sent_at = {}    # Sequence number -> time of its first transmission
+    retransmitted = set()   # Sent more than once, so their ACKs give no RTT sample (Karn's rule)
+    holes = {}  # Sequence number -> ACKs of packets sent after it
+    skipped = set()     # Not acknowledged by an ACK of a packet sent after it, so probably lost
+    encoder = fec.ParityEncoder(fec_block) if fec_block else None
+    protected = {}  # Sequence number -> position of the parity packet of its block
+    transmissions = 0
+    next_seq = 1
+    next_backoff = 0    # One backoff per timeout interval, however many timers expired in it
+
+    def transmit(seq):
+        nonlocal transmissions
+        index = chunks.chunk(seq)
+        payload = file.read(index * chunk_size, chunk_size)
+        if tree is not None:
+            payload = tree.proof(index) + payload
+        message = rdt_packet.encode(version, rdt_packet.TYPE_DATA, seq, payload)
+        udp_socket.sendto(message, (buyer_ip, rdtport))
+        now = time.monotonic()
+        if seq in sent_at:
+            retransmitted.add(seq)
+        else:
+            sent_at[seq] = now
+        in_flight[seq] = now + rtt.timeout()
+        sent_order[seq] = transmissions
+        transmissions += 1
+        congestion.sent(now)
+        holes.pop(seq, None)
+        return payload
+
+    while in_flight or next_seq <= last_seq:
+        base = min(in_flight) if in_flight else next_seq
+        while next_seq <= last_seq and next_seq < base + window and congestion.can_send(len(in_flight), time.monotonic()):
+            payload = transmit(next_seq)
+            print(f"Sending data seq {next_seq}: {min((chunks.chunk(next_seq) + 1) * chunk_size, file_size)} / {file_size}")
+            parity = encoder.add(next_seq, payload, next_seq == last_seq) if encoder else None
+            if parity is not None:
+                first, payload = parity
+                udp_socket.sendto(rdt_packet.encode(version, rdt_packet.TYPE_PARITY, first, payload), (buyer_ip, rdtport))
+                print(f"Sending parity seq {first}-{next_seq}")
+                for seq in range(first, next_seq + 1):
+                    protected[seq] = transmissions
+                transmissions += 1
+                congestion.sent(time.monotonic())
+            next_seq += 1
+
+        deadlines = list(in_flight.values())
+        if next_seq <= last_seq and next_seq < base + window and len(in_flight) < congestion.cwnd:
+            deadlines.append(congestion.next_send)  # Only the pacer holds the next packet back
+        udp_socket.settimeout(max(min(deadlines) - time.monotonic(), 0.001))
+        try:
+            response, addr = udp_socket.recvfrom(4096)
+        except socket.timeout:
+            now = time.monotonic()
+            expired = sorted(seq for seq, deadline in in_flight.items() if deadline <= now)
+            if expired and now >= next_backoff:
+                rtt.back_off()
+                congestion.timed_out(transmissions)
+                next_backoff = now + rtt.timeout()
+            for seq in expired:
+                print(f"Msg re-sent: {seq}")
+                transmit(seq)
+            continue
+
+        response_message = rdt_packet.decode(response)
+        if response_message is None or addr[0] != buyer_ip:
+            continue    # Damaged, or not from the buyer
+        if response_message.type == rdt_packet.TYPE_NACK:
+            if response_message.seq in in_flight:   # The chunk failed verification
+                print(f"Msg re-sent: {response_message.seq}")
+                transmit(response_message.seq)
+            continue
+        if response_message.type != rdt_packet.TYPE_CONTROL:
+            continue
+        if response_message.seq == 0 and not response_message.sack:
+            continue    # A late ACK of the start message. ACKs with nothing acknowledged in order still carry SACK blocks
+
+        cumulative = response_message.seq
+        blocks = response_message.sack
+        acked = [seq for seq in in_flight if seq <= cumulative or any(first <= seq <= last for first, last in blocks)]
+        if not acked:
+            continue
+        newest = max(sent_order[seq] for seq in acked)
+        rtt.acknowledged()
+        congestion.acknowledged(len(acked), newest)
+        samples = [seq for seq in acked if seq not in retransmitted]
+        if samples:     # The ACK was triggered by the latest of them
+            rtt.sample(time.monotonic() - sent_at[max(samples, key=sent_order.get)])
+        for seq in acked:
+            if encoder is not None:
+                encoder.observe(seq in skipped or seq in retransmitted)
+                if seq in skipped and seq not in retransmitted:     # Rebuilt from parity, lost all the same
+                    congestion.lost(sent_order[seq], transmissions)
+                skipped.discard(seq)
+                protected.pop(seq, None)
+            del in_flight[seq]
+            del sent_order[seq]
+            del sent_at[seq]
+            retransmitted.discard(seq)
+            holes.pop(seq, None)
+        print(f"ACK received: {cumulative} (+{len(acked)})")
+
+        for seq in sorted(seq for seq in in_flight if sent_order[seq] < newest):
+            if encoder is not None:
+                skipped.add(seq)
+                if protected.get(seq, newest) >= newest:
+                    continue    # Its parity packet may still rebuild it
+            holes[seq] = holes.get(seq, 0) + 1
+            if holes[seq] >= FAST_RETRANSMIT_ACKS:
+                print(f"Msg re-sent: {seq}")
+                congestion.lost(sent_order[seq], transmissions)
+                transmit(seq)
+
+    if encoder is not None:
+        print(encoder.report())
+    return last_seq + 1
+
+
+class WindowReceiver:
+    """
+    Receiving side of Selective Repeat: keeps track of the chunks received
+    so far. At most a window of sequence numbers is remembered.
+    """
+    def __init__(self, window):
+        """
+        Parameters:
+        - window (int): Window size announced by the seller
+        """
+        self.window = window
+        self.expected = 1   # Lowest sequence number not received yet
+        self.received = set()   # Sequence numbers received beyond expected
+
+    def wants(self, seq):
+        '''
+        Returns whether the chunk of a data packet is new. Duplicates and
+        packets beyond the window are not.
+        '''
+        return self.expected <= seq < self.expected + self.window and seq not in self.received
+
+    def accept(self, seq):
+        '''
+        Takes the sequence number of a data packet and returns whether its
+        chunk is new.
+        '''
+        if not self.wants(seq):
+            return False
+        self.received.add(seq)
+        while self.expected in self.received:
+            self.received.remove(self.expected)
+            self.expected += 1
+        return True
+
+    def ack_message(self, version):
+        '''
+        Returns the ACK for the current state: cumulative sequence number plus
+        selective ACK ranges of the chunks received beyond it.
+        '''
+        return rdt_packet.encode(version, rdt_packet.TYPE_CONTROL, self.expected - 1, sack=sack_blocks(self.received))
+
+
+def receive_window(udp_socket, seller_ip, window, file, version=rdt_packet.JSON_VERSION, start_ack=None, verifier=None, chunk_size=CHUNK_SIZE, parity=False,
+                   chunks=None, checkpoint=None):
+    '''
+    Receives the file data after the start message was acknowledged, until
+    the fin message arrives. Every new chunk is written to its offset in the
+    file right away.
+
+    Parameters:
+    - udp_socket (socket): Bound UDP socket of the buyer
+    - seller_ip (str): IP address of the seller
+    - window (int): Window size announced by the seller
+    - file (rdt_file.ChunkWriter): File the chunks are written to
+    - version (int): Packet format picked from the seller's offer
+    - start_ack (bytes): ACK of the start message, sent again if the start message is repeated, and on timeouts until
+      the first data packet arrives, in case the seller is still waiting for it
+    - verifier (merkle_tree.ChunkVerifier): Checks every chunk if the buyer accepted the seller's hash tree
+    - chunk_size (int): Bytes of file data per packet, as announced in the start message
+    - parity (bool): Whether the buyer accepted FEC, so that lost chunks are rebuilt from parity packets
+    - chunks (rdt_checkpoint.ChunkRanges): Chunks the seller sends, None for the whole file
+    - checkpoint (rdt_checkpoint.Checkpoint): Record every written chunk is marked in, if the transfer is resumable
+
+    Returns:
+    - (bytes received, time the fin message arrived)
+    '''
+    receiver = WindowReceiver(window)
+    chunks = chunks or ChunkRanges.all((file.size + chunk_size - 1) // chunk_size)
+    decoder = fec.ParityDecoder(receiver, file.size, chunk_size, verifier, chunks) if parity else None
+    received = 0
+    ack_message = start_ack or receiver.ack_message(version)
+    payload_size = chunk_size + (verifier.max_proof_size if verifier else 0) + (fec.PARITY_HEADER.size if parity else 0)
+    buffer_size = rdt_packet.datagram_size(version, payload_size)
+    addr = None
+    while True:
+        try:
+            response, addr = udp_socket.recvfrom(buffer_size)
+        except socket.timeout:
+            print("Timeout occured.")
+            if addr is not None:
+                udp_socket.sendto(ack_message, addr)
+            continue
+
+        if addr[0] != seller_ip:
+            continue
+        response_message = rdt_packet.decode(response)
+        if response_message is None:
+            print("Damaged packet dropped")
+            continue
+        seq_num = response_message.seq
+
+        if response_message.type == rdt_packet.TYPE_CONTROL:
+            if 'start' in (response_message.data or ''):    # Our ACK of the start message was lost
+                udp_socket.sendto(start_ack or rdt_packet.start_ack(0, {}), addr)
+                print("Ack sent: 0")
+            elif 'fin' in (response_message.data or '') and seq_num == receiver.expected:
+                udp_socket.sendto(rdt_packet.encode(version, rdt_packet.TYPE_CONTROL, seq_num, "fin/ack"), addr)
+                print(f"Msg received: {seq_num}")
+                print(f"Ack sent: {seq_num}")
+                return received, time.time()
+            continue
+
+        if response_message.type == rdt_packet.TYPE_PARITY:
+            print(f"Parity received: {seq_num}")
+            rebuilt = decoder.parity(seq_num, response_message.data) if decoder else None
+            if rebuilt is None:
+                continue
+            seq_num, payload = rebuilt
+            print(f"Msg rebuilt: {seq_num}")
+        else:
+            print(f"Msg received: {seq_num}")
+            payload = response_message.data
+        while True:
+            chunk = payload
+            if not 1 <= seq_num <= chunks.count:
+                break   # Not a chunk of this transfer
+            index = chunks.chunk(seq_num)
+            if verifier is not None and receiver.wants(seq_num):
+                chunk = verifier.check(index, chunk)
+                if chunk is None:
+                    print(f"Msg {seq_num} failed verification, re-requested")
+                    udp_socket.sendto(rdt_packet.encode(version, rdt_packet.TYPE_NACK, seq_num), addr)
+                    break
+            if not receiver.accept(seq_num):
+                break
+            file.write(index * chunk_size, chunk)
+            if checkpoint is not None:
+                checkpoint.mark(index)
+            received += len(chunk)
+            rebuilt = decoder.add(seq_num, payload) if decoder else None
+            if rebuilt is None:
+                break
+            seq_num, payload = rebuilt     # The chunk completed a block whose parity already arrived
+            print(f"Msg rebuilt: {seq_num}")
+        ack_message = receiver.ack_message(version)
+        udp_socket.sendto(ack_message, addr)
+        print(f"Ack sent: {receiver.expected - 1}")
+        print(f"Received Data seq {seq_num} : {received}")
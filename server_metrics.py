@@ -0,0 +1,235 @@
+'''
+In-memory instrumentation of the Auctioneer server.
+
+Latencies are recorded into fixed log-spaced histograms (no sample is kept),
+counters and gauges are plain numbers, and everything is rendered in the
+Prometheus text format (0.0.4) by a small HTTP endpoint on the loopback
+interface:
+
+    curl http://127.0.0.1:<metrics-port>/metrics
+'''
+import bisect
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BUCKET_BOUNDS = [1e-6 * 2 ** i for i in range(28)]  # 1us .. ~134s, upper bounds in seconds
+QUANTILES = (0.5, 0.99, 0.999)
+HELP = {    # Help text of the server's metrics, by name without the bidmaster_ prefix
+    'uptime_seconds': "Seconds since the server started",
+    'connections_accepted_total': "Client connections accepted",
+    'connections_accepted_per_second': "Client connections accepted per second over the last 10 seconds",
+    'connections_active': "Client connections currently open",
+    'admission_queue_length': "Clients parked until a room can take them",
+    'admission_parked_total': "Clients parked in the admission queue",
+    'admission_shed_total': "Clients turned away because the admission queue was full",
+    'auctions_sold_total': "Auctions that ended with a winner",
+    'auctions_not_sold_total': "Auctions that ended without a sale",
+    'bids_total': "Bids received",
+    'price_updates_total': "Price updates sent to participants of English auctions",
+    'room_fill_seconds': "Seconds from the auction request until the room has all of its bidders",
+    'bid_ingestion_seconds': "Seconds from receiving a bid until it is acknowledged",
+    'determine_winner_seconds': "Seconds spent determining the winner of an auction",
+    'fanout_seconds': "Seconds between the first and the last delivered copy of a broadcast",
+}
+
+
+class Histogram:
+    """
+    Log-spaced latency histogram. Quantiles are reported as the upper bound
+    of the bucket they fall in, so they are accurate to a factor of two.
+    """
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)    # Last bucket catches everything larger
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect.bisect_left(BUCKET_BOUNDS, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+            if value > self.max:
+                self.max = value
+
+    def quantile(self, q):
+        """
+        Returns the upper bound of the bucket holding the q-quantile, or None.
+        """
+        with self.lock:
+            if self.count == 0:
+                return None
+            rank = q * self.count
+            seen = 0
+            for index, count in enumerate(self.counts):
+                seen += count
+                if seen >= rank:
+                    return BUCKET_BOUNDS[index] if index < len(BUCKET_BOUNDS) else self.max
+        return self.max
+
+
+class RateMeter:
+    """
+    Events per second over a sliding window of whole seconds.
+    """
+    def __init__(self, window=10):
+        self.window = window
+        self.slots = deque()    # [second, count] pairs, oldest first
+        self.lock = threading.Lock()
+
+    def mark(self):
+        second = int(time.monotonic())
+        with self.lock:
+            if self.slots and self.slots[-1][0] == second:
+                self.slots[-1][1] += 1
+            else:
+                self.slots.append([second, 1])
+                self.expire(second)
+
+    def expire(self, second):
+        while self.slots and self.slots[0][0] <= second - self.window:
+            self.slots.popleft()
+
+    def rate(self):
+        with self.lock:
+            self.expire(int(time.monotonic()))
+            return sum(count for _, count in self.slots) / self.window
+
+
+class Metrics:
+    """
+    Registry of the server's counters, gauges, rates and histograms.
+    """
+    def __init__(self):
+        self.counters = {}  # name -> value
+        self.gauges = {}    # name -> value
+        self.rates = {}     # name -> RateMeter
+        self.histograms = {}    # (name, label) -> Histogram
+        self.lock = threading.Lock()
+        self.started = time.time()
+
+    def incr(self, name, amount=1):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def gauge_add(self, name, delta):
+        with self.lock:
+            self.gauges[name] = self.gauges.get(name, 0) + delta
+
+    def mark(self, name):
+        """
+        Counts one event and feeds the rate of name.
+        """
+        self.incr(name + '_total')
+        rate = self.rates.get(name)
+        if rate is None:
+            rate = self.rates.setdefault(name, RateMeter())
+        rate.mark()
+
+    def observe(self, name, seconds, label=None):
+        """
+        Records one latency, in seconds, into the histogram name (optionally
+        split by label).
+        """
+        key = (name, label)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(key, Histogram())
+        histogram.observe(seconds)
+
+    def connection_opened(self):
+        self.mark('connections_accepted')
+        self.gauge_add('connections_active', 1)
+
+    def connection_closed(self):
+        self.gauge_add('connections_active', -1)
+
+    def render(self):
+        """
+        Returns every metric in the Prometheus text format, every family
+        preceded by its # HELP and # TYPE lines. Histograms are written as
+        Prometheus histograms (cumulative buckets, _sum and _count), and the
+        precomputed quantiles as a gauge family of their own,
+        bidmaster_<name>_quantile.
+        """
+        lines = []
+
+        def family(name, kind):
+            lines.append(f"# HELP bidmaster_{name} {HELP.get(name, name.replace('_', ' '))}")
+            lines.append(f"# TYPE bidmaster_{name} {kind}")
+
+        family('uptime_seconds', 'gauge')
+        lines.append(f"bidmaster_uptime_seconds {time.time() - self.started:.3f}")
+        with self.lock:
+            counters = dict(self.counters)
+            gauges = dict(self.gauges)
+            histograms = dict(self.histograms)
+        for name, value in sorted(counters.items()):
+            family(name, 'counter')
+            lines.append(f"bidmaster_{name} {value}")
+        for name, value in sorted(gauges.items()):
+            family(name, 'gauge')
+            lines.append(f"bidmaster_{name} {value}")
+        for name, rate in sorted(self.rates.items()):
+            family(f'{name}_per_second', 'gauge')
+            lines.append(f"bidmaster_{name}_per_second {rate.rate():.3f}")
+        series = {}     # name -> [(label, histogram)], every label of a histogram in one family
+        for (name, label), histogram in sorted(histograms.items(), key=lambda item: (item[0][0], item[0][1] or '')):
+            series.setdefault(name, []).append((label, histogram))
+        for name, labelled in series.items():
+            family(name, 'histogram')
+            quantiles = []
+            for label, histogram in labelled:
+                labels = f'label="{label}",' if label else ''
+                with histogram.lock:
+                    counts = list(histogram.counts)
+                    count, total = histogram.count, histogram.sum
+                cumulative = 0
+                for bound, bucket in zip(BUCKET_BOUNDS + [float('inf')], counts):
+                    cumulative += bucket
+                    le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                    lines.append(f'bidmaster_{name}_bucket{{{labels}le="{le}"}} {cumulative}')
+                selector = f"{{{labels.rstrip(',')}}}" if label else ''
+                lines.append(f"bidmaster_{name}_sum{selector} {total:.6f}")
+                lines.append(f"bidmaster_{name}_count{selector} {count}")
+                for q in QUANTILES:
+                    value = histogram.quantile(q)
+                    if value is not None:
+                        quantiles.append(f'bidmaster_{name}_quantile{{{labels}quantile="{q}"}} {value:.6f}')
+            if quantiles:
+                lines.append(f"# HELP bidmaster_{name}_quantile Upper bound of the histogram bucket holding each quantile of {name}")
+                lines.append(f"# TYPE bidmaster_{name}_quantile gauge")
+                lines.extend(quantiles)
+        return "\n".join(lines) + "\n"
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path not in ('/', '/metrics'):
+            self.send_error(404)
+            return
+        body = self.server.metrics.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass    # Scrapes are not worth a log line
+
+
+def start_metrics_endpoint(metrics, port, host='127.0.0.1'):
+    '''
+    Serves the metrics over HTTP on a daemon thread and returns the HTTP server.
+    '''
+    httpd = ThreadingHTTPServer((host, port), MetricsHandler)
+    httpd.daemon_threads = True
+    httpd.metrics = metrics
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    return httpd
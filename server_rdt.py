@@ -1,273 +1,1846 @@
-''' 
+'''
 NAMES: KABIR SINGH BHATIA(kbhatia), PRABHUDATTA MISHRA (pmishra4)
 '''
 import socket
+import sys
 import threading
 import argparse
+import asyncio
+import itertools
+import math
+import time
+import selectors
+import logging
+import logging.handlers
+import queue
+from collections import deque
+import auction_protocol as protocol
+from event_log import EventLog, read_events
+from server_metrics import Metrics, start_metrics_endpoint
+
+logger = logging.getLogger('bidmaster')   # Server log, see configure_logging
+
+class Timer:
+    """
+    A callback scheduled on a TimerWheel. Cancelled timers are skipped.
+    """
+    __slots__ = ('tick', 'callback', 'cancelled')
+
+    def __init__(self, tick, callback):
+        self.tick = tick    # Wheel tick at which the timer fires
+        self.callback = callback
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+
+class TimerWheel:
+    def __init__(self, tick=0.1, slots=512):
+        """
+        Hashed timing wheel shared by all auction rooms.
+
+        Scheduling and cancelling are O(1); advance() only looks at the slots
+        of the ticks that elapsed since the previous call.
+
+        Parameters:
+        - tick (float): Resolution of the wheel in seconds
+        - slots (int): Number of slots in the wheel
+        """
+        self.tick = tick
+        self.slots = [[] for _ in range(slots)]
+        self.started = time.monotonic()
+        self.current_tick = 0   # Last tick that was processed
+        self.lock = threading.Lock()    # Bids schedule price updates without the registry lock
+
+    def schedule(self, delay, callback):
+        """
+        Schedules callback to run after delay seconds and returns its Timer.
+        """
+        with self.lock:
+            tick = max(self.current_tick + 1, math.ceil((time.monotonic() - self.started + delay) / self.tick))
+            timer = Timer(tick, callback)
+            self.slots[tick % len(self.slots)].append(timer)
+        return timer
+
+    def advance(self):
+        """
+        Runs the callbacks of every timer that expired since the last call.
+        """
+        now_tick = int((time.monotonic() - self.started) / self.tick)
+        while self.current_tick < now_tick:
+            with self.lock:
+                self.current_tick += 1
+                slot = self.slots[self.current_tick % len(self.slots)]
+                if not slot:
+                    continue
+                due = [timer for timer in slot if timer.tick <= self.current_tick]
+                slot[:] = [timer for timer in slot if timer.tick > self.current_tick and not timer.cancelled]     # Timers for later rounds stay
+            for timer in due:
+                if not timer.cancelled:
+                    timer.callback()
+
+
+class Broadcast:
+    def __init__(self, label, recipients, log, metrics=None):
+        """
+        Tracks one notification fanned out to many connections and measures
+        how far apart the first and the last recipient got it.
+
+        Parameters:
+        - label (str): Name of the notification, used in the log
+        - recipients (int): Number of connections the notification goes to
+        - log: Function used to report the spread once every copy is out
+        - metrics (Metrics): Receives the fan-out time of the notification
+        """
+        self.label = label
+        self.remaining = recipients     # Copies not yet handed to the kernel
+        self.delivered_count = 0
+        self.log = log
+        self.metrics = metrics
+        self.started = time.perf_counter()
+        self.first = None   # Time the first copy was handed to the kernel
+        self.last = None    # Time the last copy was handed to the kernel
+        self.lock = threading.Lock()
+
+    def delivered(self, ok=True):
+        """
+        Records that one copy was fully written (ok) or dropped because the
+        connection failed.
+        """
+        with self.lock:
+            if ok:
+                now = time.perf_counter()
+                self.first = self.first or now
+                self.last = now
+                self.delivered_count += 1
+            self.remaining -= 1
+            if self.remaining == 0:
+                self.complete()
+
+    def spread(self):
+        """
+        Returns the seconds between the first and the last delivered copy.
+        """
+        return (self.last - self.first) if self.first is not None else 0.0
+
+    def complete(self):
+        elapsed = (self.last or self.started) - self.started
+        if self.metrics is not None:
+            self.metrics.observe('fanout_seconds', elapsed, self.label)
+        self.log(f"Broadcast {self.label} reached {self.delivered_count} recipient(s) in {elapsed:.6f}s, spread {self.spread():.6f}s", logging.DEBUG)
+
+
+class BidBook:
+    def __init__(self, min_price):
+        """
+        Keeps the bids of one auction and always knows the two highest ones,
+        so the winner and clearing price are ready as soon as bidding closes.
+
+        Ties are broken by arrival order: the earlier bid ranks higher.
+        A bidder may bid again, but only to raise its own bid.
+
+        Parameters:
+        - min_price (int): Seller's minimum price
+        """
+        self.min_price = min_price  # Seller's minimum price
+        self.bids = {}      # Dictionary to store the latest bid by bidder id
+        self.arrivals = 0   # Number of bids received so far, used as arrival order
+        self.top = []       # Up to two (amount, -arrival, bidder_id) entries, highest first
+
+    def __len__(self):
+        return len(self.bids)
+
+    def __contains__(self, bidder_id):
+        return bidder_id in self.bids
+
+    def add(self, bidder_id, amount):
+        """
+        Records a bid in O(1) and updates the two highest bids.
+
+        Parameters:
+        - bidder_id: Identifier of the bidder
+        - amount (int): Bid amount
+
+        Raises:
+        - ValueError if the bid lowers the bidder's previous bid
+        """
+        if amount < self.bids.get(bidder_id, amount):
+            raise ValueError("A bid can only be raised")
+        self.bids[bidder_id] = amount
+        self.arrivals += 1
+        entry = (amount, -self.arrivals, bidder_id)
+        top = [ranked for ranked in self.top if ranked[2] != bidder_id]     # A raise replaces the bidder's own entry
+        if len(top) < 2 or entry > top[-1]:
+            top.append(entry)
+            top.sort(reverse=True)  # At most three entries
+        self.top = top[:2]
+
+    def highest(self):
+        """
+        Returns (bidder_id, amount) of the highest bid, or None if there is no bid.
+        """
+        if not self.top:
+            return None
+        amount, _, bidder_id = self.top[0]
+        return bidder_id, amount
+
+    def second_price(self):
+        """
+        Returns the second-highest bid, with the seller's minimum price
+        standing in when there is no higher second bid.
+        """
+        if len(self.top) < 2:
+            return self.min_price
+        return max(self.top[1][0], self.min_price)
+
+    def result(self, auc_type):
+        """
+        Returns (winner_id, price) for the given auction type, or None if the
+        highest bid does not meet the minimum price.
+
+        Parameters:
+        - auc_type (int): 1 for first-price, 2 for second-price and 3 for
+          English auctions
+        """
+        highest = self.highest()
+        if highest is None or highest[1] < self.min_price:
+            return None
+        winner_id, highest_bid = highest
+        return winner_id, self.second_price() if auc_type == protocol.AUCTION_SECOND_PRICE else highest_bid
+
+    def beats(self, amount):
+        """
+        Returns True if amount would become the standing price of an English
+        auction: at least the minimum price and above the highest bid.
+        """
+        return amount >= self.min_price and (not self.top or amount > self.top[0][0])
+
+
+class AuctionRoom:
+    def __init__(self, server, room_id, seller_conn):
+        """
+        Holds the state of a single auction: its seller, buyers, bids and lifecycle.
+
+        Parameters:
+        - server (BidMasterServer): The server hosting this room
+        - room_id (str): Identifier of the room
+        - seller_conn: Connection object for the seller of this room
+        """
+        self.server = server    # Server hosting this room
+        self.room_id = room_id  # Room identifier
+        self.seller_conn = seller_conn  # Connection object for seller
+        self.buyers = []    # List to store connected buyers (conn, buyer_id)
+        self.buyer_ids = {}     # Buyer id of every connected buyer, by connection
+        self.lock = threading.RLock()   # Guards the bids and participants of this room only
+        self.bid_book = None    # Bids of the auction, created with the auction details
+        self.deadline = None    # Timer that closes bidding when the bidding window expires
+        self.idle_timer = None  # Timer that closes an English auction once bidding goes quiet
+        self.last_bid_at = None     # Time of the last accepted bid of an English auction
+        self.price_timer = None     # Pending coalesced price update of an English auction
+        self.quoted = {}    # Last (price, leading) sent to each participant, by connection
+        self.ongoing = False    # Flag that indicates whether the bidding is on-going
+        self.concluded = False  # Flag set once the result is decided and waits to be logged
+        self.auction_details = None     # Store auction details
+        self.submitted = None   # Time the auction request was accepted
+        self.seller_ip = None   # IP address of the seller, kept for recovery
+        self.seller_participant = seller_conn.participant_id if seller_conn else None   # Session id of the seller, if any
+        self.addresses = {}     # IP address of every buyer that joined, by buyer id
+        self.detached = {}  # Recovered buyers that have not reconnected yet, buyer id -> IP address
+        self.participants = set()   # Buyer ids of session participants, which only their participant id reattaches
+
+    def log(self, message, level=logging.INFO):
+        """
+        Writes a server log line tagged with the room id.
+        """
+        if logger.isEnabledFor(level):
+            logger.log(level, f"[Room {self.room_id}] {message}")
+
+    def describe(self):
+        """
+        Returns the one-line description of the room used in room listings.
+        """
+        return f"{self.room_id} {self.auction_details['item_name']} {len(self.buyers) + len(self.detached)}/{self.auction_details['max_bids']}"
+
+    def is_english(self):
+        """
+        Returns True if the room runs an open ascending (English) auction.
+        """
+        return self.auction_details is not None and self.auction_details['auc_type'] == protocol.AUCTION_ENGLISH
+
+    def is_open(self):
+        """
+        Returns True if the room has an auction request and free bidder slots.
+        """
+        return self.auction_details is not None and not self.ongoing and len(self.buyers) + len(self.detached) < self.auction_details['max_bids']
+
+    def broadcast(self, label, deliveries):
+        """
+        Sends notifications to many participants at once.
+
+        Every recipient's copy goes to its own write buffer and is flushed
+        without blocking, so a slow buyer does not delay the others.
+        Identical messages are encoded once per protocol.
+
+        Parameters:
+        - label (str): Name of the notification, used in the log
+        - deliveries: List of (conn, messages) pairs, messages being a tuple
+          of (opcode, *values) tuples sent to that connection. Pairs without a
+          connection (participants of a recovered auction that did not
+          reconnect) are skipped
+        """
+        deliveries = [(conn, messages) for conn, messages in deliveries if conn is not None]
+        record = Broadcast(label, len(deliveries), self.log, self.server.metrics)
+        encoded = {}    # (protocol, messages) -> bytes
+        for conn, messages in deliveries:
+            key = (conn.protocol, messages)
+            if key not in encoded:
+                encoded[key] = b"".join(conn.encode(*message) for message in messages)
+            conn.write(encoded[key], record)
+
+    def buyer_id_of(self, conn):
+        """
+        Returns the buyer id of a connection in this room, or None.
+        """
+        return self.buyer_ids.get(conn)
+
+    def has_participant(self, participant_id):
+        """
+        Returns True if the session participant already sells or bids in this room.
+        """
+        return participant_id is not None and (participant_id in self.addresses or participant_id == self.seller_participant)
+
+    def receive_auction_request(self, conn, opcode, values):
+        """
+        Receives auction details from the seller and opens the room for buyers.
+
+        Parameters:
+        - conn: Connection object for the seller.
+        - opcode: AUCTION_REQUEST for framed clients, TEXT for legacy clients
+        - values: Decoded message fields (the raw request line for TEXT)
+        """
+        try:
+            if opcode == protocol.TEXT:
+                auction_details = values[0].split()
+                if len(auction_details) != 4:   # Ensure exactly four components are received
+                    raise Exception()
+
+                auc_type, auc_min_price, max_bids, item_name = auction_details
+                if not (auc_type.isdigit() and auc_min_price.isdigit() and max_bids.isdigit()):
+                    raise Exception()
+                auc_type, auc_min_price, max_bids = int(auc_type), int(auc_min_price), int(max_bids)
+            elif opcode == protocol.AUCTION_REQUEST:
+                auc_type, auc_min_price, max_bids, item_name = values
+            else:
+                raise Exception()
+
+            if (auc_type in [protocol.AUCTION_FIRST_PRICE, protocol.AUCTION_SECOND_PRICE, protocol.AUCTION_ENGLISH]) and auc_min_price >= 0 and max_bids > 0 and 0 < len(str(item_name)) < 255:
+                # Store validated details in the dictionary
+                self.auction_details = {
+                    'auc_type': auc_type,  # Type 1, 2 or 3
+                    'auc_min_price': auc_min_price,    # Minimum price for the auction
+                    'max_bids': max_bids,      # Maximum number of bids allowed
+                    'item_name': str(item_name)     # Name of the item being auctioned
+                }
+                self.bid_book = BidBook(auc_min_price)
+                self.seller_ip = conn.addr[0]
+                self.submitted = time.perf_counter()
+                self.server.record('seller_registered', self, seller=self.seller_ip, participant=self.seller_participant, **self.auction_details)
+                self.log("Action request received. Now waiting for Buyer")
+                self.server.publish_room(self)
+                self.server.admit_waiting()     # Parked buyers may join now
+            else:
+                raise Exception()
+
+        except Exception as e:
+            conn.send(protocol.INVALID_REQUEST)     # Notify seller of invalid request format
+
+    def add_buyer(self, conn, addr):
+        """
+        Adds a buyer to the room and starts bidding when enough buyers are connected.
+
+        Parameters:
+        - conn: Connection object for the buyer
+        - addr: Address of the buyer
+        """
+        conn.send(protocol.ROLE, protocol.ROLE_BUYER, self.room_id)    # Assigning role Buyer to client
+
+        buyer_id = conn.participant_id     # Session participants keep their id in every room
+        buyer_number = len(self.addresses) + 1
+        while buyer_id is None or buyer_id in self.addresses:
+            buyer_id = f"Buyer {buyer_number}"
+            buyer_number += 1
+        self.buyers.append((conn, buyer_id))    # Add buyer connection and ID to list
+        self.buyer_ids[conn] = buyer_id
+        self.addresses[buyer_id] = addr[0]
+        self.server.record('buyer_joined', self, buyer=buyer_id, ip=addr[0], participant=conn.participant_id is not None)
+
+        self.log(f"Buyer {buyer_id} is connected from {addr[0]}:{addr[1]}", logging.DEBUG)    # Server log
+        self.server.publish_room(self)
+
+        if len(self.buyers) == self.auction_details['max_bids']:     # Check if max buyers reached
+            self.start_bidding()
+        else:
+            conn.send(protocol.WAITING)    # Notify the buyer that the server is waiting for other buyers to connect
+
+    def start_bidding(self):
+        """
+        Initiates the bidding process by notifying every participant and
+        asking each buyer for a bid. Bids then arrive concurrently through
+        on_data and are handled by receive_bid.
+        """
+        self.ongoing = True # Set the on-going flag to true so that no more buyers are routed to this room
+        self.server.record('bidding_started', self)
+        self.server.publish_room(self)
+        self.log("Requested number of bidders arrived. Let's start bidding!")
+        if self.submitted is not None:
+            self.server.metrics.observe('room_fill_seconds', time.perf_counter() - self.submitted)
+        # Notify buyers and seller that server has started bidding process, and ask buyers for their bids
+        deliveries = [(conn, ((protocol.BIDDING_STARTED,), (protocol.BID_REQUEST,))) for conn, _ in self.buyers]
+        deliveries.append((self.seller_conn, ((protocol.BIDDING_STARTED,),)))
+        self.broadcast("BIDDING_STARTED", deliveries)
+        self.schedule_close()
+
+    def schedule_close(self):
+        """
+        Starts the timers that close bidding: the bidding window and, for
+        English auctions, the idle timeout that closes the auction once no
+        higher bid arrived for english_idle seconds.
+        """
+        if self.server.bid_window is not None:
+            self.deadline = self.server.timers.schedule(self.server.bid_window, self.close_bidding)
+        if self.is_english():
+            self.last_bid_at = time.monotonic()
+            self.idle_timer = self.server.timers.schedule(self.server.english_idle, self.check_idle)
+
+    def check_idle(self):
+        """
+        Closes an English auction whose last bid is english_idle seconds old,
+        or checks again once it will be.
+        """
+        remaining = self.last_bid_at + self.server.english_idle - time.monotonic()
+        if remaining > 0:
+            self.idle_timer = self.server.timers.schedule(remaining, self.check_idle)
+        else:
+            self.close_bidding()
+
+    def schedule_price_update(self):
+        """
+        Makes sure a price update goes out at the next price tick. All bids
+        accepted until then are covered by that single update.
+        """
+        if self.price_timer is None:
+            self.price_timer = self.server.timers.schedule(self.server.price_interval, self.publish_price)
+
+    def publish_price(self):
+        """
+        Sends the standing price of an English auction to every participant
+        whose view of it changed since the last update.
+
+        Every connection gets at most one update per price tick. A connection
+        that has not drained the previous data yet is skipped and gets the
+        latest price on a later tick instead of a backlog of stale ones.
+        """
+        with self.lock:
+            self.price_timer = None
+            if not self.ongoing or self.concluded:
+                return
+            leader_id, price = self.bid_book.highest()
+            deliveries = []
+            for conn in [self.seller_conn] + [conn for conn, _ in self.buyers]:
+                if conn is None:
+                    continue
+                quote = (price, 1 if self.buyer_ids.get(conn) == leader_id else 0)
+                if self.quoted.get(conn) == quote:
+                    continue
+                if conn.backlogged():
+                    self.schedule_price_update()
+                    continue
+                self.quoted[conn] = quote
+                deliveries.append((conn, ((protocol.PRICE_UPDATE, *quote),)))
+        self.server.metrics.incr('price_updates_total', len(deliveries))
+        self.broadcast("PRICE_UPDATE", deliveries)
+
+    def close_bidding(self):
+        """
+        Closes bidding when the bidding window expires, or when an English
+        auction went quiet.
+
+        In sealed auctions, buyers that have not bid are dropped from the
+        auction. The winner is determined from the bids received so far.
+        """
+        with self.lock:
+            if not self.ongoing or self.bid_book is None or self.concluded:
+                return
+            if self.is_english():
+                silent = []     # Every buyer saw the standing price and stays to hear the result
+            else:
+                silent = [(conn, buyer_id) for conn, buyer_id in self.buyers if buyer_id not in self.bid_book]
+                self.buyers = [(conn, buyer_id) for conn, buyer_id in self.buyers if buyer_id in self.bid_book]
+                for conn, _ in silent:
+                    del self.buyer_ids[conn]
+                self.detached = {buyer_id: ip for buyer_id, ip in self.detached.items() if buyer_id in self.bid_book}
+            self.concluded = True   # Bids arriving from now on are ignored
+        self.log(f"Bidding closed, dropping {len(silent)} silent buyer(s)")
+        for conn, buyer_id in silent:
+            conn.send(protocol.BIDDING_CLOSED)
+            self.server.conn_rooms.pop(conn, None)
+            conn.close()
+        self.determine_winner()
+
+    def receive_bid(self, conn, opcode, values):
+        """
+        Receives a bid from a buyer.
+
+            Validates bid amount and stores them in the bid book. Once every
+            buyer has bid, the winner is determined. In English auctions a
+            buyer may bid again and again as long as every bid beats the
+            standing price; bidding closes on a timer instead.
+
+        Only the room's own lock is held while the bid is stored, and never
+        while anything is sent, so bids of other rooms (and the other bids
+        of this room) are not held up by the acknowledgement.
+
+        Parameters:
+        - conn: Connection object for the buyer
+        - opcode: BID for framed clients, TEXT for legacy clients
+        - values: Decoded message fields (the raw bid for TEXT)
+        """
+        try:
+            bid_amount = int(values[0]) if opcode in (protocol.TEXT, protocol.BID) else None
+        except ValueError:  # Handle non-integer inputs, notifying client of invalid bid format
+            bid_amount = None
+        reason = protocol.BID_NOT_A_NUMBER if bid_amount is None else protocol.BID_NEGATIVE if bid_amount < 0 else None
+        received = conn.received_at
+        acknowledge = lambda: self.acknowledge_bid(conn, received)
+        durable = self.server.event_log is not None
+        complete = False
+        with self.lock:
+            buyer_id = self.buyer_ids.get(conn)
+            english = self.is_english()
+            if not self.ongoing or self.concluded or buyer_id is None or (buyer_id in self.bid_book and not english):
+                return  # Buyers only talk once bidding has started, and bid once in sealed auctions
+            if reason is None and english and not self.bid_book.beats(bid_amount):
+                reason = protocol.BID_TOO_LOW
+            if reason is None:
+                self.bid_book.add(buyer_id, bid_amount)    # Keeps the top two bids up to date
+                # Logged under the lock so that every bid precedes the result in the event log.
+                # The bid is only acknowledged once it is durable there
+                self.server.record('bid_accepted', self, acknowledge if durable else None, buyer=buyer_id, amount=bid_amount)
+                if english:
+                    self.last_bid_at = time.monotonic()
+                    self.schedule_price_update()
+                elif self.all_bids_in():
+                    complete = self.concluded = True    # Only this thread goes on to determine the winner
+        if reason is not None:
+            conn.send(protocol.INVALID_BID, reason)
+            conn.send(protocol.BID_REQUEST)
+            return
+        self.log(f"{buyer_id} bid ${bid_amount}", logging.DEBUG)
+        self.server.metrics.incr('bids_total')
+        if not durable:
+            acknowledge()
+        if complete:
+            with self.server.buyer_lock:
+                self.determine_winner() # Determine winner after all bids are received
+
+    def acknowledge_bid(self, conn, received):
+        """
+        Confirms a bid to its buyer and records how long the bid took from
+        arrival to acknowledgement.
+        """
+        conn.send(protocol.BID_ACCEPTED)
+        if received is not None:
+            self.server.metrics.observe('bid_ingestion_seconds', time.perf_counter() - received)
+
+    def all_bids_in(self):
+        """
+        Returns True if every buyer of the room, reconnected or not, has bid.
+        """
+        return len(self.bid_book) == len(self.buyers) + len(self.detached)
+
+    def determine_winner(self):
+        """
+        Determines the winner based on the type of auction and bids received
+
+        Notifies the winner and other participants of the auction results
+
+        """
+        started = time.perf_counter()
+        for timer in (self.deadline, self.idle_timer, self.price_timer):
+            if timer is not None:
+                timer.cancel()
+        self.concluded = True
+        result = self.bid_book.result(self.auction_details['auc_type'])    # Top two bids are already known
+        self.server.metrics.observe('determine_winner_seconds', time.perf_counter() - started)
+
+        # The result is announced once it is durable in the event log
+        if result is not None:    # Highest bid meets minimum price requirement
+            winner_id, price = result
+            self.server.record('winner', self, lambda: self.notify_winner(winner_id, price), buyer=winner_id, price=price)
+        else:
+            self.server.record('no_sale', self, self.notify_no_sale)
+
+    def notify_winner(self, winner_id, price):
+        """
+        Notifies the winner of their successful bid and informs other buyers
+        of their loss
+
+        Closes the room after notification
+
+        Parameters:
+        - winner_id: Identifier of the winning buyer
+        - price: Winning bid amount
+
+        """
+        winner_conn = next((conn for conn, buyer_id in self.buyers if buyer_id == winner_id), None)
+        seller_ip = self.seller_ip
+        buyer_ip = self.addresses[winner_id]
+
+        deliveries = [
+            (winner_conn, ((protocol.WON, price, self.auction_details['item_name'], seller_ip),)),    # Notify winner
+            (self.seller_conn, ((protocol.SOLD, price, self.auction_details['item_name'], buyer_ip),)), # Notify seller
+        ]
+        # Notify losing bidders about their unsuccessful attempts
+        deliveries.extend((conn, ((protocol.LOST,),)) for conn, buyer_id in self.buyers if buyer_id != winner_id)
+        self.broadcast("RESULT", deliveries)
+
+        self.log(f"The item was sold to {winner_id} for ${price}")
+        self.server.metrics.incr('auctions_sold_total')
+
+        self.server.reset_server(self)     # Close the room
+
+    def notify_no_sale(self):
+        """
+        Notifies participants if no sale occured
+
+        Closes the room after notification
+        """
+        recipients = [conn for conn, _ in self.buyers] + [self.seller_conn]     # Let the seller know as well
+        self.broadcast("RESULT", [(conn, ((protocol.NOT_SOLD,),)) for conn in recipients])
+
+        self.log("The item was not sold")
+        self.server.metrics.incr('auctions_not_sold_total')
+        self.server.reset_server(self)
+
+    def close(self):
+        """
+        Closes the seller connection and all buyer connections of the room.
+        """
+        if self.seller_conn:
+            self.seller_conn.close()
+            self.log("Connection closed with seller", logging.DEBUG)
+        self.seller_conn = None # Clearing stored seller connection object
+        for conn, buyer_id in self.buyers:  # Closing connections with all buyers
+            conn.close()
+            self.log(f"Connection closed with {buyer_id}", logging.DEBUG)
+        self.buyers.clear()
+        self.buyer_ids.clear()
+        self.bid_book = None
+
+    def replay(self, record):
+        """
+        Applies one event of the event log to the room while recovering
+        after a restart. Buyers are restored as detached until they reconnect.
+
+        Parameters:
+        - record (dict): Event read from the log
+        """
+        event = record['event']
+        if event == 'seller_registered':
+            self.auction_details = {key: record[key] for key in ('auc_type', 'auc_min_price', 'max_bids', 'item_name')}
+            self.seller_ip = record['seller']
+            self.seller_participant = record.get('participant')
+            self.bid_book = BidBook(record['auc_min_price'])
+        elif event == 'buyer_joined':
+            self.addresses[record['buyer']] = record['ip']
+            self.detached[record['buyer']] = record['ip']
+            if record.get('participant'):
+                self.participants.add(record['buyer'])
+        elif event == 'bidding_started':
+            self.ongoing = True
+        elif event == 'bid_accepted':
+            self.bid_book.add(record['buyer'], record['amount'])
+
+    def detached_from(self, ip, command):
+        """
+        Returns the places of the recovered auction a client without a
+        participant id could take back from its IP address: "Seller" and the
+        ids of detached buyers that were not session participants.
+
+        Parameters:
+        - ip (str): IP address of the client
+        - command: 'SELL', 'BUY' or None for legacy clients
+        """
+        if self.concluded:
+            return []
+        places = []
+        if command in (None, 'SELL') and self.seller_conn is None and self.seller_participant is None and self.seller_ip == ip:
+            places.append("Seller")
+        if command in (None, 'BUY'):
+            places.extend(buyer_id for buyer_id, buyer_ip in self.detached.items() if buyer_ip == ip and buyer_id not in self.participants)
+        return places
+
+    def reattach(self, conn, addr, command, place=None):
+        """
+        Gives a participant of a recovered auction its place back. Session
+        participants are recognized by their participant id. Other clients
+        carry no identity, so they take back the place the server picked for
+        them with detached_from().
+
+        Parameters:
+        - conn: Connection object for the client
+        - addr: Address of the client
+        - command: 'SELL', 'BUY' or None for legacy clients
+        - place: "Seller" or the buyer id a client without participant id takes back
+
+        Returns:
+        - "Seller" or "Buyer" if the client was reattached, None otherwise
+        """
+        if self.concluded:
+            return None
+        if conn.participant_id is not None:
+            seller_match = conn.participant_id == self.seller_participant
+        else:
+            seller_match = place == "Seller"
+        if command in (None, 'SELL') and self.seller_conn is None and seller_match:
+            self.seller_conn = conn
+            self.server.conn_rooms[conn] = self
+            conn.joined(self)
+            self.log(f"Seller reconnected from {addr[0]}:{addr[1]}", logging.DEBUG)
+            conn.send(protocol.ROLE, protocol.ROLE_SELLER_RECOVERED, self.room_id)
+            if self.ongoing and self.is_english() and len(self.bid_book):
+                self.schedule_price_update()    # Tell the returning seller the standing price
+            self.resume()
+            return "Seller"
+        if conn.participant_id is not None:
+            buyer_id = conn.participant_id if conn.participant_id in self.detached else None
+        else:
+            buyer_id = place if place in self.detached else None
+        if command not in (None, 'BUY') or buyer_id is None:
+            return None
+        del self.detached[buyer_id]
+        self.buyers.append((conn, buyer_id))
+        self.buyer_ids[conn] = buyer_id
+        self.server.conn_rooms[conn] = self
+        conn.joined(self)
+        self.log(f"{buyer_id} reconnected from {addr[0]}:{addr[1]}", logging.DEBUG)
+        conn.send(protocol.ROLE, protocol.ROLE_BUYER, self.room_id)
+        if not self.ongoing:
+            if len(self.buyers) == self.auction_details['max_bids']:
+                self.start_bidding()
+            else:
+                conn.send(protocol.WAITING)
+        elif buyer_id in self.bid_book:
+            conn.send(protocol.BID_ACCEPTED)    # Its bid survived the restart
+        else:
+            conn.send(protocol.BID_REQUEST)
+        if self.ongoing and self.is_english() and len(self.bid_book):
+            self.schedule_price_update()    # Tell the returning buyer the standing price
+        self.resume()
+        return "Buyer"
+
+    def resume(self):
+        """
+        Determines the winner of a recovered auction whose bids were all
+        received before the restart, once all of its participants are back.
+        """
+        if self.ongoing and not self.concluded and not self.is_english() and not self.detached and self.seller_conn is not None and self.all_bids_in():
+            self.determine_winner()
+
 
 class BidMasterServer:
-    def __init__(self, host, port):
+    def __init__(self, host, port, max_rooms=None, hello_timeout=0.2, bid_window=60.0, reuse_port=False, event_log=None, recover=False, metrics_port=None, queue_cap=1000,
+                 english_idle=10.0, price_interval=0.1):
         """
         Initializes the Auctioneer server with the specified host and port.
 
         Parameters:
         - host (str): The IP address of the server
         - port (int): The port number for the server
+        - max_rooms (int): Maximum number of concurrent auction rooms (None for no limit)
+        - hello_timeout (float): Seconds to wait for an optional client hello before
+          treating the client as a legacy client
+        - bid_window (float): Seconds buyers have to bid once bidding starts (None for no limit)
+        - reuse_port (bool): Bind with SO_REUSEPORT so that several processes share the port
+        - event_log (str): Path of the append-only event log (None to run without one)
+        - recover (bool): Rebuild the auctions in progress from the event log on startup
+        - metrics_port (int): Local port of the HTTP metrics endpoint (None to disable it)
+        - queue_cap (int): Maximum number of clients parked in the admission queue
+          (0 turns clients away instead of parking them)
+        - english_idle (float): Seconds without a higher bid after which an English
+          auction closes
+        - price_interval (float): Seconds between two price updates of an English
+          auction; the bids in between are coalesced into one update
         """
         self.host = host    # Server IP address
         self.port = port    # Server port number
         self.server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)  # Create TCP socket
-        self.status = 0     # 0: Waiting for seller, 1: Waiting for buyer 
-        self.seller_conn = None     # Connection object for seller
-        self.buyers = []    # List to store connected buyers (conn, buyer_id)
-        self.bids = {}      # Dictionary to store bids by buyer id  
-        self.ongoing = False    # Flag that indicates whether the bidding is on-going
-        self.auction_details = None     # Store auction details
-        self.buyer_lock = threading.RLock()     # Reentrant lock for synchronizing access to buyers
+        self.max_rooms = max_rooms  # Cap on concurrent auction rooms
+        self.hello_timeout = hello_timeout  # Time given to clients to pick a room
+        self.rooms = {}     # Dictionary to store auction rooms by room id
+        self.conn_rooms = {}    # Dictionary mapping each connection to its room
+        self.room_ids = itertools.count(1)  # Generator for server-assigned room ids
+        self.buyer_lock = threading.RLock()     # Reentrant lock guarding the room registry; bids only take their room's lock
+        self.bid_window = bid_window    # Length of the bidding window
+        self.timers = TimerWheel()  # Single timer scheduler shared by all rooms
+        self.flusher = SocketFlusher()  # Flushes pending writes in threaded mode
+        self.reuse_port = reuse_port    # Share the port with other worker processes
+        self.event_log_path = event_log     # Path of the event log
+        self.event_log = EventLog(event_log, self.dispatch_durable) if event_log else None
+        self.recover_on_start = recover     # Replay the event log before serving
+        self.recovered_rooms = {}   # Recovered rooms still waiting for participants to reconnect
+        self.metrics = Metrics()    # Latency histograms, counters and gauges
+        self.metrics_port = metrics_port
+        self.waiting = {}   # Admission queue in arrival order: conn -> (addr, command, room_id)
+        self.sessions = {}  # Session connections by participant id
+        self.connections = set()    # Client connections that are open, sessions included
+        self.participant_ids = itertools.count(1)   # Generator for server-assigned participant ids
+        self.queue_cap = queue_cap
+        self.english_idle = english_idle
+        self.price_interval = price_interval
 
     def start_server(self):
-        
+
         """
         Starts the server to listen for incoming connections from
         seller and buyers
 
         Handles collection in separate threads for seller and buyers.
+        Each thread only reads from its socket and hands the data to the
+        auction state machine (on_connect / on_data / on_disconnect).
         """
 
         # Bind server socket and start listening for connections
-        self.server_socket.bind((self.host, self.port))
+        self.bind()
         self.server_socket.listen()
-        print(f"Auctioneer is ready for hosting auctions!")
+        self.recover()
+        self.start_metrics()
+        threading.Thread(target=self.run_timers, daemon=True).start()   # Single thread firing the deadlines of all rooms
+        threading.Thread(target=self.flusher.run, daemon=True).start()  # Single thread flushing writes to slow clients
+        logger.info("Auctioneer is ready for hosting auctions!")
 
         while True:
             conn, addr = self.server_socket.accept()
-            if self.ongoing:
-                conn.send(b"Server: Auction is ongoing. Please try again later\n")
-                conn.close()
+            threading.Thread(target=self.serve_connection, args=(conn, addr), daemon=True).start()  # Handling client in a new thread
+
+    def bind(self):
+        """
+        Binds the server socket to the configured host and port. SO_REUSEADDR
+        lets a restarted server (e.g. recovering after a crash) bind while old
+        connections linger in TIME_WAIT.
+        """
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        if self.reuse_port:
+            self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.server_socket.bind((self.host, self.port))
+
+    def record(self, event, room, callback=None, **fields):
+        """
+        Appends an event of a room to the event log.
+
+        Parameters:
+        - event (str): Name of the event
+        - room (AuctionRoom): Room the event belongs to
+        - callback (callable): Run once the event is durable, right away
+          when the server runs without an event log
+        - fields: Event specific fields
+        """
+        if self.event_log is None:
+            if callback is not None:
+                callback()
+            return
+        self.event_log.append(event, room.room_id, callback, **fields)
+
+    def dispatch_durable(self, callbacks):
+        """
+        Runs the callbacks of a batch of events that just became durable.
+        Called from the committer thread of the event log. Bid
+        acknowledgements need no lock; closing a room takes the registry
+        lock itself.
+        """
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception:
+                logger.exception("Error after commit")
+
+    def recover(self):
+        """
+        Replays the event log and rebuilds the auctions that were in progress
+        when the server stopped. Their participants get their place back when
+        they reconnect (see reattach).
+        """
+        if not (self.recover_on_start and self.event_log_path):
+            return
+        rooms = {}
+        for record in read_events(self.event_log_path):
+            room_id = record['room']
+            if record['event'] in ('winner', 'no_sale'):    # Concluded auctions are not recovered
+                rooms.pop(room_id, None)
                 continue
-            if self.status == 0:    # Waiting for seller
-                print(f"New Seller is connected from {addr[0]}:{addr[1]}")
-                threading.Thread(target=self.handle_seller, args=(conn, addr)).start()      # Handling seller in a new thread
-            elif self.status == 1:  # Waiting for buyers
-                if not self.auction_details:    # If buyer connects when seller has not submitted auction request yet
-                    conn.sendall(b"Server: Seller is busy. Try to connect again later\n")
-                    conn.close()
-                else:
-                    threading.Thread(target=self.handle_buyer, args=(conn, addr)).start()   # Handle buyer in a new thread       
-
-    def handle_seller(self, conn, addr):
+            if record['event'] == 'seller_registered':
+                rooms[room_id] = AuctionRoom(self, room_id, None)
+            if room_id in rooms:
+                rooms[room_id].replay(record)
+        with self.buyer_lock:
+            for room_id, room in rooms.items():
+                if not self.claim_room(room_id):
+                    continue
+                self.rooms[room_id] = room
+                self.recovered_rooms[room_id] = room
+                self.publish_room(room)
+                if room.ongoing:
+                    room.schedule_close()
+                room.log(f"Recovered auction of {room.auction_details['item_name']} with {len(room.detached)} buyer(s) and {len(room.bid_book)} bid(s)")
+        logger.info(f"Recovered {len(rooms)} auction(s) from {self.event_log_path}")
+
+    def start_metrics(self):
         """
-        Handles communication with the seller.
+        Starts the HTTP metrics endpoint if a metrics port is configured.
+        """
+        if self.metrics_port is not None:
+            start_metrics_endpoint(self.metrics, self.metrics_port)
+            logger.info(f"Metrics available at http://127.0.0.1:{self.metrics_port}/metrics")
 
-        Receives auction details from the seller and updates server status.
+    def reattach(self, conn, addr, command, room_id):
+        """
+        Gives a reconnecting participant of a recovered auction its place back.
 
+        Session participants are recognized by their participant id. A
+        client without one only gets a place back if its IP address matches
+        exactly one place of the recovered auctions and no other client is
+        connected from that address; behind a NAT or with several clients on
+        one host nothing tells them apart, and it joins as a new client.
 
-        Parameters:
-        - conn: Connection object for the seller.
-        - addr: Address of the seller.
+        Returns:
+        - "Seller" or "Buyer" if the client was reattached, None otherwise
         """
-        
-        print(">> New Seller Thread spawned")   # Server log
-        self.seller_conn = conn
-        conn.sendall(b"Server: Your role is: [Seller]\nPlease submit auction request:\n")   # Assigning role to the client
-        self.status = 1     # Setting status to 1 so that the new clients can join as buyers
+        if not self.recovered_rooms:
+            return None
+        if room_id is not None:
+            candidates = [self.recovered_rooms[room_id]] if room_id in self.recovered_rooms else []
+        else:
+            candidates = list(self.recovered_rooms.values())
+        place = None
+        if conn.participant_id is None:
+            places = []
+            for room in candidates:
+                with room.lock:
+                    places.extend((room, place) for place in room.detached_from(addr[0], command))
+            if len(places) != 1 or any(other is not conn and other.addr[0] == addr[0] for other in self.connections):
+                return None
+            room, place = places[0]
+            candidates = [room]
+        for room in candidates:
+            with room.lock:
+                role = room.reattach(conn, addr, command, place)
+            if role is not None:
+                if room.seller_conn is not None and not room.detached:
+                    self.recovered_rooms.pop(room.room_id, None)    # Everybody is back
+                return role
+        return None
 
+    def run_timers(self):
+        """
+        Advances the timer wheel once per tick. Used by the threaded mode only.
+        """
         while True:
-            try:
-                data = conn.recv(1024).decode() # Receive auction details from seller
+            time.sleep(self.timers.tick)
+            with self.buyer_lock:
+                self.timers.advance()
+
+    def serve_connection(self, sock, addr, hello=None):
+        """
+        Reads data from one client socket until it is closed and feeds it
+        to the auction state machine. Used by the threaded mode only.
+
+        Parameters:
+        - sock: Socket of the client
+        - addr: Address of the client
+        - hello: Parsed hello of a connection handed over by another worker
+        """
+        conn = None
+        self.metrics.connection_opened()
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)  # Small notifications must not wait for delayed ACKs
+            handed_off = hello is not None
+            if not handed_off:
+                sock.settimeout(self.hello_timeout)     # Give the client a chance to pick a room and protocol
+                data = b""
+                try:
+                    while hello is None:
+                        received = sock.recv(1024)
+                        if not received:
+                            sock.close()
+                            return
+                        data += received
+                        hello = self.parse_hello(data)
+                except socket.timeout:
+                    hello = self.parse_hello(data, complete=True)
+                sock.settimeout(None)
+
+            conn = ClientConnection(SocketConnection(sock, self.flusher), addr, hello[0])
+            conn.hello = hello
+            conn.handed_off = handed_off
+            conn_protocol, hello, data = hello
+            role = self.on_connect(conn, addr, hello)
+            if role is None:    # Client was turned away
+                return
+            logger.debug(f">> New {role} Thread spawned")   # Server log
+            while True:
+                if data:
+                    self.on_data(conn, data)
+                data = sock.recv(1024)
                 if not data:
                     break
-                auction_details = data.split()
-                if len(auction_details) != 4:   # Ensure exactly four components are received
-                    raise Exception()
-                
-                auc_type, auc_min_price, max_bids, item_name = auction_details
+        except OSError:     # Socket was closed by reset_server while we were reading
+            pass
+        finally:
+            self.metrics.connection_closed()
+            if conn is not None:
+                self.on_disconnect(conn)
 
-                if (auc_type.isdigit() and auc_min_price.isdigit() and max_bids.isdigit() and (int(auc_type) in [1,2]) and len(str(item_name)) < 255):
-                    # Store validated details in the dictionary
-                    self.auction_details = {
-                        'auc_type': int(auc_type),  # Type 1 or 2
-                        'auc_min_price': int(auc_min_price),    # Minimum price for the auction
-                        'max_bids': int(max_bids),      # Maximum number of bids allowed
-                        'item_name': str(item_name)     # Name of the item being auctioned
-                    }     
-                    print("Action request received. Now waiting for Buyer")   
-                    break
-                else:
-                    raise Exception()
-                
-            except Exception as e:
-                conn.sendall(b"Server: Invalid auction request!\n")     # Notify seller of invalid request format
+    def parse_hello(self, data, complete=False):
+        """
+        Parses the optional hello a client may send right after connecting.
+
+        Framed clients send protocol.MAGIC followed by a HELLO frame. Legacy
+        clients may send one of these text lines:
+        - SELL [room_id]: host a new auction room
+        - BUY [room_id]: join the given room, or any room with open bidder slots
+        - LIST: list the rooms that have open bidder slots
+
+        Parameters:
+        - data (bytes): Data received from the client so far
+        - complete (bool): True if no more data will arrive before admission
+
+        Returns:
+        - (protocol, hello, rest): protocol is 'framed' or 'text', hello is a
+          (command, room_id) tuple or None for legacy clients, rest is the
+          data that follows the hello. None if more data is needed.
+        """
+        if data.startswith(protocol.MAGIC):
+            start = len(protocol.MAGIC)
+            if len(data) < start + protocol.HEADER.size:
+                return None if not complete else ('text', None, b"")
+            length, opcode = protocol.HEADER.unpack_from(data, start)
+            end = start + protocol.HEADER.size + length
+            if len(data) < end:
+                return None if not complete else ('text', None, b"")
+            try:
+                if opcode != protocol.HELLO:
+                    raise protocol.ProtocolError("Expected a HELLO frame")
+                role, room_id = protocol.decode_payload(opcode, data[start + protocol.HEADER.size:end])
+            except protocol.ProtocolError:
+                return 'framed', None, data[end:]
+            command = {protocol.ROLE_SELLER: 'SELL', protocol.ROLE_BUYER: 'BUY', protocol.ROLE_LIST: 'LIST', protocol.ROLE_SESSION: 'SESSION'}.get(role)
+            return 'framed', (command, room_id or None) if command else None, data[end:]
+        if protocol.MAGIC.startswith(data) and data and not complete:
+            return None     # Part of the magic, wait for the rest
+
+        line, newline, rest = data.partition(b"\n")
+        words = line.decode(errors='replace').split()
+        if newline and words and words[0].upper() in ('SELL', 'BUY', 'LIST') and len(words) <= 2:
+            room_id = words[1] if len(words) == 2 and words[1].upper() != 'ANY' else None
+            return 'text', (words[0].upper(), room_id), rest
+        if data and not newline and not complete:
+            return None     # Wait for the rest of the hello line
+        return 'text', None, data
+
+    def publish_room(self, room):
+        """
+        Called whenever a room opens or its bidder count changes. Sharded
+        workers publish the room to the shared registry.
+        """
+
+    def release_room(self, room):
+        """
+        Called when a room is closed.
+        """
+
+    def claim_room(self, room_id):
+        """
+        Returns True if the room id is free to use for a new room.
+        """
+        return room_id not in self.rooms
+
+    def list_rooms(self):
+        """
+        Returns the descriptions of the rooms that have open bidder slots.
+        """
+        return [room.describe() for room in self.rooms.values() if room.is_open()]
+
+    def route_remote(self, conn, room_id):
+        """
+        Hands a buyer over to another server process hosting the given room
+        (or any open room if room_id is None). Returns True if the connection
+        was handed over. A single process server has nowhere to route to.
+        """
+        return False
+
+    def find_open_room(self, conn=None):
+        """
+        Returns the oldest room that still has open bidder slots, or None.
+        Rooms the session participant of conn already takes part in are skipped.
+        """
+        participant_id = conn.participant_id if conn is not None else None
+        return next((room for room in self.rooms.values() if room.is_open() and not room.has_participant(participant_id)), None)
+
+    def reject(self, conn, reason):
+        """
+        Turns a client away with the given reason.
+        """
+        conn.send(protocol.REJECTED, reason)
+        conn.close()
+        return None
+
+    def on_connect(self, conn, addr, hello=None):
+        """
+        Admits a newly accepted client as seller or buyer of a room, or turns it away.
+
+        Legacy clients (no hello) join the oldest room with open bidder slots
+        as buyers, or host a new room when there is none. Clients that cannot
+        be placed yet are parked in the admission queue.
+
+        Parameters:
+        - conn (ClientConnection): Connection object for the client
+        - addr: Address of the client
+        - hello: (command, room_id) tuple sent by the client, or None
+
+        Returns:
+        - "Seller", "Buyer" or "Waiting" if the client was admitted or parked,
+          None otherwise
+        """
+        with self.buyer_lock:
+            self.connections.add(conn)
+            command, room_id = hello if hello else (None, None)
+            if command == 'LIST':
+                conn.send(protocol.ROOM_LIST, *self.list_rooms())
+                conn.close()
+                return None
+            if command == 'SESSION':
+                return self.open_session(conn, addr, room_id)
+            role = self.reattach(conn, addr, command, room_id)
+            if role is not None:
+                return role
+            role = self.place(conn, addr, command, room_id)
+            if role is None:
+                return self.park(conn, addr, command, room_id)
+            return role or None
+
+    def place(self, conn, addr, command, room_id, remote=True):
+        """
+        Makes a client the buyer of an open room or the seller of a new room.
+
+        Parameters:
+        - conn (ClientConnection): Connection object for the client
+        - addr: Address of the client
+        - command: 'SELL', 'BUY' or None for legacy clients
+        - room_id (str): Room requested by the client, or None
+        - remote (bool): Whether the client may be handed to another worker
+
+        Returns:
+        - "Seller" or "Buyer" if the client was placed, None if it has to
+          wait, False if it was turned away or handed over
+        """
+        if command == 'BUY':
+            room = self.rooms.get(room_id) if room_id else self.find_open_room(conn)
+            if room is not None and room.has_participant(conn.participant_id):
+                self.reject(conn, f"You already take part in auction room {room_id}")
+                return False
+            if room is None or not room.is_open():
+                if remote and self.route_remote(conn, room_id):
+                    return False
+                if room_id is not None and room is None:    # No such room to wait for
+                    self.reject(conn, "No auction room with open bidder slots. Try to connect again later")
+                    return False
+                return None
+            self.handle_buyer(conn, addr, room)
+            return "Buyer"
+        if command is None:     # Legacy client
+            room = self.find_open_room(conn)
+            if room is not None:
+                self.handle_buyer(conn, addr, room)
+                return "Buyer"
+            if remote and self.route_remote(conn, None):
+                return False
+        if self.max_rooms is not None and len(self.rooms) >= self.max_rooms:
+            return None
+        if room_id is not None and not self.claim_room(room_id):
+            self.reject(conn, f"Auction room {room_id} already exists")
+            return False
+        self.handle_seller(conn, addr, room_id)
+        return "Seller"
+
+    def park(self, conn, addr, command, room_id):
+        """
+        Parks a client that cannot be placed yet in the admission queue and
+        tells it its position. Sheds the client when the queue is full.
+
+        Returns:
+        - "Waiting" if the client was parked, None if it was turned away
+        """
+        if len(self.waiting) >= self.queue_cap:
+            self.metrics.incr('admission_shed_total')
+            if command == 'BUY':
+                return self.reject(conn, "No auction room with open bidder slots. Try to connect again later")
+            return self.reject(conn, "Auction is ongoing. Please try again later")
+        self.waiting[conn] = (addr, command, room_id)
+        self.metrics.incr('admission_parked_total')
+        self.metrics.gauge_add('admission_queue_length', 1)
+        conn.send(protocol.QUEUED, len(self.waiting))
+        logger.debug(f"Parked {addr[0]}:{addr[1]} at position {len(self.waiting)} of the admission queue")
+        return "Waiting"
+
+    def admit_waiting(self):
+        """
+        Places the parked clients that fit now, in arrival order, and tells
+        the others their new position. Called whenever a room opens for
+        buyers or a room is closed.
+        """
+        if not self.waiting:
+            return
+        admitted = 0
+        for conn, (addr, command, room_id) in list(self.waiting.items()):
+            role = self.place(conn, addr, command, room_id, remote=False)
+            if role is None:
                 continue
-                
+            del self.waiting[conn]
+            self.metrics.gauge_add('admission_queue_length', -1)
+            admitted += 1
+            logger.debug(f"Admitted {addr[0]}:{addr[1]} from the admission queue as {role or 'nobody'}")
+        if admitted:
+            self.announce_positions()
+
+    def announce_positions(self):
+        """
+        Sends every parked client its current position in the queue.
+        """
+        for position, conn in enumerate(self.waiting, 1):
+            conn.send(protocol.QUEUED, position)
+
+    def open_session(self, conn, addr, participant_id=None):
+        """
+        Turns a connection into a session that stays open across auctions
+        and takes part in any number of them under a stable participant id.
+
+        Parameters:
+        - conn (ClientConnection): Connection object for the client
+        - addr: Address of the client
+        - participant_id (str): Id requested by the client, or None to assign one
+
+        Returns:
+        - "Session" if the session was opened, None otherwise
+        """
+        if conn.protocol != 'framed':
+            return self.reject(conn, "Sessions need the framed protocol")
+        if participant_id is None:
+            participant_id = f"P{next(self.participant_ids)}"
+            while participant_id in self.sessions:
+                participant_id = f"P{next(self.participant_ids)}"
+        elif participant_id in self.sessions:
+            return self.reject(conn, f"Participant {participant_id} is already connected")
+        conn.participant_id = participant_id
+        conn.channels = set()
+        self.sessions[participant_id] = conn
+        conn.send(protocol.SESSION, participant_id)
+        logger.debug(f"Session {participant_id} opened from {addr[0]}:{addr[1]}")
+        return "Session"
+
+    def session_message(self, conn, opcode, values):
+        """
+        Handles one frame received on a session connection.
+
+        JOIN creates a channel to another auction, SELECT_ROOM picks the
+        auction the next frame is about.
+
+        Returns:
+        - The RoomChannel the frame must be dispatched to, or None
+        """
+        if opcode == protocol.SELECT_ROOM:
+            conn.selected = values[0]
+            return None
+        if opcode == protocol.JOIN:
+            with self.buyer_lock:
+                self.join(conn, values[0], values[1] or None)
+            return None
+        return next((channel for channel in conn.channels if channel.room_id == conn.selected), None)
+
+    def join(self, conn, role, room_id):
+        """
+        Lets a session take part in one more auction, or lists the open rooms.
+
+        Parameters:
+        - conn (ClientConnection): Session connection
+        - role (int): Role requested in the JOIN frame
+        - room_id (str): Room requested by the client, or None
+        """
+        if role == protocol.ROLE_LIST:
+            conn.send(protocol.ROOM_LIST, *self.list_rooms())
+            return
+        command = {protocol.ROLE_SELLER: 'SELL', protocol.ROLE_BUYER: 'BUY'}.get(role)
+        channel = RoomChannel(conn, room_id or "")
+        conn.channels.add(channel)
+        if command is None:
+            self.reject(channel, "Invalid role")
+        elif self.reattach(channel, conn.addr, command, room_id) is None and self.place(channel, conn.addr, command, room_id, remote=False) is None:
+            self.park(channel, conn.addr, command, room_id)
+
+    def on_data(self, conn, data):
+        """
+        Dispatches data received from a client to the seller or bid handler
+        of its room depending on the client's role and the auction phase.
+
+        Parameters:
+        - conn (ClientConnection): Connection object for the client
+        - data (bytes): Data received from the client
+        """
+        try:
+            conn.received_at = time.perf_counter()  # Start of the bid ingestion latency
+            messages = conn.receive(data)
+        except protocol.ProtocolError as e:
+            logger.warning(f"Protocol error from {conn.addr[0]}:{conn.addr[1]}: {e}")
+            conn.close()
+            return
+        for opcode, values in messages:
+            if conn.channels is not None:   # Session: route the frame to one of its auctions
+                channel = self.session_message(conn, opcode, values)
+                if channel is not None:
+                    channel.received_at = conn.received_at
+                    self.dispatch(channel, opcode, values)
+            elif not self.dispatch(conn, opcode, values):
+                return
+
+    def dispatch(self, conn, opcode, values):
+        """
+        Hands one message to the seller or bid handler of the connection's room.
+
+        Auction requests change the room registry and take the registry
+        lock. Bids only take the lock of their own room, so bid intake in
+        one room never waits for another room.
+
+        Returns:
+        - False if the connection is in no room
+        """
+        room = self.conn_rooms.get(conn)
+        if room is None:
+            return False
+        if conn is room.seller_conn:
+            with self.buyer_lock:
+                if room.auction_details is None:
+                    room.receive_auction_request(conn, opcode, values)
+            return True
+        room.receive_bid(conn, opcode, values)
+        return True
+
+    def on_disconnect(self, conn):
+        """
+        Cleans up after a client closes its connection.
+
+        If a seller leaves before submitting an auction request, its room
+        is closed.
+
+        Parameters:
+        - conn (ClientConnection): Connection object for the client
+        """
+        with self.buyer_lock:
+            self.connections.discard(conn)
+            if conn.channels is not None:   # A session leaves all of its auctions
+                if self.sessions.get(conn.participant_id) is conn:
+                    del self.sessions[conn.participant_id]
+                for channel in list(conn.channels):
+                    self.on_disconnect(channel)
+                return
+            if self.waiting.pop(conn, None) is not None:
+                self.metrics.gauge_add('admission_queue_length', -1)
+                self.announce_positions()
+                return
+            room = self.conn_rooms.get(conn)
+            if room is not None and conn is room.seller_conn and room.auction_details is None:
+                room.log("Seller disconnected before submitting an auction request")
+                self.reset_server(room)
+
+    def handle_seller(self, conn, addr, room_id=None):
+        """
+        Handles communication with the seller.
+
+        Opens a new auction room for the seller and asks for the auction request.
+
 
+        Parameters:
+        - conn: Connection object for the seller.
+        - addr: Address of the seller.
+        - room_id (str): Room id requested by the seller, or None to assign one
+        """
+        if room_id is None:
+            room_id = str(next(self.room_ids))
+            while not self.claim_room(room_id):
+                room_id = str(next(self.room_ids))
+        room = AuctionRoom(self, room_id, conn)
+        self.rooms[room_id] = room
+        self.conn_rooms[conn] = room
+        conn.joined(room)
+        room.log(f"New Seller is connected from {addr[0]}:{addr[1]}", logging.DEBUG)
+        conn.send(protocol.ROLE, protocol.ROLE_SELLER, room_id)   # Assigning role to the client
 
-    def handle_buyer(self, conn, addr): 
+    def handle_buyer(self, conn, addr, room):
         """
         Handles communication with a buyer.
 
-        Manages buyer connections and starts bidding when enough buyers are connected.
+        Adds the buyer to the given room, which starts bidding once enough buyers are connected.
 
         Parameters:
         - conn: Connection object for the buyers
         - addr: Address of the buyer
+        - room (AuctionRoom): Room the buyer joins
         """
-        print(">> New Buyer Thread spawned")    # Server log
-        conn.sendall(b"Server: Your role is: [Buyer]\n")    # Assigning role Buyer to client
-
-        with self.buyer_lock:   # Acquire lock to safely modify buyers list
-            if len(self.buyers) < self.auction_details['max_bids']:
-                buyer_number = len(self.buyers) + 1
-                buyer_id = f"Buyer {buyer_number}"
-                self.buyers.append((conn, buyer_id))    # Add buyer connection and ID to list
-                
-                print(f"Buyer {buyer_id} is connected from {addr[0]}:{addr[1]}")    # Server log
-            
-                should_start_bidding = len(self.buyers) == self.auction_details['max_bids']     # Check if max buyers reached
-                  
-        if should_start_bidding:
-            bidding_thread = threading.Thread(target=self.start_bidding)
-            bidding_thread.start()  
-        else:
-            conn.sendall(b"Server: The Auctioneer is still waiting for other Buyer to connect...\n")    # Notify the buyer that the server is waiting for other buyers to connect
+        self.conn_rooms[conn] = room
+        conn.joined(room)
+        with room.lock:
+            room.add_buyer(conn, addr)
+
+    def reset_server(self, room):
+        """
+        Closes an auction room after its auction concludes.
 
+        Closes all of the room's connections and forgets the room so that its
+        id can be reused.
 
-    def start_bidding(self):
+        Parameters:
+        - room (AuctionRoom): Room to close
+        """
+        with self.buyer_lock:
+            self.release_room(room)
+            self.rooms.pop(room.room_id, None)
+            self.recovered_rooms.pop(room.room_id, None)
+            self.conn_rooms.pop(room.seller_conn, None)
+            for conn, _ in room.buyers:
+                self.conn_rooms.pop(conn, None)
+            room.close()
+            self.admit_waiting()    # Parked clients take over the freed capacity
+
+
+class ClientConnection:
+    """
+    A client connection as seen by the auction state machine.
+
+    Wraps a SocketConnection (threaded mode) or TransportConnection (async
+    mode) and speaks either the framed protocol or the legacy text protocol,
+    so the state machine only deals with typed messages.
+
+    Outgoing data is queued in a write buffer and flushed without blocking;
+    whatever the kernel does not take right away is written once the
+    connection becomes writable again.
+    """
+    def __init__(self, conn, addr, conn_protocol='text'):
         """
-        Initiates the bidding process by launching separate threads 
-        for each buyer to receive bids concurrently 
+        Parameters:
+        - conn: SocketConnection or TransportConnection of the client
+        - addr: Address of the client
+        - conn_protocol (str): 'framed' or 'text'
         """
-        print(">> New Bidding Thread spawned")
-        
-        self.ongoing = True # Set the on-going flag to true so that main thread can reject new client connections
-        for conn, _, in self.buyers:
-            conn.sendall(b"Server: Requested number of bidders arrived. Let's start bidding!\n")    # Notify buyers that server has started bidding process
-        self.seller_conn.sendall(b"Server: Requested number of bidders arrived. Let's start bidding!\n")    # Notify seller that server has started bidding process
-        print("Requested number of bidders arrived. Let's start bidding!")
-        
-        threads = []
-        for conn, buyer_id in self.buyers:
-            thread = threading.Thread(target=self.receive_bid, args=(conn, buyer_id))
-            threads.append(thread)
-            thread.start()
-        
-        for thread in threads:
-            thread.join()   # Waiting for all bid-receiving threads to complete
-        
-        self.determine_winner() # Determine winner after all bids are received
+        self.conn = conn
+        self.addr = addr
+        self.protocol = conn_protocol
+        self.decoder = protocol.FrameDecoder() if conn_protocol == 'framed' else None
+        self.outbox = deque()   # Pending [data, broadcast] entries
+        self.write_lock = threading.Lock()  # Guards the outbox between writers and the flusher
+        self.closing = False    # Close once the outbox is flushed
+        self.failed = False     # Set when a write fails, pending data is dropped
+        self.hello = None       # (protocol, hello, rest) parsed when the client connected
+        self.handed_off = False     # Whether another worker handed this connection over
+        self.received_at = None     # Time the last data arrived
+        self.participant_id = None  # Stable id of a session participant
+        self.channels = None    # RoomChannels of a session, None for single-auction connections
+        self.selected = None    # Room the next frame of a session is about
 
+    def encode(self, opcode, *values):
+        """
+        Encodes a message for the client's protocol.
+        """
+        if self.decoder is not None:
+            return protocol.encode_message(opcode, *values)
+        return protocol.render_text(opcode, *values).encode()
 
-    def receive_bid(self, conn, buyer_id):
+    def send(self, opcode, *values):
+        """
+        Sends a message encoded for the client's protocol.
         """
-        Receives bids from a buyer.
+        self.write(self.encode(opcode, *values))
 
-            Validates bid amount and stores them in a dictionary
+    def write(self, data, broadcast=None):
+        """
+        Queues encoded data and flushes as much as the kernel accepts now.
 
         Parameters:
-        - conn: Connection object for the buyer
-        - buyer_id: Identifier for the buyer
+        - data (bytes): Encoded messages
+        - broadcast (Broadcast): Broadcast to notify once the data is written
         """
-        while True:
-            conn.sendall(b"Server: Please submit your bid:")
-            data = conn.recv(1024).decode()
-            if data:
-                try:
-                    bid_amount = int(data)
-                    if bid_amount < 0:
-                        conn.sendall(b"Server: Invalid bid. Please submit a positive integer\n")
-                        continue
-                    with self.buyer_lock:   # Acquire lock to safely update bids dictionary
-                        self.bids[buyer_id] = bid_amount
-                        print(f"{buyer_id} bid ${bid_amount}")
-                        conn.sendall(b"Server: Bid received. Please wait...\n")
-                    break
-                except ValueError:  # Handle non-integer inputs, notifying client of invalid bid format
-                    conn.sendall(b"Server: Invalid bid. Try again.\n")
-                    continue
+        with self.write_lock:
+            if self.failed or self.closing:
+                if broadcast is not None:
+                    broadcast.delivered(ok=False)
+                return
+            self.outbox.append([memoryview(data), broadcast])
+            if len(self.outbox) == 1:   # Otherwise a flush is already waiting for the socket
+                self.flush_locked()
 
-    def determine_winner(self):
+    def flush(self):
         """
-        Determines the winner based on the type of auction and bids received
+        Writes pending data; called when the connection becomes writable.
+        """
+        with self.write_lock:
+            self.flush_locked()
 
-        Notifies the winner and other participants of the auction results
-        
+    def flush_locked(self):
+        try:
+            while self.outbox:
+                entry = self.outbox[0]
+                sent = self.conn.send_nowait(entry[0])
+                if sent < len(entry[0]):
+                    entry[0] = entry[0][sent:]
+                    self.conn.wait_writable(self.flush)
+                    return
+                self.outbox.popleft()
+                if entry[1] is not None:
+                    entry[1].delivered()
+        except OSError:     # Peer went away, drop what is left
+            self.failed = True
+            while self.outbox:
+                _, broadcast = self.outbox.popleft()
+                if broadcast is not None:
+                    broadcast.delivered(ok=False)
+        if self.closing:
+            self.conn.close()
+
+    def receive(self, data):
         """
-        with self.buyer_lock:
-            highest_bidder_id = max(self.bids, key=self.bids.get)   # Identify highest bidder based on bid amounts
-            highest_bid = self.bids[highest_bidder_id]
-
-            if highest_bid >= self.auction_details['auc_min_price']:    # Check if highest bid meets minimum price requirement
-                if self.auction_details['auc_type'] == 1:   # First auction type
-                    self.notify_winner(highest_bidder_id, highest_bid)
-                elif self.auction_details['auc_type'] == 2: # Second auction type
-                    self.bids['seller_min_price'] = self.auction_details['auc_min_price']
-                    second_highest_bid = sorted(self.bids.values(), reverse=True)[1]
-                    self.notify_winner(highest_bidder_id, second_highest_bid)
-            else:
-                self.notify_no_sale()
+        Returns the list of (opcode, values) messages contained in received data.
+        Legacy text data is returned as a single TEXT message.
+        """
+        if self.decoder is not None:
+            return self.decoder.feed(data)
+        return [(protocol.TEXT, (data.decode(errors='replace'),))]
 
-    def notify_winner(self, winner_id, price):
+    def joined(self, room):
         """
-        Notifies the winner of their successful bid and informs other buyers 
-        of their loss
+        Called when the connection becomes the seller or a buyer of a room.
+        """
+
+    def backlogged(self):
+        """
+        Returns True if data queued earlier is still waiting for the socket.
+        """
+        return bool(self.outbox)
+
+    def getpeername(self):
+        return self.conn.getpeername()
+
+    def fileno(self):
+        return self.conn.fileno()
 
-        Resets server state after notification
+    def close(self):
+        """
+        Closes the connection once the pending data has been written.
+        """
+        with self.write_lock:
+            self.closing = True
+            if not self.outbox:
+                self.conn.close()
+
+
+class RoomChannel:
+    """
+    The part of a session connection that takes part in one auction.
 
+    Looks like a ClientConnection to the auction state machine: messages
+    sent to it go out on the session connection, preceded by an IN_ROOM
+    frame naming the room, and closing it only leaves the auction.
+    """
+    protocol = 'session'    # Encodings differ from plain framed connections
+
+    def __init__(self, session, room_id):
+        """
         Parameters:
-        - winner_id: Identifier of the winning buyer
-        - price: Winning bid amount
-        
+        - session (ClientConnection): Session connection
+        - room_id (str): Room the channel belongs to ("" until it is known)
         """
-        winner_conn = next(conn for conn, buyer_id in self.buyers if buyer_id == winner_id)
-        seller_ip = self.seller_conn.getpeername()[0]
-        buyer_ip = winner_conn.getpeername()[0]
-        
-        winner_conn.sendall(f"Auction Finished!\nYou won this item {self.auction_details['item_name']}. Your payment due is ${price}. Seller's IP: {seller_ip}\n".encode())    # Notify winner
-        self.seller_conn.sendall(f"Auction Finished!\nSuccess! Your item {self.auction_details['item_name']} has been sold for ${price}. Winning Buyer's IP: {buyer_ip}\n".encode()) # Notify seller
+        self.session = session
+        self.room_id = room_id
+        self.addr = session.addr
+        self.participant_id = session.participant_id
+        self.channels = None
+        self.hello = session.hello
+        self.handed_off = True  # A channel cannot be handed to another worker
+        self.received_at = None
 
-        print(f"The item was sold to {winner_id} for ${price}")
+    def encode(self, opcode, *values):
+        return protocol.encode_message(protocol.IN_ROOM, self.room_id) + protocol.encode_message(opcode, *values)
 
-        for conn, buyer_id in self.buyers:  # Notify losing bidders about their unsuccessful attempts
-            if buyer_id != winner_id:
-                conn.sendall(b"Server: Unfortunately, you did not win in the last round.\n")
-        
-        self.reset_server()     # Reset server state
+    def send(self, opcode, *values):
+        self.session.write(self.encode(opcode, *values))
 
-    def notify_no_sale(self):
+    def write(self, data, broadcast=None):
+        self.session.write(data, broadcast)
+
+    def joined(self, room):
+        self.room_id = room.room_id
+
+    def backlogged(self):
+        return self.session.backlogged()
+
+    def getpeername(self):
+        return self.session.getpeername()
+
+    def fileno(self):
+        return self.session.fileno()
+
+    def close(self):
         """
-        Notifies participants if no sale occured
+        Leaves the auction; the session connection stays open.
+        """
+        self.session.channels.discard(self)
+
 
-        Resets server after notification
+class SocketFlusher:
+    """
+    Single thread that waits for sockets with pending writes to become
+    writable and flushes them. Used by the threaded mode only.
+    """
+    def __init__(self):
+        self.selector = selectors.DefaultSelector()
+        self.requests = deque()     # (sock, callback) waiting to be registered
+        self.wakeup_recv, self.wakeup_send = socket.socketpair()    # Wakes the thread up for new requests
+        self.wakeup_recv.setblocking(False)
+        self.selector.register(self.wakeup_recv, selectors.EVENT_READ)
+
+    def wait_writable(self, sock, callback):
+        """
+        Calls callback from the flusher thread once sock becomes writable.
         """
-        for conn, _ in self.buyers:
-            conn.sendall(b"Server: The item was not sold.\n")
-        
-        print("The item was not sold")
-        self.reset_server()
-    
+        self.requests.append((sock, callback))
+        self.wakeup_send.send(b"\0")
+
+    def run(self):
+        while True:
+            for key, _ in self.selector.select():
+                if key.fileobj is self.wakeup_recv:
+                    try:
+                        self.wakeup_recv.recv(4096)
+                    except BlockingIOError:
+                        pass
+                    while self.requests:
+                        sock, callback = self.requests.popleft()
+                        try:
+                            self.selector.register(sock, selectors.EVENT_WRITE, callback)
+                        except KeyError:    # Stale registration of a closed socket with the same descriptor
+                            self.selector.unregister(sock)
+                            self.selector.register(sock, selectors.EVENT_WRITE, callback)
+                        except (ValueError, OSError):   # Socket closed in the meantime
+                            callback()
+                    continue
+                self.selector.unregister(key.fileobj)
+                key.data()
+
 
-    def reset_server(self):
+class SocketConnection:
+    """
+    Wraps a blocking client socket so that writes never block the caller.
+    Reads still block in the client's own thread.
+    """
+    def __init__(self, sock, flusher):
+        self.sock = sock
+        self.flusher = flusher
+
+    def send_nowait(self, data):
         """
-        Resets server state after an auction concludes.
-        
-        Closes all connections and clears store data to prepare for a 
-        new auction session.
+        Sends as much data as the kernel accepts right now and returns its length.
         """
-        self.status = 0     # Reset status to initial state (Waiting for seller)
-        self.auction_details = None # Cleared stored auction details
-        self.ongoing = False    # Reset ongoing flag
+        try:
+            return self.sock.send(data, socket.MSG_DONTWAIT)
+        except BlockingIOError:
+            return 0
 
-        if self.seller_conn:
-            self.seller_conn.close()
-            print("Connection closed with seller")
-        self.seller_conn = None # Clearing stored seller connection object
-        for conn, buyer_id in self.buyers:  # Closing connections with all buyers
-            conn.close()
-            print(f"Connection closed with {buyer_id}")
-        with self.buyer_lock:   # Clear buyers list and bids dictionary safely with the lock
-            self.buyers.clear() 
-            self.bids.clear()
-        
+    def wait_writable(self, callback):
+        self.flusher.wait_writable(self.sock, callback)
+
+    def getpeername(self):
+        return self.sock.getpeername()
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def close(self):
+        self.sock.close()
+
+
+class TransportConnection:
+    """
+    Wraps an asyncio transport so that it can be used like a SocketConnection.
+
+    Writes never block: data is handed to the transport, which sends it
+    right away and buffers whatever the kernel does not take. While the
+    transport is paused, new data waits in the ClientConnection instead.
+    """
+    def __init__(self, transport):
+        self.transport = transport
+        self.paused = False     # Set by the protocol when the transport buffer is full
+        self.writable_callbacks = []
+
+    def send_nowait(self, data):
+        if self.transport.is_closing():
+            raise ConnectionResetError("Transport is closing")
+        if self.paused:
+            return 0
+        self.transport.write(data)
+        return len(data)
+
+    def wait_writable(self, callback):
+        self.writable_callbacks.append(callback)
+
+    def resume_writing(self):
+        self.paused = False
+        callbacks, self.writable_callbacks = self.writable_callbacks, []
+        for callback in callbacks:
+            callback()
+
+    def getpeername(self):
+        return self.transport.get_extra_info('peername')
+
+    def fileno(self):
+        return self.transport.get_extra_info('socket').fileno()
+
+    def close(self):
+        self.transport.close()  # Buffered data is flushed before the socket is closed
+
+
+class AuctionProtocol(asyncio.Protocol):
+    """
+    asyncio protocol that feeds connection events for one client into the
+    shared auction state machine.
+    """
+    def __init__(self, server, hello=None):
+        self.server = server
+        self.preset_hello = hello   # Parsed hello of a connection handed over by another worker
+        self.transport_conn = None
+        self.conn = None    # ClientConnection, created once the hello is parsed
+        self.addr = None
+        self.data = b""     # Data received before admission
+        self.hello_timer = None     # Timer that admits legacy clients
+
+    def connection_made(self, transport):
+        self.server.metrics.connection_opened()
+        self.transport_conn = TransportConnection(transport)
+        self.addr = transport.get_extra_info('peername')
+        self.hello_timer = asyncio.get_running_loop().call_later(self.server.hello_timeout, self.admit, True)
+        if self.preset_hello is not None:
+            self.admit(True)
+
+    def admit(self, complete):
+        hello = self.preset_hello or self.server.parse_hello(self.data, complete)
+        if hello is None:   # Wait for the rest of the hello
+            return
+        self.hello_timer.cancel()
+        self.conn = ClientConnection(self.transport_conn, self.addr, hello[0])
+        self.conn.hello = hello
+        self.conn.handed_off = self.preset_hello is not None
+        conn_protocol, hello, data = hello
+        if self.server.on_connect(self.conn, self.addr, hello) and data:
+            self.server.on_data(self.conn, data)
+
+    def pause_writing(self):
+        self.transport_conn.paused = True
+
+    def resume_writing(self):
+        self.transport_conn.resume_writing()
+
+    def data_received(self, data):
+        if self.conn is not None:
+            self.server.on_data(self.conn, data)
+        else:
+            self.data += data
+            self.admit(False)
+
+    def connection_lost(self, exc):
+        self.server.metrics.connection_closed()
+        self.hello_timer.cancel()
+        if self.conn is not None:
+            self.server.on_disconnect(self.conn)
+
+
+class AsyncBidMasterServer(BidMasterServer):
+    """
+    Event-loop variant of the Auctioneer server.
+
+    Runs the same seller/buyer/bidding state machine as BidMasterServer, but
+    every connection is served by a single asyncio event loop instead of a
+    thread, so memory stays flat with thousands of connected bidders.
+    """
+    def __init__(self, host, port, backlog=1024, **kwargs):
+        """
+        Parameters:
+        - host (str): The IP address of the server
+        - port (int): The port number for the server
+        - backlog (int): Listen backlog for pending connections
+        - kwargs: Options of BidMasterServer
+        """
+        super().__init__(host, port, **kwargs)
+        self.backlog = backlog
+        self.loop = None    # Event loop, set once serving
+
+    def start_server(self):
+        """
+        Starts the server on an asyncio event loop and serves clients until
+        interrupted.
+        """
+        asyncio.run(self.serve())
+
+    def dispatch_durable(self, callbacks):
+        """
+        Runs the callbacks of durable events on the event loop.
+        """
+        self.loop.call_soon_threadsafe(super().dispatch_durable, callbacks)
+
+    def run_timers_async(self, loop):
+        """
+        Advances the timer wheel once per tick on the event loop.
+        """
+        self.timers.advance()
+        loop.call_later(self.timers.tick, self.run_timers_async, loop)
+
+    async def serve(self):
+        """
+        Binds the listening socket and runs the event loop forever.
+        """
+        self.bind()
+        self.server_socket.setblocking(False)
+        loop = asyncio.get_running_loop()
+        self.loop = loop
+        self.recover()
+        server = await loop.create_server(lambda: AuctionProtocol(self), sock=self.server_socket, backlog=self.backlog)
+        loop.call_later(self.timers.tick, self.run_timers_async, loop)
+        self.start_metrics()
+        logger.info("Auctioneer is ready for hosting auctions!")
+        async with server:
+            await server.serve_forever()
+
+
+def configure_logging(level='INFO'):
+    '''
+    Sends the server log to stdout through a queue, so that logging threads
+    never block on the terminal. Messages below level are dropped before
+    they are formatted.
+    '''
+    records = queue.SimpleQueue()
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(logging.Formatter('%(message)s'))
+    listener = logging.handlers.QueueListener(records, stream)
+    listener.start()
+    logger.addHandler(logging.handlers.QueueHandler(records))
+    logger.setLevel(level)
+    logger.propagate = False
+    return listener
 
 
 if __name__ == "__main__":
@@ -277,13 +1850,45 @@ if __name__ == "__main__":
         parser = argparse.ArgumentParser(description="Add host IP address and host port")
         parser.add_argument('host', type=str, help="The host IP address")
         parser.add_argument('port', type=int, help="The host port")
+        parser.add_argument('--mode', choices=['threaded', 'async'], default='threaded', help="Serve clients with one thread per connection or on a single event loop")
+        parser.add_argument('--backlog', type=int, default=1024, help="Listen backlog used by the async mode")
+        parser.add_argument('--max-rooms', type=int, default=None, help="Maximum number of concurrent auction rooms (default: no limit)")
+        parser.add_argument('--hello-timeout', type=float, default=0.2, help="Seconds to wait for a client to pick a room before treating it as a legacy client")
+        parser.add_argument('--bid-window', type=float, default=60.0, help="Seconds buyers have to bid once bidding starts (0 for no limit)")
+        parser.add_argument('--workers', type=int, default=1, help="Number of worker processes sharing the port with SO_REUSEPORT")
+        parser.add_argument('--event-log', type=str, default=None, help="Append auction events to this file (one file per worker)")
+        parser.add_argument('--recover', action='store_true', help="Rebuild the auctions in progress from the event log on startup")
+        parser.add_argument('--metrics-port', type=int, default=None, help="Serve metrics over HTTP on this local port (one port per worker from there on)")
+        parser.add_argument('--english-idle', type=float, default=10.0, help="Seconds without a higher bid after which an English auction closes")
+        parser.add_argument('--price-interval', type=float, default=0.1, help="Seconds between two coalesced price updates of an English auction")
+        parser.add_argument('--queue-cap', type=int, default=1000, help="Maximum number of clients parked while no room can take them (0 to turn them away)")
+        parser.add_argument('--log-level', choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'], default='INFO', help="Lowest level of the server log (DEBUG logs every connection and bid)")
 
         args = parser.parse_args()
 
         host = args.host
         port = args.port
 
-        server = BidMasterServer(host, port)  # Creating instance of the Auctioneer Server
-        server.start_server()   # Starting the server
+        options = {
+            'max_rooms': args.max_rooms,
+            'hello_timeout': args.hello_timeout,
+            'bid_window': args.bid_window or None,
+            'event_log': args.event_log,
+            'recover': args.recover,
+            'metrics_port': args.metrics_port,
+            'queue_cap': args.queue_cap,
+            'english_idle': args.english_idle,
+            'price_interval': args.price_interval,
+        }
+        if args.workers > 1:
+            from sharded_server import launch_workers
+            launch_workers(host, port, args.workers, args.mode, args.backlog, args.log_level, **options)     # Forking one Auctioneer Server per worker
+        else:
+            configure_logging(args.log_level)
+            if args.mode == 'async':
+                server = AsyncBidMasterServer(host, port, args.backlog, **options)     # Creating instance of the event-loop Auctioneer Server
+            else:
+                server = BidMasterServer(host, port, **options)  # Creating instance of the Auctioneer Server
+            server.start_server()   # Starting the server
     except Exception as e:
         print(f"Error: {e}")
@@ -0,0 +1,229 @@
+'''
+Multi-process launcher for the Auctioneer server.
+
+Every worker process binds the same port with SO_REUSEPORT, so the kernel
+spreads incoming connections over the workers, and each worker owns the
+auction rooms created on it. A small registry shared by all workers records
+which worker owns which room and which rooms still have open bidder slots.
+When a buyer lands on a worker that does not host the room it asked for,
+the worker hands the client socket over to the owning worker through a
+Unix socket (SCM_RIGHTS) before anything has been sent to the client.
+'''
+import asyncio
+import itertools
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import threading
+
+from server_rdt import BidMasterServer, AsyncBidMasterServer, AuctionProtocol, configure_logging, logger
+
+
+class RoomRegistry:
+    """
+    Registry of auction rooms shared by the workers of a sharded server.
+    Backed by multiprocessing.Manager dictionaries.
+    """
+    def __init__(self, manager):
+        self.owners = manager.dict()    # room_id -> index of the worker hosting the room
+        self.open_rooms = manager.dict()    # room_id -> description, for rooms with open bidder slots
+
+    def claim(self, room_id, worker):
+        """
+        Reserves a room id for a worker. Returns False if another worker owns it.
+        """
+        return self.owners.setdefault(room_id, worker) == worker
+
+    def owner(self, room_id):
+        return self.owners.get(room_id)
+
+    def publish(self, room_id, description):
+        self.open_rooms[room_id] = description
+
+    def unpublish(self, room_id):
+        self.open_rooms.pop(room_id, None)
+
+    def release(self, room_id):
+        self.open_rooms.pop(room_id, None)
+        self.owners.pop(room_id, None)
+
+    def find_open_room(self, exclude):
+        """
+        Returns the index of a worker other than exclude that hosts a room
+        with open bidder slots, or None.
+        """
+        for room_id in self.open_rooms.keys():
+            owner = self.owners.get(room_id)
+            if owner is not None and owner != exclude:
+                return owner
+        return None
+
+    def listing(self):
+        return list(self.open_rooms.values())
+
+
+class ShardWorkerMixin:
+    """
+    Turns a BidMasterServer into one worker of a sharded server: publishes
+    its rooms to the shared registry and exchanges misrouted buyers with the
+    other workers.
+    """
+    def attach_shard(self, index, workers, registry, channels):
+        """
+        Parameters:
+        - index (int): Index of this worker
+        - workers (int): Number of workers
+        - registry (RoomRegistry): Registry shared by all workers
+        - channels: One (receive, send) Unix datagram socket pair per worker,
+          used to hand client sockets over
+        """
+        self.worker_index = index
+        self.registry = registry
+        self.handoff_recv = channels[index][0]
+        self.handoff_send = [send for _, send in channels]
+        self.room_ids = itertools.count(index + 1, workers)    # Disjoint server-assigned room ids
+
+    def publish_room(self, room):
+        if room.is_open():
+            self.registry.publish(room.room_id, room.describe())
+        else:
+            self.registry.unpublish(room.room_id)
+
+    def release_room(self, room):
+        self.registry.release(room.room_id)
+
+    def claim_room(self, room_id):
+        return room_id not in self.rooms and self.registry.claim(room_id, self.worker_index)
+
+    def list_rooms(self):
+        return self.registry.listing()
+
+    def route_remote(self, conn, room_id):
+        if conn.handed_off:     # Never bounce a client between workers
+            return False
+        owner = self.registry.owner(room_id) if room_id else self.registry.find_open_room(self.worker_index)
+        if owner is None or owner == self.worker_index:
+            return False
+        self.hand_off(conn, owner)
+        return True
+
+    def hand_off(self, conn, owner):
+        """
+        Passes the client socket and its parsed hello to another worker.
+        """
+        conn_protocol, hello, rest = conn.hello
+        payload = json.dumps({
+            'protocol': conn_protocol,
+            'hello': hello,
+            'rest': rest.hex(),     # Data received after the hello
+            'addr': conn.addr[:2],
+        }).encode()
+        socket.send_fds(self.handoff_send[owner], [payload], [conn.fileno()])
+        conn.close()    # The other worker holds its own descriptor of the socket
+        logger.debug(f"Handed {conn.addr[0]}:{conn.addr[1]} over to worker {owner}")
+
+    def receive_handoff(self):
+        """
+        Receives one client socket handed over by another worker.
+
+        Returns:
+        - (sock, addr, hello) where hello is the parsed (protocol, hello, rest)
+        """
+        payload, fds, _, _ = socket.recv_fds(self.handoff_recv, 65536, 1)
+        message = json.loads(payload.decode())
+        sock = socket.socket(fileno=fds[0])
+        hello = tuple(message['hello']) if message['hello'] else None
+        return sock, tuple(message['addr']), (message['protocol'], hello, bytes.fromhex(message['rest']))
+
+
+class ThreadedShardWorker(ShardWorkerMixin, BidMasterServer):
+    """
+    Worker process running the threaded server.
+    """
+    def start_server(self):
+        threading.Thread(target=self.accept_handoffs, daemon=True).start()
+        super().start_server()
+
+    def accept_handoffs(self):
+        while True:
+            sock, addr, hello = self.receive_handoff()
+            threading.Thread(target=self.serve_connection, args=(sock, addr, hello), daemon=True).start()
+
+
+class AsyncShardWorker(ShardWorkerMixin, AsyncBidMasterServer):
+    """
+    Worker process running the event-loop server.
+    """
+    async def serve(self):
+        loop = asyncio.get_running_loop()
+        self.handoff_recv.setblocking(False)
+        loop.add_reader(self.handoff_recv, self.accept_handoff, loop)
+        await super().serve()
+
+    def accept_handoff(self, loop):
+        try:
+            sock, addr, hello = self.receive_handoff()
+        except BlockingIOError:
+            return
+        sock.setblocking(False)
+        loop.create_task(loop.connect_accepted_socket(lambda: AuctionProtocol(self, hello), sock))
+
+
+def run_worker(index, workers, host, port, mode, backlog, log_level, options, registry, channels):
+    """
+    Entry point of a worker process.
+    """
+    configure_logging(log_level)    # The log thread does not survive the fork, every worker starts its own
+    if options.get('metrics_port') is not None:
+        options = dict(options, metrics_port=options['metrics_port'] + index)
+    if options.get('event_log'):
+        options = dict(options, event_log=f"{options['event_log']}.{index}")    # Every worker logs and recovers its own rooms
+    if mode == 'async':
+        server = AsyncShardWorker(host, port, backlog, reuse_port=True, **options)
+    else:
+        server = ThreadedShardWorker(host, port, reuse_port=True, **options)
+    server.attach_shard(index, workers, registry, channels)
+    logger.info(f"Worker {index} started (pid {os.getpid()})")
+    try:
+        server.start_server()
+    except KeyboardInterrupt:
+        pass
+
+
+def launch_workers(host, port, workers, mode='async', backlog=1024, log_level='INFO', **options):
+    """
+    Forks the worker processes and waits for them to exit.
+
+    Parameters:
+    - host (str): The IP address of the server
+    - port (int): The port number for the server
+    - workers (int): Number of worker processes
+    - mode (str): 'threaded' or 'async' server in every worker
+    - backlog (int): Listen backlog used by async workers
+    - log_level (str): Lowest level of the workers' server log
+    - options: Options of BidMasterServer
+    """
+    context = multiprocessing.get_context('fork')   # Workers inherit the hand-off sockets
+    manager = context.Manager()
+    registry = RoomRegistry(manager)
+    channels = [socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM) for _ in range(workers)]
+    processes = [
+        context.Process(target=run_worker, args=(index, workers, host, port, mode, backlog, log_level, options, registry, channels), daemon=True)
+        for index in range(workers)
+    ]
+    for process in processes:
+        process.start()
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))    # Stop the workers on SIGTERM as well
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        manager.shutdown()